@@ -0,0 +1,6 @@
+"""
+基准测试：合成数据集、数据库方法微基准、HTTP负载测试
+文件名: benchmarks/__init__.py
+
+用法见 python3 -m benchmarks --help
+"""
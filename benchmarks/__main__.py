@@ -0,0 +1,168 @@
+"""
+基准测试命令行
+文件名: benchmarks/__main__.py
+
+    python3 -m benchmarks generate --sizes 1k,10k,100k,1m
+    python3 -m benchmarks micro --sizes 1k,10k --output results/micro.json
+    python3 -m benchmarks load --sizes 10k --mix read,admin --concurrency 8 --duration 10
+    python3 -m benchmarks run --sizes 1k,10k --output results/HEAD.json
+    python3 -m benchmarks compare results/old.json results/new.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from config import BASE_DIR
+
+from . import dataset, micro, load
+from .stats import environment
+
+DEFAULT_DATA_DIR = os.path.join(BASE_DIR, 'benchmarks', 'data')
+
+
+def parse_sizes(value):
+    return [dataset.parse_size(size) for size in value.split(',') if size]
+
+
+def prepare(args):
+    """确保所需的数据集存在，返回 {事件数: 路径}"""
+    paths = {}
+    for events in parse_sizes(args.sizes):
+        path = dataset.dataset_path(args.data_dir, events)
+        if not os.path.exists(path):
+            print(f"生成数据集: {events} 个事件 ...", file=sys.stderr)
+            start = time.perf_counter()
+            dataset.generate(path, events, seed=args.seed)
+            print(f"  完成，用时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+        paths[events] = path
+    return paths
+
+
+def run_micro(args, paths):
+    results = {}
+    for events, path in paths.items():
+        print(f"微基准: {events} 个事件 ...", file=sys.stderr)
+        results[str(events)] = micro.run(path, repeat=args.repeat, writes=args.writes,
+                                         max_time=args.max_time)
+    return results
+
+
+def run_load(args, paths):
+    results = {}
+    for events, path in paths.items():
+        for mix in args.mix.split(','):
+            print(f"负载测试: {events} 个事件，{mix}，{args.concurrency} 并发 ...", file=sys.stderr)
+            results[f'{events}/{mix}'] = load.run(
+                path, mix=mix, concurrency=args.concurrency, duration=args.duration,
+                warmup=args.warmup, seed=args.seed, port=args.port)
+    return results
+
+
+def write_results(results, output):
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"结果已保存: {output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def compare(old_path, new_path, threshold):
+    """比较两个结果文件中各项的中位数，返回变慢超过阈值的项数"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    def medians(results):
+        found = {}
+        for events, tests in results.get('micro', {}).items():
+            for name, summary in tests.items():
+                found[f'micro {events} {name}'] = summary.get('median_ms')
+        for key, result in results.get('load', {}).items():
+            for name, summary in result['operations'].items():
+                found[f'load {key} {name}'] = summary.get('median_ms')
+        return found
+
+    old_medians, new_medians = medians(old), medians(new)
+    print(f"{old.get('environment', {}).get('git')} -> {new.get('environment', {}).get('git')}")
+    regressions = 0
+    for key in sorted(set(old_medians) & set(new_medians)):
+        before, after = old_medians[key], new_medians[key]
+        if not before or after is None:
+            continue
+        ratio = after / before
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  变慢'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = '  变快'
+        print(f"{key:<60} {before:>10.3f} ms -> {after:>10.3f} ms  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m benchmarks', description='TimelineJS 基准测试')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='数据集目录')
+    parser.add_argument('--sizes', default='1k,10k', help='数据集规模，逗号分隔（1k,10k,100k,1m 或事件数）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('generate', help='生成（覆盖）数据集')
+
+    def add_micro_options(command):
+        command.add_argument('--repeat', type=int, default=20, help='每项最多重复次数')
+        command.add_argument('--writes', type=int, default=200, help='add_event调用次数')
+        command.add_argument('--max-time', type=float, default=30.0, help='每项最长用时（秒）')
+
+    def add_load_options(command):
+        command.add_argument('--mix', default='read,admin', help=f"请求组合: {', '.join(load.MIXES)}")
+        command.add_argument('--concurrency', type=int, default=8, help='客户端线程数')
+        command.add_argument('--duration', type=float, default=10.0, help='测量时长（秒）')
+        command.add_argument('--warmup', type=float, default=2.0, help='预热时长（秒）')
+        command.add_argument('--port', type=int, default=None, help='服务器端口（默认随机空闲端口）')
+
+    for name, help_text, options in (('micro', '数据库方法微基准', (add_micro_options,)),
+                                     ('load', 'HTTP负载测试', (add_load_options,)),
+                                     ('run', '微基准和负载测试', (add_micro_options, add_load_options))):
+        command = commands.add_parser(name, help=help_text)
+        for add_options in options:
+            add_options(command)
+        command.add_argument('--output', help='结果JSON文件（默认输出到标准输出）')
+
+    compare_parser = commands.add_parser('compare', help='比较两个结果文件')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='变化超过此比例时标记')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        return 1 if compare(args.old, args.new, args.threshold) else 0
+
+    if args.command == 'generate':
+        for events in parse_sizes(args.sizes):
+            start = time.perf_counter()
+            info = dataset.generate(dataset.dataset_path(args.data_dir, events), events, seed=args.seed)
+            print(f"{info['path']}: {info['events']} 个事件，{info['eras']} 个时代，"
+                  f"{info['size_bytes']:,} 字节，用时 {time.perf_counter() - start:.1f} 秒")
+        return 0
+
+    paths = prepare(args)
+    results = {'environment': environment(BASE_DIR), 'seed': args.seed}
+    if args.command in ('micro', 'run'):
+        results['micro'] = run_micro(args, paths)
+    if args.command in ('load', 'run'):
+        results['load'] = run_load(args, paths)
+    write_results(results, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
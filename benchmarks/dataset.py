@@ -0,0 +1,156 @@
+"""
+合成时间线数据集：按固定随机种子生成，相同参数得到相同的数据库
+文件名: benchmarks/dataset.py
+"""
+
+import os
+import random
+
+from models.tl_story import TimelineDatabase
+from models.importer import TimelineImporter, event_to_row, era_to_row
+
+# 标准数据集规模（事件数）
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+
+# 可选字段的填充比例（参照实际时间线数据的大致分布）
+FILL_RATES = {
+    'text': 0.85,
+    'month': 0.8,
+    'day': 0.6,
+    'time': 0.1,
+    'end_date': 0.25,
+    'display_date': 0.1,
+    'group': 0.4,
+    'media': 0.6,
+    'media_caption': 0.75,     # 以下为有媒体时的比例
+    'media_credit': 0.5,
+    'media_thumbnail': 0.3,
+    'background': 0.15,
+}
+
+GROUPS = ('政治', '经济', '文化', '科技', '体育', '人物', '战争', '外交')
+WORDS = ('毽球', '比赛', '队伍', '冠军', '训练', '历史', '俱乐部', '城市', '会员', '活动',
+         'timeline', 'story', 'event', 'archive', 'record', 'season', 'team', 'match')
+
+BATCH_SIZE = 5000
+
+
+def parse_size(value):
+    """'10k'、'1m' 或数字"""
+    key = value.lower()
+    if key in SIZES:
+        return SIZES[key]
+    count = int(key)
+    if count <= 0:
+        raise ValueError(f"无效的数据集规模: {value}")
+    return count
+
+
+def dataset_path(data_dir, events):
+    return os.path.join(data_dir, f'timeline-{events}.db')
+
+
+class DatasetGenerator:
+    """生成TimelineJS格式的事件和时代对象"""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def _chance(self, name):
+        return self.random.random() < FILL_RATES[name]
+
+    def _sentence(self, low, high):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(low, high)))
+
+    def _date(self, year):
+        date = {'year': year}
+        if self._chance('month'):
+            date['month'] = self.random.randint(1, 12)
+            if self._chance('day'):
+                date['day'] = self.random.randint(1, 28)
+                if self._chance('time'):
+                    date['hour'] = self.random.randint(0, 23)
+                    date['minute'] = self.random.randint(0, 59)
+        return date
+
+    def event(self, index):
+        rand = self.random
+        year = rand.randint(1900, 2025)
+        event = {
+            'start_date': self._date(year),
+            'text': {'headline': f'{self._sentence(2, 6)} #{index}'},
+            'unique_id': f'event-{index}'
+        }
+        if self._chance('text'):
+            event['text']['text'] = f'<p>{self._sentence(20, 120)}</p>'
+        if self._chance('end_date'):
+            event['end_date'] = self._date(min(year + rand.randint(0, 10), 2030))
+        if self._chance('display_date'):
+            event['display_date'] = f'{year}年'
+        if self._chance('group'):
+            event['group'] = rand.choice(GROUPS)
+        if self._chance('media'):
+            media = {'url': f'https://example.com/media/{index}.jpg'}
+            if self._chance('media_caption'):
+                media['caption'] = self._sentence(3, 12)
+            if self._chance('media_credit'):
+                media['credit'] = self._sentence(1, 3)
+            if self._chance('media_thumbnail'):
+                media['thumbnail'] = f'https://example.com/media/{index}-thumb.jpg'
+            event['media'] = media
+        if self._chance('background'):
+            event['background'] = {'color': '#%06x' % rand.randrange(0x1000000)}
+        return event
+
+    def era(self, index):
+        year = self.random.randint(1900, 2015)
+        return {
+            'start_date': {'year': year},
+            'end_date': {'year': year + self.random.randint(1, 15)},
+            'text': {'headline': f'{self._sentence(1, 3)} 时期 #{index}'}
+        }
+
+
+def generate(path, events, eras=None, seed=0):
+    """生成数据集数据库（已存在时覆盖），返回数据集描述"""
+    if eras is None:
+        eras = max(events // 100, 3)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    generator = DatasetGenerator(seed)
+    db = TimelineDatabase(path)
+    importer = TimelineImporter(db)
+    try:
+        with db.pool.transaction() as conn:
+            conn.execute("UPDATE timeline_config SET title_headline = ?, title_text = ? WHERE id = 1",
+                         (f'基准数据集（{events} 个事件）', f'seed={seed}'))
+            batch = []
+            for index in range(events):
+                batch.append(event_to_row(generator.event(index), sort_order=index))
+                if len(batch) >= BATCH_SIZE:
+                    conn.executemany(importer.event_sql, batch)
+                    batch.clear()
+            if batch:
+                conn.executemany(importer.event_sql, batch)
+            conn.executemany(importer.era_sql,
+                             [era_to_row(generator.era(index), sort_order=index) for index in range(eras)])
+        # 统计信息和检查点在事务之外执行，生成的文件不带WAL
+        conn = db.connect()
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        db.close()
+
+    return {'path': path, 'events': events, 'eras': eras, 'seed': seed,
+            'size_bytes': os.path.getsize(path)}
+
+
+def ensure(data_dir, events, seed=0):
+    """返回数据集路径，不存在时生成"""
+    path = dataset_path(data_dir, events)
+    if not os.path.exists(path):
+        generate(path, events, seed=seed)
+    return path
@@ -0,0 +1,251 @@
+"""
+HTTP负载测试：在子进程中启动main.py，多个客户端线程按请求组合持续发送请求
+文件名: benchmarks/load.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import sqlite3
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import quote
+
+from config import BASE_DIR
+
+from .micro import copy_database
+from .stats import summarize
+
+SEARCH_TERMS = ('毽球', '冠军', '俱乐部', 'timeline', 'season', 'record', '比赛 历史')
+GROUPS = ('政治', '经济', '文化', '科技', '体育')
+
+
+class Client:
+    """一个客户端线程使用的连接，服务器关闭连接后自动重连"""
+
+    def __init__(self, port, timeout=30):
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        """发送请求并读完响应体，返回状态码"""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Workload:
+    """请求组合：每种操作及其权重"""
+
+    def __init__(self, max_id, seed=0):
+        self.max_id = max(max_id, 1)
+        self.seed = seed
+
+    def _event_id(self, rand):
+        return rand.randint(1, self.max_id)
+
+    def events_page(self, rand):
+        path = '/api/events?limit=50'
+        if rand.random() < 0.3:
+            year = rand.randint(1900, 2020)
+            path += f'&from={year}&to={year + 5}'
+        return 'GET', path, None
+
+    def event(self, rand):
+        return 'GET', f'/api/events/{self._event_id(rand)}', None
+
+    def document(self, rand):
+        return 'GET', '/api/generate-json', None
+
+    def search(self, rand):
+        return 'GET', '/api/search?limit=20&q=' + quote(rand.choice(SEARCH_TERMS)), None
+
+    def config(self, rand):
+        return 'GET', '/api/config', None
+
+    def static(self, rand):
+        return 'GET', '/index.html', None
+
+    def create_event(self, rand):
+        return 'POST', '/api/events', {
+            'headline': f'负载测试事件 {rand.randrange(10 ** 9)}',
+            'text': '<p>load</p>',
+            'start_year': rand.randint(1900, 2025),
+            'start_month': rand.randint(1, 12),
+            'event_group': rand.choice(GROUPS),
+        }
+
+    def update_event(self, rand):
+        return 'PUT', f'/api/events/{self._event_id(rand)}', {
+            'headline': f'已修改 {rand.randrange(10 ** 9)}'}
+
+    def delete_event(self, rand):
+        return 'DELETE', f'/api/events/{self._event_id(rand)}?soft=true', None
+
+    def batch(self, rand):
+        return 'POST', '/api/batch', {'operations': [
+            {'op': 'update', 'type': 'event', 'id': self._event_id(rand),
+             'data': {'event_group': rand.choice(GROUPS)}}
+            for _ in range(10)
+        ]}
+
+
+# 请求组合：操作名 -> 权重
+MIXES = {
+    'read': {
+        'events_page': 35, 'event': 25, 'document': 15, 'search': 10, 'config': 5, 'static': 10,
+    },
+    'admin': {
+        'create_event': 20, 'update_event': 25, 'delete_event': 5, 'batch': 10,
+        'events_page': 25, 'document': 15,
+    },
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def max_event_id(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT MAX(id) FROM timeline_events').fetchone()[0] or 0
+    finally:
+        conn.close()
+
+
+def start_server(db_path, port, timeout=60):
+    """启动main.py并等待健康检查通过"""
+    env = dict(os.environ, TIMELINE_DB=db_path, TIMELINE_PORT=str(port))
+    process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'main.py'), 'serve'],
+                               cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = Client(port, timeout=5)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务器启动失败（退出码 {process.returncode}）")
+        try:
+            if client.request('GET', '/api/health') == 200:
+                client.close()
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("等待服务器启动超时")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def drive(port, workload, mix, concurrency, duration, warmup, seed):
+    """运行负载，返回 (每种操作的耗时列表, 状态码计数, 异常数, 实际测量时长)"""
+    operations = list(MIXES[mix])
+    weights = [MIXES[mix][name] for name in operations]
+    samples = {name: [] for name in operations}
+    statuses = {}
+    failures = [0]
+    lock = threading.Lock()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def worker(index):
+        rand = random.Random(seed * 1000 + index)
+        client = Client(port)
+        local_samples = {name: [] for name in operations}
+        local_statuses = {}
+        local_failures = 0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            name = rand.choices(operations, weights)[0]
+            method, path, body = getattr(workload, name)(rand)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except (OSError, http.client.HTTPException):
+                if now >= start_at:
+                    local_failures += 1
+                continue
+            elapsed = time.perf_counter() - started
+            # 预热期间的请求不计入结果
+            if now >= start_at:
+                local_samples[name].append(elapsed)
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+        client.close()
+        with lock:
+            for name, values in local_samples.items():
+                samples[name].extend(values)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+            failures[0] += local_failures
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, statuses, failures[0], duration
+
+
+def run(dataset, mix='read', concurrency=8, duration=10.0, warmup=2.0, seed=0, port=None):
+    """在数据集副本上启动服务器并运行一种请求组合，返回结果"""
+    if mix not in MIXES:
+        raise ValueError(f"未知的请求组合: {mix}")
+    with tempfile.TemporaryDirectory(prefix='timeline-load-') as workdir:
+        path = os.path.join(workdir, 'timeline.db')
+        copy_database(dataset, path)
+        workload = Workload(max_event_id(path), seed)
+        port = port or free_port()
+        process = start_server(path, port)
+        try:
+            samples, statuses, failures, elapsed = drive(
+                port, workload, mix, concurrency, duration, warmup, seed)
+        finally:
+            stop_server(process)
+
+    total = sum(len(values) for values in samples.values())
+    return {
+        'mix': mix,
+        'concurrency': concurrency,
+        'duration_s': elapsed,
+        'requests': total,
+        'throughput_rps': total / elapsed if elapsed else 0,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'failures': failures,
+        'latency': summarize([value for values in samples.values() for value in values]),
+        'operations': {name: summarize(values) for name, values in samples.items()},
+    }
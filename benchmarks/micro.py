@@ -0,0 +1,103 @@
+"""
+TimelineDatabase方法的微基准
+文件名: benchmarks/micro.py
+
+在数据集的副本上运行，写入类的测试不会修改数据集本身。
+"""
+
+import io
+import os
+import time
+import sqlite3
+import tempfile
+import contextlib
+
+from models.tl_story import TimelineDatabase
+
+from .stats import summarize
+
+
+def measure(func, setup=None, repeat=20, min_runs=3, max_time=30.0):
+    """重复调用func并记录每次耗时（setup不计时）；总耗时超过max_time后至少完成min_runs次即停止"""
+    samples = []
+    deadline = time.perf_counter() + max_time
+    while len(samples) < repeat:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+        if len(samples) >= min_runs and time.perf_counter() > deadline:
+            break
+    return summarize(samples)
+
+
+def copy_database(source, target):
+    """用SQLite备份接口复制数据集"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def sample_event(index):
+    return {
+        'headline': f'基准新增事件 {index}',
+        'text': '<p>benchmark</p>',
+        'start_year': 2000 + index % 20,
+        'start_month': index % 12 + 1,
+        'event_group': '基准',
+    }
+
+
+def open_database(path):
+    """打开数据库并执行第一个查询后关闭（启动时间，结构已是最新版本）"""
+    db = TimelineDatabase(path)
+    try:
+        db.get_timeline_config()
+    finally:
+        db.close()
+
+
+def run(dataset, repeat=20, writes=200, max_time=30.0):
+    """对一个数据集运行全部微基准，返回 {测试名: 统计}"""
+    with tempfile.TemporaryDirectory(prefix='timeline-bench-') as workdir:
+        path = os.path.join(workdir, 'timeline.db')
+        copy_database(dataset, path)
+        output = os.path.join(workdir, 'tl-story.json')
+        results = {}
+        # 屏蔽save_json_to_file等方法的输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            # 第一次打开时升级数据集的表结构，之后的打开不再执行DDL
+            open_database(path)
+            results['open'] = measure(lambda: open_database(path), repeat=repeat, max_time=max_time)
+
+            db = TimelineDatabase(path)
+            try:
+                # 冷：数据刚变化（文档和片段缓存均失效）；热：数据未变化
+                results['generate_json.cold'] = measure(
+                    db.generate_json, setup=db.invalidate, repeat=repeat, max_time=max_time)
+                results['generate_json.warm'] = measure(
+                    db.generate_json, repeat=repeat, max_time=max_time)
+                results['get_json_document.cold'] = measure(
+                    db.get_json_document, setup=db.invalidate, repeat=repeat, max_time=max_time)
+                results['get_json_document.warm'] = measure(
+                    db.get_json_document, repeat=repeat, max_time=max_time)
+                results['get_all_events'] = measure(
+                    db.get_all_events, repeat=repeat, max_time=max_time)
+                results['save_json_to_file.cold'] = measure(
+                    lambda: db.save_json_to_file(output), setup=db.invalidate,
+                    repeat=repeat, max_time=max_time)
+                results['save_json_to_file.unchanged'] = measure(
+                    lambda: db.save_json_to_file(output), repeat=repeat, max_time=max_time)
+
+                counter = iter(range(writes))
+                results['add_event'] = measure(
+                    lambda: db.add_event(sample_event(next(counter))),
+                    repeat=writes, min_runs=writes, max_time=max_time)
+            finally:
+                db.close()
+    return results
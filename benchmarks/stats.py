@@ -0,0 +1,65 @@
+"""
+计时结果的统计与运行环境信息
+文件名: benchmarks/stats.py
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import platform
+import statistics
+import subprocess
+
+
+def percentile(sorted_values, fraction):
+    """已排序数据的百分位数（线性插值）"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples):
+    """一组耗时（秒）的统计，结果单位为毫秒"""
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'min_ms': values[0] * 1000,
+        'median_ms': statistics.median(values) * 1000,
+        'mean_ms': statistics.fmean(values) * 1000,
+        'p95_ms': percentile(values, 0.95) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+
+def git_revision(cwd):
+    """当前提交，非git目录或未安装git时返回None"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    revision = result.stdout.strip()
+    dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                           capture_output=True, text=True, timeout=10).stdout.strip()
+    return f'{revision}-dirty' if dirty else revision
+
+
+def environment(cwd):
+    """运行环境，写入结果文件以便比较不同提交的结果"""
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git': git_revision(cwd),
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
@@ -8,32 +8,97 @@ import os
 # 基础配置
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# 数据库配置
+# 数据库配置（TIMELINE_DB环境变量可指定其他数据库文件，例如基准测试的数据集）
 DATABASE = {
-    'path': os.path.join(BASE_DIR, 'static', 'data', 'timeline.db'),
+    'path': os.environ.get('TIMELINE_DB') or os.path.join(BASE_DIR, 'static', 'data', 'timeline.db'),
     'json_output': os.path.join(BASE_DIR, 'static', 'data', 'tl-story.json'),
-    'backup_dir': os.path.join(BASE_DIR, 'static', 'data', 'backups')
+    'search_index_output': os.path.join(BASE_DIR, 'static', 'data', 'search-index.json'),
+    'backup_dir': os.path.join(BASE_DIR, 'static', 'data', 'backups'),
+    # 在线备份：每批复制的页数和批次间隔（秒），批次之间其他连接可继续读写
+    'backup_pages': 256,
+    'backup_sleep': 0.05,
+    'backup_keep': 10,           # 保留最近的备份个数
+    'backup_compress': True,     # 使用gzip压缩备份文件
+    'backup_interval': 0,        # 定时备份间隔（秒），0表示不自动备份
+    # 检查其他进程（命令行导入、恢复备份等）写入的间隔（秒），0表示只在读取文档时检查
+    'external_check_interval': 2,
+    # 连接参数：每个线程一个长连接，以下PRAGMA在连接创建时设置一次
+    'connection': {
+        'journal_mode': 'WAL',          # 读不阻塞写，写不阻塞读
+        'synchronous': 'NORMAL',        # WAL模式下兼顾安全与写入速度
+        'cache_size': -16000,           # 页缓存，负数单位为KB（约16MB）
+        'mmap_size': 64 * 1024 * 1024,  # 内存映射读取（64MB）
+        'busy_timeout': 5000            # 等待锁的毫秒数
+    }
 }
 
 # 服务器配置
 SERVER = {
     'host': 'localhost',
-    'port': 8000,
-    'debug': True
+    'port': int(os.environ.get('TIMELINE_PORT', 8000)),
+    'debug': True,
+    'threaded': True,          # 使用线程池并发处理请求
+    'max_workers': 16,         # 工作线程数
+    'max_pending': 64,         # 线程池满时最多排队的连接数
+    'shutdown_timeout': 30,    # 停止时等待处理中请求的秒数
+    'keep_alive_timeout': 15,  # 持久连接空闲多少秒后关闭
+    'request_timeout': 30,     # 读取请求或发送响应时socket的超时秒数
+    'sse_heartbeat': 30,       # /api/changes 空闲时发送心跳的间隔秒数
+    'change_buffer': 4096,     # 内存中保留的最近变更条数（断线重连时可续传的范围）
+    'metrics': True            # 统计请求和SQL指标（/api/metrics）
 }
 
 # API配置
 API = {
     'prefix': '/api',
     'cors_origins': ['*'],
-    'rate_limit': '100 per minute'
+    'rate_limit': '100 per minute',
+    'page_size': 50,        # 列表接口分页时的默认条数
+    'max_page_size': 500,   # 每页最多条数
+    'import_batch_size': 1000,  # 导入时每次executemany写入的行数
+    'max_batch_size': 1000,     # /api/batch 每次最多的操作数
+    'document_cache_entries': 256,                # 内存中缓存生成的JSON文档的时间线数
+    'document_cache_bytes': 64 * 1024 * 1024,     # 缓存文档（含压缩副本）的总字节数上限
+    'max_body_size': 16 * 1024 * 1024             # 一次读入内存的JSON请求体最多字节数（导入和上传为流式，不受此限制）
 }
 
-# 文件上传配置
+# 静态文件配置
+STATIC = {
+    'root': BASE_DIR,
+    'memory_limit': 32 * 1024 * 1024,   # 内存中缓存的静态文件总字节数
+    'max_cached_file': 256 * 1024,      # 超过此大小的文件不缓存，用sendfile发送
+    'check_interval': 1.0,              # 缓存的文件每隔多少秒检查一次是否修改
+    'immutable_prefixes': ['/static/lib/', '/static/media/'],  # 第三方库和按内容命名的图片，浏览器长期缓存
+    'max_age': 365 * 24 * 3600
+}
+
+# 响应压缩配置（gzip始终可用，安装brotli/zstandard后自动支持br/zstd）
+COMPRESSION = {
+    'enabled': True,
+    'min_size': 1024,    # 小于此字节数的响应不压缩
+    'static_cache_dir': os.path.join(BASE_DIR, '.cache', 'compressed'),  # 预压缩文件目录
+    'precompress_dirs': ['static', 'admin']  # 启动时预压缩的目录
+}
+
+# 文件上传配置（POST /api/uploads）
 UPLOAD = {
     'allowed_extensions': ['.jpg', '.jpeg', '.png', '.gif', '.mp4', '.webm', '.mp3'],
     'max_size': 10 * 1024 * 1024,  # 10MB
-    'upload_folder': os.path.join(BASE_DIR, 'static', 'uploads')
+    'max_request_size': 10 * 1024 * 1024 + 64 * 1024,  # 整个请求体最多字节数（文件加上multipart开销）
+    'upload_folder': os.path.join(BASE_DIR, 'static', 'uploads'),
+    'url_prefix': '/static/uploads/'  # upload_folder对应的URL
+}
+
+# 图片派生配置（需要Pillow）：事件引用的本地图片在后台生成缩略图和限宽副本
+MEDIA = {
+    'enabled': True,
+    'output_dir': os.path.join(BASE_DIR, 'static', 'media'),  # 按内容sha256命名，可长期缓存
+    'url_prefix': '/static/media/',
+    'widths': [320, 640, 1280],  # 限宽副本的宽度（不放大）
+    'display_width': 1280,       # 时间线中使用不超过此宽度的最大副本
+    'thumbnail_size': 120,       # 正方形缩略图的边长
+    'quality': 82,               # JPEG质量
+    'workers': 2                 # 生成图片的进程数
 }
 
 # 初始化函数
@@ -49,11 +114,4 @@ def init_config():
     print(f"  JSON输出: {DATABASE['json_output']}")
     print(f"  上传目录: {UPLOAD['upload_folder']}")
     
-    # 导入并初始化数据库
-    try:
-        from models.tl_story import db
-        print("数据库初始化完成")
-    except Exception as e:
-        print(f"数据库初始化失败: {e}")
-    
     return True
\ No newline at end of file
@@ -2,274 +2,1029 @@
 """
 TimelineJS 主程序入口
 运行: python3 main.py
+导入: python3 main.py import tl-story.json [--replace]
+图片: python3 main.py media
+备份: python3 main.py backup | backups | restore <备份名>
 访问: http://localhost:8000/admin/admin.html
 """
 
 import os
+import sys
 import json
 import time
+import argparse
+import html
+import signal
+import socket
+import selectors
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import sqlite3
 
 # 导入配置和模型
-from config import init_config, DATABASE, SERVER
-from models.tl_story import TimelineDatabase
+from config import init_config, DATABASE, SERVER, API, COMPRESSION, STATIC, MEDIA, UPLOAD
+from models.tl_story import TimelineDatabase, BatchError, DEFAULT_TIMELINE_ID, dumps_compact
+from models.backup import BackupManager
+from models.media import MediaPipeline
+from models.paging import encode_cursor, decode_cursor, parse_date_bound
+from server.multipart import MultipartReader, READ_SIZE
+from server.metrics import Registry, HTTPMetrics, SQLMetrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from server.events import EventStream, CONTENT_TYPE as EVENTS_CONTENT_TYPE
+from server.compression import PrecompressedFiles, StreamCompressor, choose_encoding, compress, is_compressible
+from server.router import Router
+from server.static import StaticFiles
+from server.uploads import UploadStore, UploadRejected
+from server.validators import etag_matches, encoded_etag
+
+# 流式响应每次写入socket的字节数
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# 带请求体的HTTP方法
+BODY_METHODS = frozenset({'POST', 'PUT', 'PATCH'})
+
+# 运行指标（关闭时不统计，/api/metrics只输出空注册表）
+metrics = Registry()
+sql_metrics = SQLMetrics(metrics) if SERVER.get('metrics', True) else None
+http_metrics = HTTPMetrics(metrics, sql=sql_metrics) if SERVER.get('metrics', True) else None
 
 # 全局数据库实例
-db = TimelineDatabase(DATABASE['path'])
+db = TimelineDatabase(DATABASE['path'], observer=sql_metrics,
+                      document_cache_entries=API['document_cache_entries'],
+                      document_cache_bytes=API['document_cache_bytes'],
+                      change_buffer=SERVER['change_buffer'],
+                      **DATABASE['connection'])
+backups = BackupManager(
+    db, DATABASE['backup_dir'],
+    pages=DATABASE['backup_pages'],
+    sleep=DATABASE['backup_sleep'],
+    keep=DATABASE['backup_keep'],
+    compress=DATABASE['backup_compress']
+)
+
+# 变更推送（/api/changes），所有订阅连接由一个线程管理
+change_stream = EventStream(
+    db.changes, heartbeat=SERVER['sse_heartbeat'],
+    gauge=metrics.gauge('timeline_sse_subscribers', 'Open /api/changes connections') if http_metrics else None
+)
+
+# 事件图片的缩略图和限宽副本（后台进程池生成）
+media = MediaPipeline(
+    db, STATIC['root'], MEDIA['output_dir'],
+    url_prefix=MEDIA['url_prefix'],
+    widths=MEDIA['widths'],
+    display_width=MEDIA['display_width'],
+    thumbnail_size=MEDIA['thumbnail_size'],
+    quality=MEDIA['quality'],
+    workers=MEDIA['workers']
+)
+
+# 上传文件（按内容命名，相同文件只保存一份）
+uploads = UploadStore(UPLOAD['upload_folder'], UPLOAD['url_prefix'],
+                      UPLOAD['allowed_extensions'], UPLOAD['max_size'])
+
+# 静态文件的预压缩副本
+precompressed = PrecompressedFiles(STATIC['root'], COMPRESSION['static_cache_dir'],
+                                   min_size=COMPRESSION['min_size'])
+
+# 静态文件服务
+static_files = StaticFiles(
+    STATIC['root'],
+    precompressed=precompressed if COMPRESSION['enabled'] else None,
+    memory_limit=STATIC['memory_limit'],
+    max_file_size=STATIC['max_cached_file'],
+    check_interval=STATIC['check_interval'],
+    immutable_prefixes=STATIC['immutable_prefixes'],
+    max_age=STATIC['max_age']
+)
+
+
+class RequestBody:
+    """按Content-Length限定的请求体流，读完后不会越界读到同一连接上的下一个请求"""
+    
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+    
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.read(size)
+        self.remaining -= len(data)
+        if not data:
+            self.remaining = 0
+        return data
+
+
+def parse_page_query(query):
+    """解析分页和日期过滤参数（limit、cursor、from、to）"""
+    params = {}
+    limit = query.get('limit', [None])[0]
+    cursor = query.get('cursor', [None])[0]
+    
+    if limit is not None or cursor is not None:
+        limit = int(limit) if limit else API['page_size']
+        if limit <= 0:
+            raise ValueError(f"无效的limit: {limit}")
+        params['limit'] = min(limit, API['max_page_size'])
+    if cursor:
+        params['cursor'] = decode_cursor(cursor)
+    if 'from' in query:
+        params['date_from'] = parse_date_bound(query['from'][0])
+    if 'to' in query:
+        params['date_to'] = parse_date_bound(query['to'][0], upper=True)
+    
+    return params
+
 
 class TimelineAPIHandler(SimpleHTTPRequestHandler):
     """扩展的HTTP请求处理器，支持API和静态文件"""
     
+    # 持久连接：每个响应都带Content-Length或使用分块传输
+    protocol_version = 'HTTP/1.1'
+    request_body = None
+    pretty = False
+    # 连接已交给变更推送线程，处理器返回后服务器不再关闭或等待它
+    detached = False
+    # 读取请求和发送响应的超时；空闲连接由服务器等待，见ThreadPoolHTTPServer.park()
+    timeout = SERVER.get('request_timeout', 30)
+    # 响应头和响应体分两次写入，关闭Nagle算法避免小响应被延迟发送
+    disable_nagle_algorithm = True
+    
+    def handle(self):
+        """处理连接上的请求；下一个请求尚未到达时把连接交还给服务器，不占用工作线程"""
+        self.close_connection = True
+        self.keep_alive = False
+        
+        self.handle_one_request()
+        while not self.close_connection:
+            if hasattr(self.server, 'park') and not self.request_buffered():
+                self.keep_alive = True
+                return
+            self.handle_one_request()
+    
+    def handle_expect_100(self):
+        """客户端等待100 Continue时，先按请求头检查上传大小，过大时不让客户端发送请求体"""
+        if urlparse(self.path).path.rstrip('/') == '/api/uploads':
+            length = self.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > UPLOAD['max_request_size']:
+                # 请求体未读，响应带Connection: close，之后关闭连接
+                self.request_body = RequestBody(self.rfile, int(length))
+                self.close_connection = True
+                self.send_json_response({'error': f"请求体超过大小限制 {UPLOAD['max_request_size']} 字节"},
+                                        status=413)
+                return False
+        return super().handle_expect_100()
+    
+    def request_buffered(self):
+        """下一个请求的数据是否已经可读（不阻塞）"""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except (BlockingIOError, OSError):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
     def do_GET(self):
         """处理GET请求"""
-        parsed_path = urlparse(self.path)
-        
-        # API路由
-        if parsed_path.path.startswith('/api/'):
-            self.handle_api(parsed_path)
-        else:
-            # 静态文件服务
-            super().do_GET()
+        self.dispatch('GET')
+    
+    def do_HEAD(self):
+        """处理HEAD请求"""
+        self.dispatch('HEAD')
     
     def do_POST(self):
         """处理POST请求"""
-        parsed_path = urlparse(self.path)
-        
-        if parsed_path.path.startswith('/api/'):
-            self.handle_api(parsed_path, method='POST')
-        else:
-            self.send_error(404)
+        self.dispatch('POST')
     
     def do_PUT(self):
         """处理PUT请求"""
-        parsed_path = urlparse(self.path)
-        
-        if parsed_path.path.startswith('/api/'):
-            self.handle_api(parsed_path, method='PUT')
-        else:
-            self.send_error(404)
+        self.dispatch('PUT')
+    
+    def do_PATCH(self):
+        """处理PATCH请求"""
+        self.dispatch('PATCH')
     
     def do_DELETE(self):
         """处理DELETE请求"""
+        self.dispatch('DELETE')
+    
+    def dispatch(self, method):
+        """API请求按路由表处理，其他GET/HEAD请求为静态文件；同时记录请求指标"""
         parsed_path = urlparse(self.path)
-        
-        if parsed_path.path.startswith('/api/'):
-            self.handle_api(parsed_path, method='DELETE')
+        is_api = parsed_path.path.startswith('/api/')
+        route, params = routes.match(parsed_path.path) if is_api else (None, None)
+        if route is not None:
+            label = route.pattern
+        elif not is_api and method in ('GET', 'HEAD'):
+            label = 'static'
         else:
-            self.send_error(404)
+            label = 'unmatched'
+        
+        self.response_status, self.response_size = None, 0
+        self.pretty = False
+        self.request_body = self.open_body(method)
+        started = http_metrics.begin(label) if http_metrics else None
+        try:
+            if is_api:
+                self.handle_api(parsed_path, method, route, params)
+            elif label == 'static':
+                static_files.serve(self, parsed_path.path, head=(method == 'HEAD'))
+            else:
+                self.send_error(404)
+        finally:
+            if self.body_unread():
+                # 请求体没有读完，连接上剩余的数据无法作为下一个请求解析
+                self.close_connection = True
+            if http_metrics:
+                http_metrics.end(label, method, self.response_status or 0,
+                                 self.response_size, started)
     
     def do_OPTIONS(self):
         """处理预检请求"""
-        self.send_response(200)
+        self.request_body = self.open_body('OPTIONS')
+        self.send_response(204)
         self.send_cors_headers()
         self.end_headers()
+        if self.body_unread():
+            self.close_connection = True
+    
+    def open_body(self, method):
+        """按Content-Length限定的请求体（没有请求体时为None）"""
+        if 'Transfer-Encoding' in self.headers:
+            # 不支持分块编码的请求体，处理完这个请求后关闭连接
+            self.close_connection = True
+            return None
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            return None
+        return RequestBody(self.rfile, length)
+    
+    def body_unread(self):
+        """请求体是否还有未读取的部分"""
+        return self.request_body is not None and self.request_body.remaining > 0
     
     def send_cors_headers(self):
         """发送CORS头"""
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         self.send_header('Access-Control-Allow-Credentials', 'true')
     
-    def handle_api(self, parsed_path, method='GET'):
-        """处理API请求"""
-        path = parsed_path.path
-        query = parse_qs(parsed_path.query)
+    def handle_api(self, parsed_path, method, route, params):
+        """处理API请求：调用路由中对应方法的处理函数"""
+        if route is None:
+            self.send_error(404, 'API endpoint not found')
+            return
+        
+        handler = route.handlers.get(method)
+        if handler is None:
+            self.send_json_bytes(dumps_compact({'error': f'不支持的方法: {method}'}).encode('utf-8'),
+                                 status=405, headers={'Allow': route.allow})
+            return
         
         try:
-            # 获取请求体
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = None
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
+            query = parse_qs(parsed_path.query)
+            self.pretty = query.get('pretty', ['0'])[0] in ('1', 'true')
             
-            # 路由处理
-            if path == '/api/config':
-                self.handle_config(method, query, post_data)
-            elif path == '/api/events':
-                self.handle_events(method, query, post_data)
-            elif path == '/api/events/<int>':
-                event_id = int(path.split('/')[-1])
-                self.handle_single_event(method, event_id, query, post_data)
-            elif path == '/api/eras':
-                self.handle_eras(method, query, post_data)
-            elif path == '/api/eras/<int>':
-                era_id = int(path.split('/')[-1])
-                self.handle_single_era(method, era_id, query, post_data)
-            elif path == '/api/generate-json':
-                self.handle_generate_json(method, query, post_data)
-            elif path == '/api/export':
-                self.handle_export(method, query, post_data)
-            elif path == '/api/import':
-                self.handle_import(method, query, post_data)
-            elif path == '/api/backup':
-                self.handle_backup(method, query, post_data)
-            elif path == '/api/health':
-                self.send_json_response({'status': 'ok', 'timestamp': time.time()})
-            else:
-                self.send_error(404, 'API endpoint not found')
+            # 只有POST/PUT/PATCH读取请求体；导入接口边读边解析，不预先读入内存
+            body = None
+            if method in BODY_METHODS:
+                if route.stream_body:
+                    body = self.request_body or RequestBody(self.rfile, 0)
+                elif self.request_body is not None:
+                    if self.request_body.remaining > API['max_body_size']:
+                        self.send_json_response({'error': f"请求体超过大小限制 {API['max_body_size']} 字节"},
+                                                status=413)
+                        return
+                    body = self.request_body.read()
+            
+            # /api/timelines/{timeline_id}/... 下的请求先确认时间线存在
+            if 'timeline_id' in params and not db.timeline_exists(params['timeline_id']):
+                self.send_error(404, 'Timeline not found')
+                return
+            
+            handler(self, query, body, **params)
+        
+        except ValueError as e:
+            # 请求参数或请求体格式错误
+            self.send_json_response({'error': str(e)}, status=400)
         
         except Exception as e:
             print(f"API处理错误: {e}")
             self.send_json_response({'error': str(e)}, status=500)
     
-    def handle_config(self, method, query, post_data):
-        """处理配置请求"""
-        if method == 'GET':
-            config = db.get_timeline_config()
-            self.send_json_response(config)
+    @staticmethod
+    def json_object(body):
+        """解析必须提供的JSON对象请求体，没有请求体或格式错误时抛出ValueError（返回400）"""
+        if not body:
+            raise ValueError("缺少请求体")
+        data = json.loads(body.decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是对象")
+        return data
+    
+    def list_timelines(self, query, body):
+        """列出时间线"""
+        self.send_json_response({'timelines': db.list_timelines()})
+    
+    def create_timeline(self, query, body):
+        """创建时间线"""
+        data = json.loads(body.decode('utf-8')) if body else {}
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是对象")
+        timeline_id = db.create_timeline(
+            title_headline=data.get('title_headline'),
+            title_text=data.get('title_text'),
+            scale=data.get('scale')
+        )
+        self.send_json_response({'status': 'success', 'id': timeline_id}, status=201)
+    
+    def delete_timeline(self, query, body, timeline_id):
+        """删除时间线及其全部事件和时代"""
+        if db.delete_timeline(timeline_id):
+            self.send_json_response({'status': 'success'})
+        else:
+            self.send_error(404, 'Timeline not found')
+    
+    def get_config(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取配置"""
+        self.send_json_response(db.get_timeline_config(timeline_id))
+    
+    def update_config(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """更新配置"""
+        data = self.json_object(body)
+        db.update_timeline_config(
+            title_headline=data.get('title_headline'),
+            title_text=data.get('title_text'),
+            scale=data.get('scale'),
+            timeline_id=timeline_id
+        )
+        self.send_json_response({'status': 'success'})
+    
+    def list_events(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取事件列表（带since参数时返回增量变化）"""
+        if 'since' in query:
+            self.send_changes('event', query, timeline_id)
+            return
+        active_only = query.get('active_only', ['true'])[0].lower() == 'true'
+        page = parse_page_query(query)
+        if 'group' in query:
+            page['group'] = query['group'][0]
         
-        elif method == 'PUT':
-            data = json.loads(post_data.decode('utf-8'))
-            db.update_timeline_config(
-                title_headline=data.get('title_headline'),
-                title_text=data.get('title_text'),
-                scale=data.get('scale')
-            )
+        events, next_key = db.get_events_page(active_only=active_only, timeline_id=timeline_id, **page)
+        self.send_list_response(events, next_key, paged='limit' in page)
+    
+    def list_range(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """与日期窗口（from/to，至少一个）重叠的事件和时代"""
+        if 'from' not in query and 'to' not in query:
+            raise ValueError("缺少 from 或 to")
+        date_from = parse_date_bound(query['from'][0]) if 'from' in query else None
+        date_to = parse_date_bound(query['to'][0], upper=True) if 'to' in query else None
+        events, eras = db.get_range(date_from, date_to, timeline_id=timeline_id)
+        self.send_json_response({'events': events, 'eras': eras})
+    
+    def create_event(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """添加事件"""
+        data = self.json_object(body)
+        event_id = db.add_event(data, timeline_id=timeline_id)
+        self.send_json_response({'status': 'success', 'id': event_id}, status=201)
+    
+    def get_event(self, query, body, event_id, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取单个事件"""
+        event = db.get_event_by_id(event_id, timeline_id)
+        if event:
+            self.send_json_response(event)
+        else:
+            self.send_error(404, 'Event not found')
+    
+    def update_event(self, query, body, event_id, timeline_id=DEFAULT_TIMELINE_ID):
+        """更新事件"""
+        data = self.json_object(body)
+        if db.update_event(event_id, data, timeline_id=timeline_id):
             self.send_json_response({'status': 'success'})
+        else:
+            self.send_error(404, 'Event not found')
     
-    def handle_events(self, method, query, post_data):
-        """处理事件请求"""
-        if method == 'GET':
-            active_only = query.get('active_only', ['true'])[0].lower() == 'true'
-            events = db.get_all_events(active_only=active_only)
-            self.send_json_response(events)
+    def delete_event(self, query, body, event_id, timeline_id=DEFAULT_TIMELINE_ID):
+        """删除事件"""
+        soft_delete = query.get('soft', ['true'])[0].lower() == 'true'
+        if db.delete_event(event_id, soft_delete=soft_delete, timeline_id=timeline_id):
+            self.send_json_response({'status': 'success'})
+        else:
+            self.send_error(404, 'Event not found')
+    
+    def list_eras(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取时代列表（带since参数时返回增量变化）"""
+        if 'since' in query:
+            self.send_changes('era', query, timeline_id)
+            return
+        active_only = query.get('active_only', ['true'])[0].lower() == 'true'
+        page = parse_page_query(query)
         
-        elif method == 'POST':
-            data = json.loads(post_data.decode('utf-8'))
-            event_id = db.add_event(data)
-            self.send_json_response({'status': 'success', 'id': event_id}, status=201)
-    
-    def handle_single_event(self, method, event_id, query, post_data):
-        """处理单个事件请求"""
-        if method == 'GET':
-            event = db.get_event_by_id(event_id)
-            if event:
-                self.send_json_response(event)
-            else:
-                self.send_error(404, 'Event not found')
+        eras, next_key = db.get_eras_page(active_only=active_only, timeline_id=timeline_id, **page)
+        self.send_list_response(eras, next_key, paged='limit' in page)
+    
+    def create_era(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """添加时代"""
+        data = self.json_object(body)
+        era_id = db.add_era(data, timeline_id=timeline_id)
+        self.send_json_response({'status': 'success', 'id': era_id}, status=201)
+    
+    def get_era(self, query, body, era_id, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取单个时代"""
+        era = db.get_era_by_id(era_id, timeline_id)
+        if era:
+            self.send_json_response(era)
+        else:
+            self.send_error(404, 'Era not found')
+    
+    def update_era(self, query, body, era_id, timeline_id=DEFAULT_TIMELINE_ID):
+        """更新时代"""
+        data = self.json_object(body)
+        if db.update_era(era_id, data, timeline_id=timeline_id):
+            self.send_json_response({'status': 'success'})
+        else:
+            self.send_error(404, 'Era not found')
+    
+    def delete_era(self, query, body, era_id, timeline_id=DEFAULT_TIMELINE_ID):
+        """删除时代"""
+        soft_delete = query.get('soft', ['true'])[0].lower() == 'true'
+        if db.delete_era(era_id, soft_delete=soft_delete, timeline_id=timeline_id):
+            self.send_json_response({'status': 'success'})
+        else:
+            self.send_error(404, 'Era not found')
+    
+    def apply_batch(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """批量操作：所有操作在一个事务中执行，全部成功或全部回滚"""
+        data = json.loads(body.decode('utf-8')) if body else {}
+        operations = data.get('operations') if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("缺少 operations")
+        if len(operations) > API['max_batch_size']:
+            raise ValueError(f"每批最多 {API['max_batch_size']} 个操作")
+        
+        try:
+            results = db.apply_batch(operations, timeline_id=timeline_id)
+        except BatchError as e:
+            self.send_json_response({'status': 'failed', 'index': e.index, 'error': e.message},
+                                    status=400)
+            return
+        self.send_json_response({'status': 'success', 'results': results})
+    
+    def search_events(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """全文搜索：q为搜索词，limit/cursor分页"""
+        text = query.get('q', [''])[0].strip()
+        limit = int(query.get('limit', [API['page_size']])[0])
+        if limit <= 0:
+            raise ValueError(f"无效的limit: {limit}")
+        limit = min(limit, API['max_page_size'])
+        cursor = query.get('cursor', [None])[0]
+        offset = 0
+        if cursor:
+            # 搜索结果按相关度排序，游标记录偏移量
+            values = decode_cursor(cursor)
+            if len(values) != 1 or values[0] < 0:
+                raise ValueError(f"无效的游标: {cursor}")
+            offset = values[0]
         
-        elif method == 'PUT':
-            data = json.loads(post_data.decode('utf-8'))
-            success = db.update_event(event_id, data)
-            self.send_json_response({'status': 'success' if success else 'failed'})
+        items, has_more = db.search_events(text, limit, offset, timeline_id=timeline_id)
+        self.send_list_response(items, [offset + limit] if has_more else None, paged=True)
+    
+    def generate_document(self, query, body):
+        """生成JSON文件并返回其内容"""
+        document = db.get_json_document()
+        filepath = db.save_json_to_file(DATABASE['json_output'])
+        db.save_search_index(DATABASE['search_index_output'])
         
-        elif method == 'DELETE':
-            soft_delete = query.get('soft', ['true'])[0].lower() == 'true'
-            success = db.delete_event(event_id, soft_delete=soft_delete)
-            self.send_json_response({'status': 'success' if success else 'failed'})
-    
-    def handle_eras(self, method, query, post_data):
-        """处理时代请求"""
-        if method == 'GET':
-            active_only = query.get('active_only', ['true'])[0].lower() == 'true'
-            eras = db.get_all_eras(active_only=active_only)
-            self.send_json_response(eras)
+        # 返回JSON数据（直接拼接已编码的文档，不再重新序列化）
+        prefix = dumps_compact({'status': 'success', 'filepath': filepath})
+        body = prefix[:-1].encode('utf-8') + b',"data":' + document.body + b'}'
+        self.send_json_bytes(body)
+    
+    def get_document(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """返回缓存的JSON，数据未变化时客户端可用ETag协商"""
+        self.send_document(db.get_json_document(timeline_id))
+    
+    def export_document(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """导出数据库为JSON文件"""
+        filename = 'timeline-export.json' if timeline_id == DEFAULT_TIMELINE_ID else f'timeline-{timeline_id}-export.json'
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
         
-        elif method == 'POST':
-            data = json.loads(post_data.decode('utf-8'))
-            era_id = db.add_era(data)
-            self.send_json_response({'status': 'success', 'id': era_id}, status=201)
-    
-    def handle_single_era(self, method, era_id, query, post_data):
-        """处理单个时代请求"""
-        if method == 'GET':
-            era = None  # 这里需要添加获取单个时代的方法
-            if era:
-                self.send_json_response(era)
-            else:
-                self.send_error(404, 'Era not found')
+        document = db.peek_json_document(timeline_id)
+        if document:
+            # 当前版本的文档已在缓存中，直接发送
+            self.send_document(document, extra_headers=headers)
+        else:
+            # 否则边读数据库边发送，不在内存中生成整个文档
+            self.send_stream(db.iter_json_chunks(timeline_id=timeline_id), headers=headers)
+    
+    def import_document(self, query, body, timeline_id=DEFAULT_TIMELINE_ID):
+        """导入TimelineJS JSON（请求体为流）"""
+        mode = query.get('mode', ['append'])[0]
+        if mode not in ('append', 'replace'):
+            raise ValueError(f"无效的导入模式: {mode}")
         
-        elif method == 'PUT':
-            data = json.loads(post_data.decode('utf-8'))
-            success = db.update_era(era_id, data)
-            self.send_json_response({'status': 'success' if success else 'failed'})
+        report = db.import_json(body, replace=(mode == 'replace'),
+                                batch_size=API['import_batch_size'], timeline_id=timeline_id)
+        self.send_json_response(report)
+    
+    def upload_files(self, query, body):
+        """上传文件（multipart/form-data），边读边写入临时文件，返回可用作media_url的URL"""
+        if self.request_body is None and 'Transfer-Encoding' in self.headers:
+            self.send_json_response({'error': '上传需要Content-Length'}, status=411)
+            return
+        if body.remaining > UPLOAD['max_request_size']:
+            # 按请求头拒绝，不读取请求体（连接随后关闭）
+            self.send_json_response({'error': f"请求体超过大小限制 {UPLOAD['max_request_size']} 字节"},
+                                    status=413)
+            return
         
-        elif method == 'DELETE':
-            soft_delete = query.get('soft', ['true'])[0].lower() == 'true'
-            success = db.delete_era(era_id, soft_delete=soft_delete)
-            self.send_json_response({'status': 'success' if success else 'failed'})
-    
-    def handle_generate_json(self, method, query, post_data):
-        """处理生成JSON请求"""
-        if method == 'POST':
-            json_data = db.generate_json()
-            filepath = db.save_json_to_file()
-            
-            # 返回JSON数据
+        files = []
+        try:
+            for part in MultipartReader.from_content_type(body, self.headers.get('Content-Type')):
+                if part.filename:
+                    files.append(uploads.save(part.filename, part.chunks()))
+        except UploadRejected as e:
+            self.send_json_response({'error': str(e)}, status=e.status)
+            return
+        if not files:
+            raise ValueError("没有上传文件")
+        # 结束标记之后的内容（通常只有换行），读完后连接可以继续使用
+        while body.read(READ_SIZE):
+            pass
+        self.send_json_response({'status': 'success', 'files': files}, status=201)
+    
+    def list_backups(self, query, body):
+        """列出备份"""
+        self.send_json_response({'backups': backups.list()})
+    
+    def create_backup(self, query, body):
+        """创建备份"""
+        backup = backups.create()
+        self.send_json_response({'status': 'success', 'backup': backup}, status=201)
+    
+    def health(self, query, body):
+        """健康检查"""
+        self.send_json_response({'status': 'ok', 'timestamp': time.time()})
+    
+    def get_metrics(self, query, body):
+        """运行指标（Prometheus文本格式）"""
+        self.send_json_bytes(metrics.render().encode('utf-8'), content_type=METRICS_CONTENT_TYPE)
+    
+    def stream_changes(self, query, body):
+        """变更推送（Server-Sent Events）：发送响应头后把连接交给推送线程，不占用工作线程"""
+        if not isinstance(self.server, ThreadPoolHTTPServer):
+            self.send_json_response({'error': '变更推送需要线程池模式'}, status=503)
+            return
+        
+        last_event_id = self.headers.get('Last-Event-ID') or query.get('last_event_id', [None])[0]
+        self.close_connection = True
+        self.send_response(200)
+        self.send_cors_headers()
+        self.send_header('Content-Type', EVENTS_CONTENT_TYPE)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.detached = change_stream.subscribe(self.connection, last_event_id)
+    
+    def send_changes(self, kind, query, timeline_id):
+        """增量同步：返回版本since之后变化的记录和删除标记，以及下次请求使用的版本"""
+        try:
+            since = int(query['since'][0])
+        except ValueError:
+            raise ValueError(f"无效的since: {query['since'][0]}")
+        limit = int(query.get('limit', [API['max_page_size']])[0])
+        if since < 0 or limit <= 0:
+            raise ValueError("since不能为负数，limit必须为正数")
+        
+        items, deleted, version, has_more = db.get_changes(
+            kind, since, min(limit, API['max_page_size']), timeline_id=timeline_id)
+        self.send_json_response({'items': items, 'deleted': deleted, 'version': version, 'has_more': has_more})
+    
+    def send_list_response(self, items, next_key, paged):
+        """发送列表：分页时返回 {items, next_cursor}，否则保持原来的数组格式"""
+        if paged:
             self.send_json_response({
-                'status': 'success',
-                'filepath': filepath,
-                'data': json_data
+                'items': items,
+                'next_cursor': encode_cursor(next_key) if next_key else None
             })
-        
-        elif method == 'GET':
-            # 直接生成并返回JSON
-            json_data = db.generate_json()
-            self.send_json_response(json_data)
-    
-    def handle_export(self, method, query, post_data):
-        """处理导出请求"""
-        if method == 'GET':
-            # 导出数据库为JSON文件
-            json_data = db.generate_json()
-            
-            self.send_response(200)
+        else:
+            self.send_json_response(items)
+    
+    def send_document(self, document, extra_headers=None):
+        """发送缓存的文档，If-None-Match命中时返回304"""
+        encoding = self.response_encoding(len(document.body))
+        etag = encoded_etag(document.etag, encoding)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
             self.send_cors_headers()
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Disposition', 'attachment; filename="timeline-export.json"')
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
             self.end_headers()
-            
-            self.wfile.write(json.dumps(json_data, indent=2).encode('utf-8'))
+            return
+        
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        headers.update(extra_headers or {})
+        # 压缩结果随文档一起缓存，同一版本只压缩一次
+        self.send_json_bytes(document.body, headers=headers, variants=document.variants)
     
-    def handle_import(self, method, query, post_data):
-        """处理导入请求"""
-        if method == 'POST':
-            # TODO: 实现数据导入
-            self.send_json_response({'status': 'import not implemented yet'}, status=501)
+    def send_stream(self, chunks, status=200, content_type='application/json; charset=utf-8',
+                    headers=None):
+        """流式发送响应
+        
+        HTTP/1.1连接使用分块传输（Transfer-Encoding: chunked），
+        HTTP/1.0连接不发送长度，发送完毕后关闭连接。
+        """
+        chunked = self.protocol_version >= 'HTTP/1.1' and self.request_version >= 'HTTP/1.1'
+        encoding = self.response_encoding(content_type=content_type)
+        compressor = StreamCompressor(encoding) if encoding else None
+        
+        self.send_response(status)
+        self.send_cors_headers()
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if COMPRESSION['enabled']:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        
+        def write(data):
+            if compressor:
+                data = compressor.compress(data)
+                if not data:
+                    return
+            self.response_size += len(data)
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+        
+        # 小片段合并后再写入socket，减少系统调用
+        buffer = bytearray()
+        try:
+            for chunk in chunks:
+                buffer += chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                if len(buffer) >= STREAM_BUFFER_SIZE:
+                    write(bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                write(bytes(buffer))
+            if compressor:
+                tail = compressor.finish()
+                compressor = None
+                if tail:
+                    write(tail)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        finally:
+            # 客户端断开时也要结束生成器（释放其中的读事务）
+            if hasattr(chunks, 'close'):
+                chunks.close()
     
-    def handle_backup(self, method, query, post_data):
-        """处理备份请求"""
-        if method == 'POST':
-            # TODO: 实现数据库备份
-            self.send_json_response({'status': 'backup not implemented yet'}, status=501)
+    def response_encoding(self, size=None, content_type='application/json'):
+        """按Accept-Encoding选择响应的压缩编码，不压缩时返回None"""
+        if not COMPRESSION['enabled'] or not is_compressible(content_type):
+            return None
+        if size is not None and size < COMPRESSION['min_size']:
+            return None
+        return choose_encoding(self.headers.get('Accept-Encoding'))
     
-    def send_json_response(self, data, status=200):
-        """发送JSON响应"""
+    def send_json_bytes(self, body, status=200, headers=None, variants=None,
+                        content_type='application/json; charset=utf-8'):
+        """发送已编码的JSON响应（variants为可选的 {编码: 压缩结果} 缓存）"""
+        encoding = self.response_encoding(len(body), content_type)
+        if encoding:
+            compressed = variants.get(encoding) if variants is not None else None
+            if compressed is None:
+                compressed = compress(body, encoding)
+                if variants is not None:
+                    variants[encoding] = compressed
+            body = compressed
+        
         self.send_response(status)
         self.send_cors_headers()
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if COMPRESSION['enabled']:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def send_json_response(self, data, status=200):
+        """发送JSON响应（默认紧凑格式，请求参数pretty=1时缩进）"""
+        if self.pretty:
+            response = json.dumps(data, ensure_ascii=False, indent=2)
+        else:
+            response = dumps_compact(data)
+        self.send_json_bytes(response.encode('utf-8'), status=status)
+    
+    def send_response(self, code, message=None):
+        """发送状态行，并按连接状态发送Connection头"""
+        self.response_status = code
+        super().send_response(code, message)
+        if self.body_unread():
+            # 请求体未读完（例如404/405或处理出错），响应后关闭连接
+            self.send_header('Connection', 'close')
+        elif not self.close_connection and self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'keep-alive')
+    
+    def send_error(self, code, message=None, explain=None):
+        """发送错误页面；与基类不同，请求完整读取时不关闭连接"""
+        try:
+            short_message, long_message = self.responses[code]
+        except KeyError:
+            short_message, long_message = '???', '???'
+        message = short_message if message is None else message
+        explain = long_message if explain is None else explain
+        self.log_error("code %d, message %s", code, message)
+        self.send_response(code, message)
+        if self.close_connection and not self.body_unread():
+            self.send_header('Connection', 'close')
+        
+        body = None
+        if code >= 200 and code not in (204, 205, 304):
+            body = (self.error_message_format % {
+                'code': code,
+                'message': html.escape(message, quote=False),
+                'explain': html.escape(explain, quote=False)
+            }).encode('utf-8', 'replace')
+            self.send_header('Content-Type', self.error_content_type)
+            self.send_header('Content-Length', str(len(body)))
         self.end_headers()
         
-        response = json.dumps(data, ensure_ascii=False, indent=2)
-        self.wfile.write(response.encode('utf-8'))
+        if self.command != 'HEAD' and body:
+            self.wfile.write(body)
+    
+    def send_header(self, keyword, value):
+        """记录响应体大小（用于请求指标）"""
+        if keyword == 'Content-Length':
+            self.response_size = int(value)
+        super().send_header(keyword, value)
     
     def log_message(self, format, *args):
         """自定义日志格式"""
         print(f"{self.log_date_time_string()} {format % args}")
 
 
+# API路由表（启动时编译一次）
+routes = Router()
+routes.add('/api/config', GET=TimelineAPIHandler.get_config, PUT=TimelineAPIHandler.update_config)
+routes.add('/api/events', GET=TimelineAPIHandler.list_events, POST=TimelineAPIHandler.create_event)
+routes.add('/api/events/{event_id:int}', GET=TimelineAPIHandler.get_event,
+           PUT=TimelineAPIHandler.update_event, DELETE=TimelineAPIHandler.delete_event)
+routes.add('/api/eras', GET=TimelineAPIHandler.list_eras, POST=TimelineAPIHandler.create_era)
+routes.add('/api/eras/{era_id:int}', GET=TimelineAPIHandler.get_era,
+           PUT=TimelineAPIHandler.update_era, DELETE=TimelineAPIHandler.delete_era)
+routes.add('/api/batch', POST=TimelineAPIHandler.apply_batch)
+routes.add('/api/search', GET=TimelineAPIHandler.search_events)
+routes.add('/api/range', GET=TimelineAPIHandler.list_range)
+routes.add('/api/generate-json', GET=TimelineAPIHandler.get_document,
+           POST=TimelineAPIHandler.generate_document)
+routes.add('/api/export', GET=TimelineAPIHandler.export_document)
+routes.add('/api/import', POST=TimelineAPIHandler.import_document, stream_body=True)
+routes.add('/api/uploads', POST=TimelineAPIHandler.upload_files, stream_body=True)
+routes.add('/api/backup', GET=TimelineAPIHandler.list_backups, POST=TimelineAPIHandler.create_backup)
+routes.add('/api/health', GET=TimelineAPIHandler.health)
+routes.add('/api/metrics', GET=TimelineAPIHandler.get_metrics)
+routes.add('/api/changes', GET=TimelineAPIHandler.stream_changes)
+
+# 多时间线：/api/timelines/{timeline_id}/... 与上面的接口相同，上面的旧接口作用于默认时间线
+routes.add('/api/timelines', GET=TimelineAPIHandler.list_timelines, POST=TimelineAPIHandler.create_timeline)
+routes.add('/api/timelines/{timeline_id:int}', GET=TimelineAPIHandler.get_config,
+           PUT=TimelineAPIHandler.update_config, DELETE=TimelineAPIHandler.delete_timeline)
+routes.add('/api/timelines/{timeline_id:int}/events', GET=TimelineAPIHandler.list_events,
+           POST=TimelineAPIHandler.create_event)
+routes.add('/api/timelines/{timeline_id:int}/events/{event_id:int}', GET=TimelineAPIHandler.get_event,
+           PUT=TimelineAPIHandler.update_event, DELETE=TimelineAPIHandler.delete_event)
+routes.add('/api/timelines/{timeline_id:int}/eras', GET=TimelineAPIHandler.list_eras,
+           POST=TimelineAPIHandler.create_era)
+routes.add('/api/timelines/{timeline_id:int}/eras/{era_id:int}', GET=TimelineAPIHandler.get_era,
+           PUT=TimelineAPIHandler.update_era, DELETE=TimelineAPIHandler.delete_era)
+routes.add('/api/timelines/{timeline_id:int}/batch', POST=TimelineAPIHandler.apply_batch)
+routes.add('/api/timelines/{timeline_id:int}/search', GET=TimelineAPIHandler.search_events)
+routes.add('/api/timelines/{timeline_id:int}/range', GET=TimelineAPIHandler.list_range)
+routes.add('/api/timelines/{timeline_id:int}/document', GET=TimelineAPIHandler.get_document)
+routes.add('/api/timelines/{timeline_id:int}/export', GET=TimelineAPIHandler.export_document)
+routes.add('/api/timelines/{timeline_id:int}/import', POST=TimelineAPIHandler.import_document,
+           stream_body=True)
+
+
 class StaticFileHandler(TimelineAPIHandler):
     """处理静态文件请求"""
     
     def __init__(self, *args, **kwargs):
-        # 设置当前目录为项目根目录
-        os.chdir(os.path.dirname(os.path.abspath(__file__)))
-        super().__init__(*args, **kwargs)
+        # 静态文件按配置的根目录解析，不切换进程的当前目录
+        super().__init__(*args, directory=STATIC['root'], **kwargs)
 
 
-def main():
-    """主函数"""
+class ThreadPoolHTTPServer(HTTPServer):
+    """使用有界线程池并发处理请求的HTTP服务器
+    
+    持久连接在两个请求之间不占用工作线程：处理器返回后连接交给等待线程（selector），
+    下一个请求到达时再提交到线程池，空闲超过keep_alive_timeout秒的连接被关闭。
+    """
+    
+    def __init__(self, server_address, handler_class, max_workers=16,
+                 max_pending=64, shutdown_timeout=30, keep_alive_timeout=15):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='http-worker')
+        # 处理中+排队中的请求数上限，线程池满时accept线程在此等待（背压）
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self.shutdown_timeout = shutdown_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        
+        # 空闲的持久连接：{socket: (客户端地址, 过期时间)}，只由等待线程访问
+        self._parked = {}
+        self._park_queue = deque()
+        # 已有新请求到达、等待线程池空位的连接（只由等待线程访问，有空位时按到达顺序提交）
+        self._ready = deque()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._closing = False
+        super().__init__(server_address, handler_class)
+        self._waiter = threading.Thread(target=self._wait_idle, name='http-keepalive', daemon=True)
+        self._waiter.start()
+    
+    def process_request(self, request, client_address):
+        """把请求交给线程池处理"""
+        self._slots.acquire()
+        self._submit(request, client_address)
+    
+    def _submit(self, request, client_address):
+        """已取得空位后提交到线程池"""
+        with self._idle:
+            self._in_flight += 1
+        try:
+            self.executor.submit(self.process_request_worker, request, client_address)
+        except RuntimeError:
+            # 线程池已关闭，直接丢弃连接
+            self._request_done()
+            self.shutdown_request(request)
+    
+    def process_request_worker(self, request, client_address):
+        """在工作线程中处理连接上已到达的请求"""
+        keep_alive = detached = False
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+            keep_alive = getattr(handler, 'keep_alive', False)
+            detached = getattr(handler, 'detached', False)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if not (detached or keep_alive and self.park(request, client_address)):
+                self.shutdown_request(request)
+            self._request_done()
+    
+    def park(self, request, client_address):
+        """把空闲的持久连接交给等待线程，服务器正在停止时返回False"""
+        if self._closing:
+            return False
+        self._park_queue.append((request, client_address))
+        self._wakeup()
+        return True
+    
+    def _wakeup(self):
+        try:
+            self._wakeup_write.send(b'\0')
+        except OSError:
+            pass
+    
+    def _wait_idle(self):
+        """等待线程：空闲连接可读时重新提交，超时后关闭
+        
+        提交不阻塞：线程池已满时连接进入_ready，请求完成释放空位后（_request_done唤醒）再提交，
+        期间等待线程照常接收和清理其他空闲连接。
+        """
+        while not self._closing:
+            while self._ready and self._slots.acquire(blocking=False):
+                self._submit(*self._ready.popleft())
+            
+            now = time.monotonic()
+            while self._park_queue:
+                request, client_address = self._park_queue.popleft()
+                self._parked[request] = (client_address, now + self.keep_alive_timeout)
+                self._selector.register(request, selectors.EVENT_READ)
+            
+            deadline = min((expires for _, expires in self._parked.values()),
+                           default=now + self.keep_alive_timeout)
+            for key, _ in self._selector.select(max(deadline - now, 0)):
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        while self._wakeup_read.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                request = key.fileobj
+                self._selector.unregister(request)
+                client_address, _ = self._parked.pop(request)
+                if self._ready or not self._slots.acquire(blocking=False):
+                    self._ready.append((request, client_address))
+                else:
+                    self._submit(request, client_address)
+            
+            now = time.monotonic()
+            for request in [request for request, (_, expires) in self._parked.items() if expires <= now]:
+                self._selector.unregister(request)
+                del self._parked[request]
+                self.shutdown_request(request)
+    
+    def _request_done(self):
+        self._slots.release()
+        if self._ready:
+            # 有连接在等待空位
+            self._wakeup()
+        with self._idle:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+    
+    def drain(self, timeout=None):
+        """等待处理中的请求完成，返回是否全部完成"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+    
+    def server_close(self):
+        """停止监听，等待处理中的请求完成后关闭空闲连接和线程池"""
+        super().server_close()
+        if not self.drain(self.shutdown_timeout):
+            print(f"等待超时，仍有 {self._in_flight} 个请求未完成")
+        self._closing = True
+        self._wakeup()
+        self._waiter.join(timeout=5)
+        for request in (list(self._parked) + [request for request, _ in self._park_queue]
+                        + [request for request, _ in self._ready]):
+            self.shutdown_request(request)
+        self._parked.clear()
+        self._park_queue.clear()
+        self._ready.clear()
+        self._selector.close()
+        self._wakeup_read.close()
+        self._wakeup_write.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_server():
+    """根据配置创建HTTP服务器"""
+    server_address = (SERVER['host'], SERVER['port'])
+    if SERVER.get('threaded', True):
+        return ThreadPoolHTTPServer(
+            server_address, StaticFileHandler,
+            max_workers=SERVER.get('max_workers', 16),
+            max_pending=SERVER.get('max_pending', 64),
+            shutdown_timeout=SERVER.get('shutdown_timeout', 30),
+            keep_alive_timeout=SERVER.get('keep_alive_timeout', 15)
+        )
+    return HTTPServer(server_address, StaticFileHandler)
+
+
+def precompress_static():
+    """为静态目录中的可压缩文件生成压缩副本"""
+    try:
+        count = precompressed.build_all(COMPRESSION['precompress_dirs'],
+                                        static_files.guess_type)
+        print(f"静态文件预压缩完成: {count} 个压缩副本")
+    except OSError as e:
+        print(f"静态文件预压缩失败: {e}")
+
+
+def serve():
+    """启动HTTP服务器"""
     print("=== TimelineJS 数据管理系统 ===")
     
-    # 初始化配置
+    # 初始化配置，创建或升级数据库表结构
     init_config()
+    db.init_database()
     
     # 启动HTTP服务器
-    server_address = (SERVER['host'], SERVER['port'])
-    httpd = HTTPServer(server_address, StaticFileHandler)
+    httpd = create_server()
+    
+    # SIGTERM时与Ctrl+C一样优雅停止（shutdown需在其他线程调用）
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
     
     print(f"\n服务器启动在: http://{SERVER['host']}:{SERVER['port']}")
     print(f"管理后台: http://{SERVER['host']}:{SERVER['port']}/admin/admin.html")
@@ -278,24 +1033,143 @@ def main():
     print("\nAPI端点:")
     print("  GET  /api/config           - 获取配置")
     print("  PUT  /api/config           - 更新配置")
-    print("  GET  /api/events           - 获取所有事件")
+    print("  GET  /api/events           - 获取事件（limit/cursor分页，from/to/group过滤，since=版本增量同步）")
     print("  POST /api/events           - 添加事件")
     print("  GET  /api/events/{id}      - 获取单个事件")
     print("  PUT  /api/events/{id}      - 更新事件")
     print("  DELETE /api/events/{id}    - 删除事件")
-    print("  GET  /api/eras             - 获取所有时代")
+    print("  GET  /api/eras             - 获取时代（limit/cursor分页，from/to过滤）")
     print("  POST /api/eras             - 添加时代")
+    print("  POST /api/batch            - 批量增删改事件和时代（单个事务）")
     print("  POST /api/generate-json    - 生成JSON文件")
+    print("  POST /api/import           - 导入TimelineJS JSON（mode=append|replace）")
+    print("  POST /api/uploads          - 上传文件（multipart/form-data，返回可用作media_url的URL）")
+    print("  GET  /api/backup           - 列出备份")
+    print("  POST /api/backup           - 创建备份")
+    print("  GET  /api/search?q=        - 全文搜索事件（limit/cursor分页）")
+    print("  GET  /api/range?from=&to=  - 与时间窗口重叠的事件和时代")
+    print("  GET  /api/timelines        - 列出时间线（POST 创建）")
+    print("  GET  /api/timelines/{id}   - 时间线配置（PUT 更新，DELETE 删除）")
+    print("       /api/timelines/{id}/events|eras|batch|search|range|document|export|import")
+    print("                             - 指定时间线的接口（旧接口作用于默认时间线）")
+    print("  GET  /api/changes          - 变更推送（Server-Sent Events，Last-Event-ID续传）")
+    print("  GET  /api/metrics          - 运行指标（Prometheus格式）")
     print("  GET  /api/health           - 健康检查")
+    if isinstance(httpd, ThreadPoolHTTPServer):
+        print(f"\n并发模式: {SERVER.get('max_workers', 16)} 个工作线程")
+    if COMPRESSION['enabled'] and COMPRESSION['precompress_dirs']:
+        # 后台预压缩静态文件，期间的请求按需生成
+        threading.Thread(target=precompress_static, name='precompress', daemon=True).start()
+    if DATABASE['external_check_interval'] > 0:
+        db.start_watch(DATABASE['external_check_interval'])
+    if DATABASE['backup_interval'] > 0:
+        backups.start_schedule(DATABASE['backup_interval'])
+        print(f"定时备份: 每 {DATABASE['backup_interval']} 秒，保留 {DATABASE['backup_keep']} 个")
+    if MEDIA['enabled']:
+        if media.available:
+            media.start()
+            print(f"图片处理: {MEDIA['workers']} 个进程，输出到 {MEDIA['url_prefix']}")
+        else:
+            print("图片处理: 未安装Pillow，事件图片按原样使用")
     print("\n按 Ctrl+C 停止服务器")
     
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
-        print("\n\n服务器已停止")
-        db.close()
+        pass
+    finally:
+        print("\n\n正在停止服务器，等待处理中的请求完成...")
+        backups.stop_schedule()
+        db.stop_watch()
+        change_stream.close()
+        media.close()
         httpd.server_close()
+        db.close()
+        print("服务器已停止")
+
+
+def run_import(filepath, replace=False):
+    """命令行导入TimelineJS JSON文件"""
+    started = time.perf_counter()
+    with open(filepath, 'rb') as f:
+        report = db.import_json(f, replace=replace, batch_size=API['import_batch_size'])
+    db.save_json_to_file(DATABASE['json_output'])
+    db.save_search_index(DATABASE['search_index_output'])
+    elapsed = time.perf_counter() - started
+    
+    print(f"导入完成: {report['events']} 个事件, {report['eras']} 个时代, 用时 {elapsed:.2f} 秒")
+    for error in report['errors']:
+        print(f"  {error['type']} #{error['index']}: {error['error']}")
+    if report['error_count'] > len(report['errors']):
+        print(f"  ……共 {report['error_count']} 个错误")
+    return 1 if report['error_count'] else 0
+
+
+def run_media():
+    """命令行为所有事件图片生成缩略图和限宽副本"""
+    if not media.available:
+        print("错误: 需要安装Pillow（pip install Pillow）")
+        return 1
+    started = time.perf_counter()
+    try:
+        count = media.process_all()
+    finally:
+        media.close()
+    print(f"图片处理完成: {count} 张图片, 用时 {time.perf_counter() - started:.2f} 秒")
+    return 0
+
+
+def run_restore(name):
+    """命令行从备份恢复（参数为备份目录中的备份名或备份文件路径）"""
+    path = name if os.path.exists(name) else backups.resolve(name)
+    backups.restore(path)
+    db.save_json_to_file(DATABASE['json_output'])
+    if DATABASE['external_check_interval'] > 0:
+        print(f"运行中的服务器会在 {DATABASE['external_check_interval']} 秒内发现恢复的数据并通知订阅者")
+    return 0
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='TimelineJS 数据管理系统')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('serve', help='启动HTTP服务器（默认）')
+    import_parser = commands.add_parser('import', help='导入TimelineJS JSON文件')
+    import_parser.add_argument('file', help='TimelineJS JSON文件路径')
+    import_parser.add_argument('--replace', action='store_true', help='导入前清空现有事件和时代')
+    commands.add_parser('search-index', help='生成离线搜索索引文件')
+    commands.add_parser('media', help='为事件图片生成缩略图和限宽副本')
+    commands.add_parser('backup', help='创建数据库备份')
+    commands.add_parser('backups', help='列出数据库备份')
+    restore_parser = commands.add_parser('restore', help='从备份恢复数据库')
+    restore_parser.add_argument('name', help='备份名（见 backups 命令）或备份文件路径')
+    args = parser.parse_args(argv)
+    
+    if args.command in ('import', 'search-index', 'media', 'backup', 'backups', 'restore'):
+        try:
+            if args.command == 'import':
+                return run_import(args.file, replace=args.replace)
+            if args.command == 'media':
+                return run_media()
+            if args.command == 'search-index':
+                db.save_search_index(DATABASE['search_index_output'])
+            elif args.command == 'backup':
+                backups.create()
+            elif args.command == 'backups':
+                for backup in backups.list():
+                    print(f"{backup['name']}  {backup['size']:>12,} 字节  {backup['created_at']}")
+            else:
+                return run_restore(args.name)
+            return 0
+        except ValueError as e:
+            print(f"错误: {e}")
+            return 1
+        finally:
+            db.close()
+    
+    serve()
+    return 0
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
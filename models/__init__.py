@@ -1 +1,2 @@
-from .tl_story import TimelineDatabase
\ No newline at end of file
+from .tl_story import TimelineDatabase
+from .connection import ConnectionPool
\ No newline at end of file
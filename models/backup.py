@@ -0,0 +1,199 @@
+"""
+SQLite 在线备份与恢复
+文件名: models/backup.py
+"""
+
+import os
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+from .sync import change_log_snapshot, restore_change_log
+
+BACKUP_PREFIX = 'timeline-'
+BACKUP_SUFFIXES = ('.db', '.db.gz')
+
+
+class BackupManager:
+    """使用SQLite备份API在线备份：分批复制页并在批次间休眠，备份期间读写照常进行"""
+
+    def __init__(self, db, backup_dir, pages=256, sleep=0.05, keep=10, compress=True):
+        self.db = db
+        self.backup_dir = backup_dir
+        self.pages = pages
+        self.sleep = sleep
+        self.keep = keep
+        self.compress = compress
+
+        # 同一时间只运行一个备份或恢复
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def create(self):
+        """创建一个备份，返回备份信息"""
+        with self._lock:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            name = BACKUP_PREFIX + datetime.now().strftime('%Y%m%d-%H%M%S-%f') + '.db'
+            tmp_path = os.path.join(self.backup_dir, name + '.tmp')
+
+            try:
+                self._copy(tmp_path)
+                if self.compress:
+                    name += '.gz'
+                    self._gzip(tmp_path, os.path.join(self.backup_dir, name + '.tmp'))
+                    os.remove(tmp_path)
+                    tmp_path = os.path.join(self.backup_dir, name + '.tmp')
+                os.replace(tmp_path, os.path.join(self.backup_dir, name))
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            self._rotate()
+
+        print(f"数据库已备份: {name}")
+        return self._info(name)
+
+    def _copy(self, target_path):
+        """把数据库复制到target_path"""
+        source = sqlite3.connect(self.db.db_path, isolation_level=None)
+        target = sqlite3.connect(target_path)
+        try:
+            # 在同一个读事务内完成复制：WAL模式下备份读取固定快照，
+            # 其他连接的写入不会使备份从头重来，也不会被备份阻塞
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            source.backup(target, pages=self.pages, sleep=self.sleep)
+            source.execute('COMMIT')
+            # 备份文件不使用WAL，单个文件即是完整的数据库
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+            source.close()
+
+    @staticmethod
+    def _gzip(source_path, target_path):
+        with open(source_path, 'rb') as src, gzip.open(target_path, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def _rotate(self):
+        """只保留最新的keep个备份"""
+        if not self.keep or self.keep <= 0:
+            return
+        for name in self._names()[self.keep:]:
+            os.remove(os.path.join(self.backup_dir, name))
+            print(f"已删除旧备份: {name}")
+
+    def _names(self):
+        """备份文件名，最新的在前（文件名中的时间戳可直接按字符串排序）"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = [name for name in os.listdir(self.backup_dir)
+                 if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES)]
+        return sorted(names, reverse=True)
+
+    def _info(self, name):
+        path = os.path.join(self.backup_dir, name)
+        stat = os.stat(path)
+        return {
+            'name': name,
+            'size': stat.st_size,
+            'compressed': name.endswith('.gz'),
+            'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds')
+        }
+
+    def list(self):
+        """列出现有备份，最新的在前"""
+        return [self._info(name) for name in self._names()]
+
+    def resolve(self, name):
+        """备份名转换为备份目录中的路径，名称无效或不存在时抛出ValueError"""
+        if os.path.basename(name) != name or name not in self._names():
+            raise ValueError(f"备份不存在: {name}")
+        return os.path.join(self.backup_dir, name)
+
+    def restore(self, path):
+        """用备份文件覆盖当前数据库（在线进行，恢复期间写事务排队等待）
+
+        恢复后所有记录重新记入变更表（见restore_change_log），在其他进程中运行的服务器
+        由此发现数据已变化（TimelineDatabase.check_external），丢弃缓存并通知订阅者。
+        """
+        name = os.path.basename(path)
+        with self._lock:
+            tmp_path = None
+            try:
+                if path.endswith('.gz'):
+                    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=self.backup_dir)
+                    os.close(fd)
+                    with gzip.open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    path = tmp_path
+
+                source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+                try:
+                    self._check(source)
+                    with self.db.pool.write_lock:
+                        with self.db.pool.read() as conn:
+                            changes = change_log_snapshot(conn)
+                        target = sqlite3.connect(self.db.db_path,
+                                                 timeout=self.db.pool.busy_timeout / 1000)
+                        try:
+                            source.backup(target)
+                        finally:
+                            target.close()
+                finally:
+                    source.close()
+            except (OSError, EOFError) as e:
+                raise ValueError(f"无法读取备份文件: {e}")
+            finally:
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            # 补齐旧备份中可能缺少的表和索引，同步版本不倒退，并使所有缓存失效
+            self.db.init_database()
+            with self.db.pool.transaction() as conn:
+                restore_change_log(conn, changes)
+            self.db.invalidate()
+
+        print(f"数据库已从备份恢复: {name}")
+
+    @staticmethod
+    def _check(conn):
+        """确认是完好的时间线数据库"""
+        try:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"无效的备份文件: {e}")
+        if result != 'ok':
+            raise ValueError(f"备份文件已损坏: {result}")
+        if 'timeline_events' not in tables:
+            raise ValueError("备份文件中没有时间线数据")
+
+    def start_schedule(self, interval):
+        """启动定时备份线程，每interval秒备份一次"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_schedule, args=(interval,),
+                                        name='backup-scheduler', daemon=True)
+        self._thread.start()
+
+    def _run_schedule(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.create()
+            except Exception as e:
+                print(f"定时备份失败: {e}")
+
+    def stop_schedule(self):
+        """停止定时备份线程（正在进行的备份会先完成）"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,146 @@
+"""
+生成结果缓存
+文件名: models/cache.py
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CachedDocument:
+    """已编码的文档及其校验值"""
+
+    __slots__ = ('version', 'body', 'etag', 'variants')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        # 按编码缓存的压缩结果 {编码: 字节}
+        self.variants = {}
+        # 强ETag：内容相同则ETag相同，即使数据版本已变化
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+class DocumentCache:
+    """按键（时间线id）缓存生成的文档，版本变化后下一次读取时重新生成
+
+    超过max_entries个文档或总大小（含压缩结果）超过max_bytes时淘汰最久未使用的文档，
+    淘汰时调用on_evict(键)。
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 同一文档同一时间只生成一次，避免版本变化后并发请求重复生成；不同文档可并行生成
+        self._build_locks = {}
+
+    def get(self, key, version, build):
+        """返回key在version时的文档，缓存失效时调用build()生成字节内容"""
+        entry = self.peek(key, version)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            entry = self.peek(key, version)
+            if entry is None:
+                entry = CachedDocument(version, build())
+                self._store(key, entry)
+        return entry
+
+    def peek(self, key, version):
+        """返回key在version时的缓存文档，没有时返回None"""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, entry):
+        evicted = []
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            size = sum(self._entry_size(cached) for cached in self._entries.values())
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                              or size > self.max_bytes):
+                old_key, old = self._entries.popitem(last=False)
+                size -= self._entry_size(old)
+                self._build_locks.pop(old_key, None)
+                evicted.append(old_key)
+        if self.on_evict is not None:
+            for old_key in evicted:
+                self.on_evict(old_key)
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry.body) + sum(len(body) for body in list(entry.variants.values()))
+
+    def discard(self, key):
+        """丢弃一个文档"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+class FragmentCache:
+    """缓存单条事件/时代序列化后的片段，按 (类型, id) 存放，updated_at变化即失效
+
+    类型可以是任意可哈希的键，例如 ('event', 时间线id)，prune()和drop()按类型操作。
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+        # 每次discard()/drop()/clear()递增；生成期间有写入时，本次生成的片段不写入缓存
+        self.generation = 0
+
+    def get(self, kind, row_id, stamp):
+        """返回缓存的片段，不存在或已过期时返回None"""
+        entry = self._items.get(kind, {}).get(row_id)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        return None
+
+    def put(self, kind, row_id, stamp, fragment, generation):
+        """缓存片段；generation是开始读取数据前的generation值"""
+        with self._lock:
+            if generation == self.generation:
+                self._items.setdefault(kind, {})[row_id] = (stamp, fragment)
+
+    def discard(self, kind, row_id):
+        """写入提交后调用，丢弃该记录的片段"""
+        with self._lock:
+            self.generation += 1
+            self._items.get(kind, {}).pop(row_id, None)
+
+    def prune(self, kind, live_ids):
+        """删除已不存在（已删除或停用）的记录的片段"""
+        with self._lock:
+            items = self._items.get(kind)
+            if items and len(items) > len(live_ids):
+                for row_id in [row_id for row_id in items if row_id not in live_ids]:
+                    del items[row_id]
+
+    def drop(self, kind):
+        """丢弃一种类型的全部片段"""
+        with self._lock:
+            self.generation += 1
+            self._items.pop(kind, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self.generation += 1
+            self._items = {}
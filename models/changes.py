@@ -0,0 +1,80 @@
+"""
+数据变更通知：写事务提交后记录变更，供 /api/changes（Server-Sent Events）推送
+文件名: models/changes.py
+"""
+
+import time
+import threading
+from collections import deque
+from itertools import islice
+
+
+class Change:
+    """一条已提交的变更"""
+
+    __slots__ = ('seq', 'entity', 'id', 'op', 'timeline', 'version')
+
+    def __init__(self, seq, entity, row_id, op, timeline, version):
+        self.seq = seq
+        self.entity = entity
+        self.id = row_id
+        self.op = op
+        self.timeline = timeline
+        self.version = version
+
+    def to_dict(self):
+        return {'entity': self.entity, 'id': self.id, 'op': self.op,
+                'timeline': self.timeline, 'version': self.version}
+
+
+class ChangeFeed:
+    """最近变更的环形缓冲区，序号连续递增，订阅者按序号续传
+
+    事件id为 "进程标识-序号"，服务器重启后旧的id无法续传（since返回None），客户端应重新加载。
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.epoch = format(time.time_ns() // 1000000, 'x')
+        self._changes = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def add_listener(self, listener):
+        """注册新变更的回调（在发布变更的线程中调用，不应阻塞）"""
+        self._listeners.append(listener)
+
+    def publish(self, entity, row_id, op, timeline_id, version):
+        """记录一条变更（写事务提交后调用）"""
+        with self._lock:
+            self._seq += 1
+            self._changes.append(Change(self._seq, entity, row_id, op, timeline_id, version))
+        for listener in self._listeners:
+            listener()
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def parse_event_id(self, event_id):
+        """事件id中的序号，不是本进程的id时返回None"""
+        epoch, _, seq = (event_id or '').strip().partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def since(self, seq):
+        """序号seq之后的变更列表；seq之后的变更已不在缓冲区中时返回None"""
+        with self._lock:
+            if seq > self._seq:
+                return None
+            if seq == self._seq:
+                return []
+            first = self._changes[0].seq if self._changes else self._seq + 1
+            if seq < first - 1:
+                return None
+            return list(islice(self._changes, seq - first + 1, None))
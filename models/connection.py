@@ -0,0 +1,233 @@
+"""
+SQLite 连接管理
+文件名: models/connection.py
+"""
+
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ObservedCursor(sqlite3.Cursor):
+    """执行语句时把SQL和耗时报告给连接的observer（不含逐行读取结果的时间）"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.observer.statement(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.observer.statement(sql, time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self.connection.observer.statement(sql_script, time.perf_counter() - start)
+
+
+class ObservedConnection(sqlite3.Connection):
+    """游标默认为ObservedCursor；Connection.execute等快捷方法也经过计时"""
+
+    observer = None
+
+    def cursor(self, factory=ObservedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class ConnectionPool:
+    """每个线程持有一个长连接，连接创建时一次性完成PRAGMA配置
+
+    observer不为None时，连接的建立和每条语句的执行时间通过
+    observer.connected(秒) / observer.statement(sql, 秒) 报告。
+    """
+
+    def __init__(self, db_path, journal_mode='WAL', synchronous='NORMAL',
+                 cache_size=-16000, mmap_size=0, busy_timeout=5000, observer=None):
+        self.db_path = db_path
+        self.observer = observer
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+
+        self._local = threading.local()
+        self._connections = []
+        self._registry_lock = threading.Lock()
+        # 正在read()/transaction()中使用的连接；close_all()时推迟到使用结束后关闭
+        self._busy = set()
+        self._retired = set()
+        # SQLite同一时间只允许一个写事务，进程内的写事务在此排队
+        self.write_lock = threading.RLock()
+        self._commit_hooks = []
+        self._begin_hooks = []
+        self._precommit_hooks = []
+        self._open_hooks = []
+
+    def _open(self):
+        """创建并配置新连接"""
+        start = time.perf_counter()
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000,
+            isolation_level=None,      # 事务由read()/transaction()显式控制
+            check_same_thread=False,   # 允许close_all()在其他线程关闭连接
+            factory=ObservedConnection if self.observer else sqlite3.Connection
+        )
+        if self.observer:
+            conn.observer = self.observer
+        conn.row_factory = sqlite3.Row  # 返回字典格式的结果
+
+        if self.journal_mode:
+            conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        if self.synchronous:
+            conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        if self.cache_size:
+            conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        if self.mmap_size:
+            conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute('PRAGMA foreign_keys = ON')
+        for hook in self._open_hooks:
+            hook(conn)
+        if self.observer:
+            self.observer.connected(time.perf_counter() - start)
+
+        with self._registry_lock:
+            self._connections.append(conn)
+        return conn
+
+    def add_open_hook(self, hook):
+        """注册新连接配置完成后的回调（参数为连接，在打开连接的线程中调用）"""
+        self._open_hooks.append(hook)
+
+    def add_commit_hook(self, hook):
+        """注册写事务提交后的回调（在写锁内按提交顺序调用）"""
+        self._commit_hooks.append(hook)
+
+    def add_begin_hook(self, hook):
+        """注册写事务开始后的回调（参数为连接，已持有数据库的写锁，其他进程无法写入）"""
+        self._begin_hooks.append(hook)
+
+    def add_precommit_hook(self, hook):
+        """注册写事务提交前的回调（参数为连接，可读取本事务写入后的状态）"""
+        self._precommit_hooks.append(hook)
+
+    def after_commit(self, callback):
+        """当前写事务提交后调用callback（在写锁内、commit hook之后），回滚时丢弃；
+        不在写事务中时立即调用"""
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            callback()
+        else:
+            pending.append(callback)
+
+    def connection(self):
+        """获取当前线程的连接，不存在时创建"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def current(self):
+        """当前线程已有的连接（可能为None）"""
+        return getattr(self._local, 'conn', None)
+
+    @contextmanager
+    def read(self):
+        """只读事务：多条查询读取同一快照，WAL模式下不会被写事务阻塞"""
+        conn = self.connection()
+        if conn.in_transaction:
+            # 已在事务中（例如写事务内部的读取），直接复用
+            yield conn
+            return
+
+        with self._using(conn):
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.execute('COMMIT')
+
+    @contextmanager
+    def transaction(self):
+        """写事务：成功时提交，异常时回滚"""
+        conn = self.connection()
+        if conn.in_transaction:
+            # 嵌套调用并入外层事务
+            yield conn
+            return
+
+        with self.write_lock, self._using(conn):
+            conn.execute('BEGIN IMMEDIATE')
+            pending = self._local.pending = []
+            try:
+                for hook in self._begin_hooks:
+                    hook(conn)
+                yield conn
+                if conn.in_transaction:
+                    for hook in self._precommit_hooks:
+                        hook(conn)
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            else:
+                if conn.in_transaction:
+                    conn.execute('COMMIT')
+                for hook in self._commit_hooks:
+                    hook()
+                for callback in pending:
+                    callback()
+            finally:
+                self._local.pending = None
+
+    @contextmanager
+    def _using(self, conn):
+        """标记连接正在使用；使用期间被close_all()的连接在结束时关闭"""
+        with self._registry_lock:
+            self._busy.add(conn)
+        try:
+            yield
+        finally:
+            with self._registry_lock:
+                self._busy.discard(conn)
+                retired = conn in self._retired
+                self._retired.discard(conn)
+            if retired:
+                self._close(conn)
+
+    def close_all(self):
+        """关闭所有线程的连接；其他线程正在使用的连接在其事务结束后关闭"""
+        with self._registry_lock:
+            connections, self._connections = self._connections, []
+            idle = [conn for conn in connections if conn not in self._busy]
+            self._retired.update(conn for conn in connections if conn in self._busy)
+        for conn in idle:
+            self._close(conn)
+        self._local = threading.local()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
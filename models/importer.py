@@ -0,0 +1,313 @@
+"""
+TimelineJS JSON 批量导入
+文件名: models/importer.py
+"""
+
+import codecs
+import json
+import sqlite3
+
+# 导入的事件列（对应TimelineJS事件对象中的字段）
+EVENT_COLUMNS = (
+    'headline', 'text',
+    'start_year', 'start_month', 'start_day', 'start_hour', 'start_minute',
+    'start_second', 'start_millisecond', 'start_display_date',
+    'end_year', 'end_month', 'end_day', 'end_hour', 'end_minute',
+    'end_second', 'end_millisecond', 'end_display_date',
+    'display_date', 'event_group', 'unique_id',
+    'media_url', 'media_caption', 'media_credit', 'media_thumbnail',
+    'media_alt', 'media_title', 'media_link', 'media_link_target',
+    'background_url', 'background_color', 'background_alt',
+    'autolink', 'sort_order'
+)
+
+# 导入的时代列
+ERA_COLUMNS = (
+    'headline', 'text',
+    'start_year', 'start_month', 'start_day', 'start_hour', 'start_minute',
+    'start_second', 'start_millisecond', 'start_display_date',
+    'end_year', 'end_month', 'end_day', 'end_hour', 'end_minute',
+    'end_second', 'end_millisecond', 'end_display_date',
+    'sort_order'
+)
+
+DATE_PARTS = ('year', 'month', 'day', 'hour', 'minute', 'second', 'millisecond')
+MEDIA_FIELDS = ('url', 'caption', 'credit', 'thumbnail', 'alt', 'title', 'link', 'link_target')
+BACKGROUND_FIELDS = ('url', 'color', 'alt')
+
+# 报告中最多保留的错误条数
+MAX_REPORTED_ERRORS = 100
+
+
+class JSONStreamReader:
+    """从字节流中增量解析JSON，每次只在内存中保留当前值所需的文本"""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        """读取更多数据，已到结尾时返回False"""
+        if self.eof:
+            return False
+        data = self.stream.read(size or self.chunk_size)
+        if data:
+            text = self._utf8.decode(data)
+        else:
+            self.eof = True
+            text = self._utf8.decode(b'', final=True)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白并返回下一个字符，已到结尾时返回空字符串"""
+        while True:
+            buf = self.buf
+            while self.pos < len(buf) and buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(buf):
+                return buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        """读取一个指定的结构字符"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON格式错误: 期望 '{char}'，实际为 '{found or '文件结尾'}'")
+        self.pos += 1
+
+    def next_char(self):
+        """读取下一个结构字符"""
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def value(self):
+        """解析下一个完整的JSON值"""
+        size = self.chunk_size
+        while True:
+            self.peek()
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # 数据不完整时继续读取，每次加倍读取量以避免大值反复重新解析
+                if self._fill(size):
+                    size *= 2
+                    continue
+                raise ValueError(f"JSON格式错误: {e.msg}")
+
+            if end == len(self.buf) and not self.eof:
+                # 数字可能在缓冲区末尾被截断，读到更多数据后再确认
+                self._fill(size)
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_timeline_items(stream):
+    """增量解析TimelineJS文档，逐个产出 (键, 值)
+
+    events和eras数组中的元素逐个以 ('event', 对象) 和 ('era', 对象) 产出，
+    其他顶层字段以 (字段名, 值) 产出。
+    """
+    reader = JSONStreamReader(stream)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise ValueError("JSON格式错误: 对象的键必须是字符串")
+        reader.expect(':')
+
+        if key in ('events', 'eras') and reader.peek() == '[':
+            reader.expect('[')
+            kind = key[:-1]
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield kind, reader.value()
+                    char = reader.next_char()
+                    if char == ']':
+                        break
+                    if char != ',':
+                        raise ValueError(f"JSON格式错误: {key}数组中缺少 ','")
+        else:
+            yield key, reader.value()
+
+        char = reader.next_char()
+        if char == '}':
+            break
+        if char != ',':
+            raise ValueError("JSON格式错误: 缺少 ','")
+
+
+def _to_int(value, name):
+    """日期字段转换为整数（TimelineJS允许用字符串表示数字）"""
+    if type(value) is int or value is None:
+        return value
+    if value == '':
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} 必须是整数: {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 必须是整数: {value!r}")
+
+
+def _object(obj, name):
+    """取出嵌套对象，缺失时返回空字典"""
+    value = obj.get(name)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"{name} 必须是对象")
+    return value
+
+
+def _date_values(obj, prefix, required):
+    """把TimelineJS日期对象展开为 年、月、日、时、分、秒、毫秒、display_date 八列"""
+    date = obj.get(f'{prefix}_date')
+    if date is None:
+        if required:
+            raise ValueError(f"缺少 {prefix}_date")
+        return (None,) * (len(DATE_PARTS) + 1)
+    if not isinstance(date, dict):
+        raise ValueError(f"{prefix}_date 必须是对象")
+
+    values = tuple(_to_int(date.get(part), f'{prefix}_date.{part}') for part in DATE_PARTS)
+    if required and values[0] is None:
+        raise ValueError(f"缺少 {prefix}_date.year")
+    return values + (date.get('display_date'),)
+
+
+def _text_values(obj):
+    text = _object(obj, 'text')
+    return (text.get('headline') or '', text.get('text'))
+
+
+def event_to_row(obj, sort_order=0):
+    """把TimelineJS事件对象转换为timeline_events的一行（按EVENT_COLUMNS顺序），数据无效时抛出ValueError"""
+    if not isinstance(obj, dict):
+        raise ValueError("事件必须是对象")
+
+    media = _object(obj, 'media')
+    background = _object(obj, 'background')
+    return (_text_values(obj)
+            + _date_values(obj, 'start', required=True)
+            + _date_values(obj, 'end', required=False)
+            + (obj.get('display_date'), obj.get('group'), obj.get('unique_id'))
+            + tuple(media.get(field) for field in MEDIA_FIELDS)
+            + tuple(background.get(field) for field in BACKGROUND_FIELDS)
+            + (1 if obj.get('autolink', True) else 0, sort_order))
+
+
+def era_to_row(obj, sort_order=0):
+    """把TimelineJS时代对象转换为timeline_eras的一行（按ERA_COLUMNS顺序），数据无效时抛出ValueError"""
+    if not isinstance(obj, dict):
+        raise ValueError("时代必须是对象")
+
+    return (_text_values(obj)
+            + _date_values(obj, 'start', required=True)
+            + _date_values(obj, 'end', required=True)
+            + (sort_order,))
+
+
+class TimelineImporter:
+    """把TimelineJS文档批量写入一个时间线：一个事务，executemany分批插入"""
+
+    def __init__(self, db, batch_size=1000, timeline_id=1):
+        self.db = db
+        self.batch_size = batch_size
+        self.timeline_id = timeline_id
+        # 所属时间线作为常量写入，行数据仍按EVENT_COLUMNS/ERA_COLUMNS的顺序
+        self.event_sql = (f"INSERT INTO timeline_events (timeline_id, {', '.join(EVENT_COLUMNS)}) "
+                          f"VALUES ({int(timeline_id)}, {', '.join('?' * len(EVENT_COLUMNS))})")
+        self.era_sql = (f"INSERT INTO timeline_eras (timeline_id, {', '.join(ERA_COLUMNS)}) "
+                        f"VALUES ({int(timeline_id)}, {', '.join('?' * len(ERA_COLUMNS))})")
+
+    def run(self, stream, replace=False):
+        """从字节流导入，返回导入报告；JSON本身格式错误时抛出ValueError并回滚"""
+        report = {'events': 0, 'eras': 0, 'errors': [], 'error_count': 0}
+        pending = {'event': [], 'era': []}
+        counters = {'event': 0, 'era': 0}
+
+        with self.db.pool.transaction() as conn:
+            if replace:
+                conn.execute('DELETE FROM timeline_events WHERE timeline_id = ?', (self.timeline_id,))
+                conn.execute('DELETE FROM timeline_eras WHERE timeline_id = ?', (self.timeline_id,))
+
+            for key, value in iter_timeline_items(stream):
+                if key in pending:
+                    index = counters[key]
+                    counters[key] += 1
+                    try:
+                        convert = event_to_row if key == 'event' else era_to_row
+                        pending[key].append((index, convert(value, sort_order=index)))
+                    except ValueError as e:
+                        self._error(report, key, index, e)
+                        continue
+                    if len(pending[key]) >= self.batch_size:
+                        self._flush(conn, key, pending[key], report)
+                elif key == 'title' and isinstance(value, dict):
+                    self._import_title(conn, value, self.timeline_id)
+                elif key == 'scale' and isinstance(value, str):
+                    conn.execute("UPDATE timeline_config SET scale = ?, "
+                                 "updated_at = CURRENT_TIMESTAMP WHERE id = ?", (value, self.timeline_id))
+
+            for key in pending:
+                self._flush(conn, key, pending[key], report)
+            # 提交后该时间线片段缓存中的旧记录全部作废（见touch）
+            self.db.touch(self.timeline_id, op='import')
+
+        report['status'] = 'success'
+        return report
+
+    def _flush(self, conn, kind, batch, report):
+        """写入一批记录；批量插入失败（如unique_id重复）时逐行插入以定位出错的行"""
+        if not batch:
+            return
+        sql = self.event_sql if kind == 'event' else self.era_sql
+
+        conn.execute('SAVEPOINT import_batch')
+        try:
+            conn.executemany(sql, [row for _, row in batch])
+        except sqlite3.IntegrityError:
+            conn.execute('ROLLBACK TO import_batch')
+            for index, row in batch:
+                try:
+                    conn.execute(sql, row)
+                    report[f'{kind}s'] += 1
+                except sqlite3.IntegrityError as e:
+                    self._error(report, kind, index, e)
+        else:
+            report[f'{kind}s'] += len(batch)
+        conn.execute('RELEASE import_batch')
+        batch.clear()
+
+    @staticmethod
+    def _import_title(conn, title, timeline_id):
+        text = title.get('text')
+        if isinstance(text, dict):
+            conn.execute('''
+            UPDATE timeline_config
+            SET title_headline = ?, title_text = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            ''', (text.get('headline'), text.get('text'), timeline_id))
+
+    @staticmethod
+    def _error(report, kind, index, error):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'type': kind, 'index': index, 'error': str(error)})
@@ -0,0 +1,331 @@
+"""
+事件图片的派生图：缩略图和限宽副本（进程池生成，按内容寻址存放，可长期缓存）
+文件名: models/media.py
+
+需要Pillow；未安装时MediaPipeline.available为False，事件图片按原样使用。
+"""
+
+import io
+import os
+import json
+import hashlib
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse, unquote
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+# 处理的本地图片类型
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.webp'})
+
+# 每次按id检查的事件数（低于SQLite的参数个数上限）
+CHECK_BATCH_SIZE = 500
+
+
+def create_media_tables(cursor):
+    """创建源图片表：每个本地图片一行，记录文件状态和生成的派生图"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS media_sources (
+        url TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        sha256 TEXT,
+        width INTEGER,
+        height INTEGER,
+        thumbnail_url TEXT,
+        display_url TEXT,
+        variants TEXT,
+        error TEXT,
+        processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # 事件改用其他图片时，旧图片的派生图（及自动生成的缩略图）立即失效，等待重新生成
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS timeline_events_media_reset
+    AFTER UPDATE OF media_url ON timeline_events
+    WHEN old.media_url IS NOT new.media_url
+    BEGIN
+        UPDATE timeline_events
+        SET media_optimized_url = NULL,
+            media_thumbnail = CASE WHEN new.media_thumbnail IN (
+                SELECT thumbnail_url FROM media_sources WHERE url = old.media_url
+            ) THEN NULL ELSE new.media_thumbnail END
+        WHERE id = new.id;
+    END
+    ''')
+
+
+def _save(image, output_dir, url_prefix, quality):
+    """编码一个派生图并按内容的sha256存放（内容相同的文件只写一次），返回其信息"""
+    buffer = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(buffer, 'PNG', optimize=True)
+        extension = '.png'
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        extension = '.jpg'
+    data = buffer.getvalue()
+
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{digest[:2]}/{digest}{extension}'
+    path = os.path.join(output_dir, digest[:2], digest + extension)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return {'url': url_prefix + name, 'width': image.width, 'height': image.height, 'bytes': len(data)}
+
+
+def render_variants(path, output_dir, url_prefix, widths, thumbnail_size, quality):
+    """在工作进程中生成一张图片的缩略图（正方形裁剪）和各宽度的副本（不放大）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    with Image.open(path) as source:
+        animated = getattr(source, 'is_animated', False)
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        thumbnail = _save(ImageOps.fit(image, (thumbnail_size, thumbnail_size), Image.LANCZOS),
+                          output_dir, url_prefix, quality)
+        variants = []
+        # 动图的副本会丢失动画，只生成缩略图
+        if not animated:
+            for width in sorted(widths):
+                if width >= image.width:
+                    break
+                height = max(round(image.height * width / image.width), 1)
+                variants.append(_save(image.resize((width, height), Image.LANCZOS),
+                                      output_dir, url_prefix, quality))
+
+    return {
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'width': image.width,
+        'height': image.height,
+        'source_bytes': len(data),
+        'thumbnail': thumbnail,
+        'variants': variants,
+    }
+
+
+class MediaPipeline:
+    """后台处理事件引用的本地图片
+
+    监听数据库的变更（ChangeFeed），事件新建或修改后检查其media_url：文件是新的或已修改时
+    提交到进程池生成派生图，完成后把事件的media_optimized_url设为不超过display_width的副本，
+    media_thumbnail为空（或是之前自动生成的）时填入缩略图。
+    """
+
+    def __init__(self, db, root, output_dir, url_prefix='/static/media/', widths=(320, 640, 1280),
+                 display_width=1280, thumbnail_size=120, quality=82, workers=2):
+        self.db = db
+        self.root = os.path.abspath(root)
+        self.output_dir = os.path.abspath(output_dir)
+        self.url_prefix = url_prefix
+        self.widths = tuple(widths)
+        self.display_width = display_width
+        self.thumbnail_size = thumbnail_size
+        self.quality = quality
+        self.workers = workers
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        # _pending清空（所有结果已保存）时通知process_all()
+        self._idle = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closing = False
+        self._seq = db.changes.last_seq
+
+    @property
+    def available(self):
+        """是否安装了Pillow"""
+        return Image is not None
+
+    def start(self):
+        """启动后台线程，先检查所有事件，之后处理新的变更"""
+        self.db.changes.add_listener(self._wakeup.set)
+        self._thread = threading.Thread(target=self._run, name='media-pipeline', daemon=True)
+        self._thread.start()
+
+    def close(self, wait=True):
+        """停止后台线程和进程池（未开始的任务被取消）
+
+        wait为True时等待正在处理的图片完成并保存结果，之后才能关闭数据库连接。
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def process_all(self):
+        """检查所有事件并等待处理结果全部保存，返回处理的图片数"""
+        count = self.check()
+        with self._idle:
+            self._idle.wait_for(lambda: not self._pending)
+        return count
+
+    def _run(self):
+        self.check()
+        while not self._closing:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closing:
+                break
+            try:
+                self._check_changes()
+            except Exception as e:
+                print(f"图片处理检查失败: {e}")
+
+    def _check_changes(self):
+        """处理上次检查之后的变更：新建/修改的事件逐个检查，导入或恢复后检查全部"""
+        last = self.db.changes.last_seq
+        changes = self.db.changes.since(self._seq)
+        self._seq = last
+        if changes is None or any(change.entity == 'timeline' and change.op in ('import', 'reset')
+                                  for change in changes):
+            self.check()
+            return
+        event_ids = sorted({change.id for change in changes
+                            if change.entity == 'event' and change.op != 'delete'})
+        for i in range(0, len(event_ids), CHECK_BATCH_SIZE):
+            self.check(event_ids[i:i + CHECK_BATCH_SIZE])
+
+    def check(self, event_ids=None):
+        """检查事件的图片（默认全部）：需要生成的提交到进程池，已生成的直接写回事件
+
+        返回提交到进程池的图片数。
+        """
+        sql = '''
+        SELECT e.id, e.media_url, e.media_thumbnail, e.media_optimized_url,
+               s.url AS source_url, s.size, s.mtime_ns, s.thumbnail_url, s.display_url, s.error
+        FROM timeline_events e
+        LEFT JOIN media_sources s ON s.url = e.media_url
+        WHERE e.media_url IS NOT NULL AND e.media_url != ''
+        '''
+        params = []
+        if event_ids is not None:
+            sql += f" AND e.id IN ({', '.join('?' * len(event_ids))})"
+            params = list(event_ids)
+        with self.db.pool.read() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        stale = set()
+        submitted = set()
+        for row in rows:
+            path = self.resolve(row['media_url'])
+            if path is None:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if row['source_url'] is None or (row['size'], row['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+                if self.submit(row['media_url'], path, stat) is not None:
+                    submitted.add(row['media_url'])
+            elif row['error'] is None and self._needs_update(row):
+                stale.add(row['media_url'])
+
+        for url in stale:
+            self._update_events(url)
+        return len(submitted)
+
+    def _needs_update(self, row):
+        if row['media_optimized_url'] != row['display_url']:
+            return True
+        thumbnail = row['media_thumbnail']
+        return (not thumbnail or thumbnail.startswith(self.url_prefix)) and thumbnail != row['thumbnail_url']
+
+    def resolve(self, url):
+        """本地图片URL对应的文件路径，不是本地图片（或是派生图本身）时返回None"""
+        parsed = urlparse(url)
+        if parsed.scheme or parsed.netloc or not parsed.path:
+            return None
+        url_path = posixpath.normpath('/' + unquote(parsed.path).lstrip('/'))
+        if url_path.startswith(self.url_prefix):
+            return None
+        if posixpath.splitext(url_path)[1].lower() not in IMAGE_EXTENSIONS:
+            return None
+        path = os.path.join(self.root, *url_path.split('/')[1:])
+        return path if os.path.commonpath([self.root, os.path.abspath(path)]) == self.root else None
+
+    def submit(self, url, path, stat):
+        """提交一张图片（同一URL同时只处理一次）"""
+        if not self.available or self._closing:
+            return None
+        with self._lock:
+            future = self._pending.get(url)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._executor.submit(render_variants, path, self.output_dir, self.url_prefix,
+                                           self.widths, self.thumbnail_size, self.quality)
+            self._pending[url] = future
+        future.add_done_callback(lambda done: self._finished(url, stat, done))
+        return future
+
+    def _finished(self, url, stat, future):
+        """任务完成（在进程池的管理线程中调用）：保存结果并写回引用该图片的事件"""
+        try:
+            if future.cancelled():
+                return
+            error = future.exception()
+            result = None if error else future.result()
+            self._save_source(url, stat, result, error)
+            if result is not None:
+                self._update_events(url)
+                print(f"图片已处理: {url}（{len(result['variants'])} 个副本）")
+            else:
+                print(f"图片处理失败: {url}: {error}")
+        except Exception as e:
+            print(f"保存图片处理结果失败: {url}: {e}")
+        finally:
+            with self._idle:
+                self._pending.pop(url, None)
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def _save_source(self, url, stat, result, error):
+        if result is None:
+            values = (url, stat.st_size, stat.st_mtime_ns, None, None, None, None, None, None, str(error))
+        else:
+            # 页面中显示不超过display_width的最大副本；原图不比它大时使用原图
+            display = [variant for variant in result['variants'] if variant['width'] <= self.display_width]
+            values = (url, stat.st_size, stat.st_mtime_ns, result['sha256'], result['width'], result['height'],
+                      result['thumbnail']['url'], display[-1]['url'] if display else None,
+                      json.dumps(result['variants'], separators=(',', ':')), None)
+        with self.db.pool.transaction() as conn:
+            conn.execute('''
+            INSERT OR REPLACE INTO media_sources
+            (url, size, mtime_ns, sha256, width, height, thumbnail_url, display_url, variants, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', values)
+
+    def _update_events(self, url):
+        """把派生图写入引用该图片的事件（手动填写的缩略图保留不变）"""
+        with self.db.pool.transaction() as conn:
+            rows = conn.execute('''
+            UPDATE timeline_events
+            SET media_optimized_url = s.display_url,
+                media_thumbnail = CASE
+                    WHEN media_thumbnail IS NULL OR media_thumbnail = ''
+                         OR substr(media_thumbnail, 1, length(?)) = ? THEN s.thumbnail_url
+                    ELSE media_thumbnail END,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (SELECT display_url, thumbnail_url FROM media_sources WHERE url = ?) AS s
+            WHERE timeline_events.media_url = ?
+            RETURNING timeline_events.id, timeline_events.timeline_id
+            ''', (self.url_prefix, self.url_prefix, url, url)).fetchall()
+            for event_id, timeline_id in rows:
+                self.db.touch(timeline_id, 'event', event_id, 'update')
+        return len(rows)
@@ -0,0 +1,71 @@
+"""
+数据库结构版本：按顺序执行迁移，当前版本记录在 PRAGMA user_version 中
+文件名: models/migrations.py
+"""
+
+import re
+import sqlite3
+
+
+def schema_version(conn):
+    """数据库当前的结构版本（从未迁移过的数据库为0）"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations):
+    """执行尚未执行的迁移，返回执行的个数；已是最新版本时只读取一次user_version
+
+    migrations[i]是从版本i升级到i + 1的函数（参数为游标），全部迁移在一个写事务中执行，
+    失败时回滚，版本不变。迁移期间关闭外键检查（重建表时需要），提交前检查外键完整性。
+    """
+    target = len(migrations)
+    if schema_version(conn) == target:
+        return 0
+
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 其他进程可能已经完成了迁移
+            current = schema_version(conn)
+            if current > target:
+                raise RuntimeError(f"数据库结构版本 {current} 比程序支持的版本 {target} 新")
+            cursor = conn.cursor()
+            for migration in migrations[current:]:
+                migration(cursor)
+            problems = conn.execute('PRAGMA foreign_key_check').fetchall()
+            if problems:
+                raise sqlite3.IntegrityError(f"迁移后外键不完整: {len(problems)} 处")
+            conn.execute(f'PRAGMA user_version = {target}')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+    return target - current
+
+
+def rebuild_table(cursor, table, transform):
+    """按SQLite推荐的步骤重建表（用于ALTER TABLE无法完成的修改，如删除列约束）
+
+    transform接收原来的CREATE TABLE语句并返回新语句；生成列不复制，由新表重新计算。
+    表上的索引和触发器随旧表删除，调用方需要重新创建。需在外键检查关闭时调用。
+    """
+    sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                         (table,)).fetchone()[0]
+    new_table = f'{table}_rebuild'
+    new_sql = re.sub(rf'^CREATE TABLE\s+(IF NOT EXISTS\s+)?"?{table}"?', f'CREATE TABLE {new_table}',
+                     transform(sql), count=1)
+    columns = ', '.join(row[1] for row in cursor.execute(f'PRAGMA table_xinfo({table})') if row[6] == 0)
+
+    # AUTOINCREMENT的计数器随旧表删除，需要保留，否则已删除记录的id可能被重新使用
+    sequence = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone() \
+        if 'AUTOINCREMENT' in sql.upper() else None
+
+    cursor.execute(new_sql)
+    cursor.execute(f'INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table}')
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+    if sequence is not None:
+        cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
@@ -0,0 +1,95 @@
+"""
+分页与日期区间参数
+文件名: models/paging.py
+"""
+
+import base64
+import json
+
+
+def encode_cursor(values):
+    """把排序键编码为不透明的游标字符串"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """解析游标字符串，格式不正确时抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError(f"无效的游标: {token}")
+
+    if not isinstance(values, list) or not all(isinstance(v, int) for v in values):
+        raise ValueError(f"无效的游标: {token}")
+    return values
+
+
+def parse_date_bound(text, upper=False):
+    """解析 YYYY[-MM[-DD]] 形式的日期（年份可为负数表示公元前）
+
+    返回 (年, 月, 日)；省略的月、日作为下界取0，作为上界取99，
+    这样 from=1900&to=1900 包含1900年内的所有记录。
+    """
+    negative = text.startswith('-')
+    parts = (text[1:] if negative else text).split('-')
+    if not 1 <= len(parts) <= 3 or not all(p.isdigit() for p in parts):
+        raise ValueError(f"无效的日期: {text}")
+
+    year, *rest = (int(p) for p in parts)
+    if len(rest) > 0 and not 1 <= rest[0] <= 12:
+        raise ValueError(f"无效的月份: {text}")
+    if len(rest) > 1 and not 1 <= rest[1] <= 31:
+        raise ValueError(f"无效的日期: {text}")
+    fill = 99 if upper else 0
+    month = rest[0] if len(rest) > 0 else fill
+    day = rest[1] if len(rest) > 1 else fill
+    return (-year if negative else year, month, day)
+
+
+# 排序键：把日期的各字段编码为一个整数，键的大小顺序与时间顺序相同。
+# |年| < KEY_NEAR_YEARS 时每年占KEY_YEAR_RANGE（年内的月、日、时、分、秒、毫秒都参与排序）；
+# 更远的年份（cosmological时间尺度）每年只占KEY_FAR_YEAR_RANGE，年内精度按比例降低。
+# 支持的年份约为 ±5×10^11，在SQLite的64位整数范围内。
+KEY_YEAR_RANGE = 10 ** 13
+KEY_FAR_YEAR_RANGE = 10 ** 7
+KEY_NEAR_YEARS = 400000
+_KEY_NEAR_LIMIT = KEY_NEAR_YEARS * KEY_YEAR_RANGE
+_KEY_FAR_DIVISOR = KEY_YEAR_RANGE // KEY_FAR_YEAR_RANGE
+
+DATE_FIELDS = ('month', 'day', 'hour', 'minute', 'second', 'millisecond')
+
+
+def date_key(year, month=0, day=0, hour=0, minute=0, second=0, millisecond=0):
+    """日期的排序键（与date_key_sql生成的列相同），年份为None时返回None"""
+    if year is None:
+        return None
+    offset = ((((month * 32 + day) * 24 + hour) * 60 + minute) * 60 + second) * 1000 + millisecond
+    if -KEY_NEAR_YEARS < year < KEY_NEAR_YEARS:
+        return year * KEY_YEAR_RANGE + offset
+    if year > 0:
+        return _KEY_NEAR_LIMIT + (year - KEY_NEAR_YEARS) * KEY_FAR_YEAR_RANGE + offset // _KEY_FAR_DIVISOR
+    return -_KEY_NEAR_LIMIT + (year + KEY_NEAR_YEARS) * KEY_FAR_YEAR_RANGE + offset // _KEY_FAR_DIVISOR
+
+
+def date_key_sql(prefix):
+    """计算 prefix_year、prefix_month…… 排序键的SQL表达式（空的月、日等按0计算）"""
+    year = f'{prefix}_year'
+    offset = f'IFNULL({prefix}_month, 0)'
+    for field, scale in zip(DATE_FIELDS[1:], (32, 24, 60, 60, 1000)):
+        offset = f'({offset}) * {scale} + IFNULL({prefix}_{field}, 0)'
+    return (f'CASE WHEN {year} IS NULL THEN NULL '
+            f'WHEN {year} > -{KEY_NEAR_YEARS} AND {year} < {KEY_NEAR_YEARS} '
+            f'THEN {year} * {KEY_YEAR_RANGE} + {offset} '
+            f'WHEN {year} > 0 THEN {_KEY_NEAR_LIMIT} + ({year} - {KEY_NEAR_YEARS}) * {KEY_FAR_YEAR_RANGE} '
+            f'+ ({offset}) / {_KEY_FAR_DIVISOR} '
+            f'ELSE -{_KEY_NEAR_LIMIT} + ({year} + {KEY_NEAR_YEARS}) * {KEY_FAR_YEAR_RANGE} '
+            f'+ ({offset}) / {_KEY_FAR_DIVISOR} END')
+
+
+def date_range_keys(date_from=None, date_to=None):
+    """把parse_date_bound返回的 (年, 月, 日) 闭区间转换为排序键的闭区间（上界包含当天的所有时刻）"""
+    low = date_key(*date_from) if date_from is not None else None
+    high = date_key(*date_to, 23, 59, 59, 999) if date_to is not None else None
+    return low, high
@@ -0,0 +1,179 @@
+"""
+紧凑的行记录与TimelineJS序列化
+文件名: models/records.py
+
+查询结果按元组读取，列名到下标的映射（RecordLayout）每种列组合只解析一次；
+序列化器按下标直接写出TimelineJS对象的UTF-8 JSON，不再为每行创建字典。
+"""
+
+import json
+from collections.abc import Mapping
+from json.encoder import encode_basestring
+
+DATE_KEYS = ('year', 'month', 'day', 'hour', 'minute', 'second', 'millisecond', 'display_date')
+MEDIA_KEYS = ('url', 'caption', 'credit', 'thumbnail', 'alt', 'title', 'link', 'link_target')
+BACKGROUND_KEYS = ('url', 'color', 'alt')
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def encode_value(value):
+    """编码单个SQLite值，与json.dumps(ensure_ascii=False)的结果相同"""
+    kind = type(value)
+    if kind is str:
+        return encode_basestring(value)
+    if kind is int:
+        return int.__repr__(value)
+    if value is None:
+        return 'null'
+    return _dumps(value)
+
+
+class Record(Mapping):
+    """一行查询结果：值存放在元组中，列名由所属的RecordLayout共享"""
+
+    __slots__ = ('_values',)
+    _index = {}
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getitem__(self, name):
+        return self._values[self._index[name]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f'Record({dict(self)!r})'
+
+    def to_dict(self):
+        return dict(zip(self._index, self._values))
+
+
+class RecordLayout:
+    """一种查询结果的列布局"""
+
+    __slots__ = ('columns', 'index', 'record_class', 'encoders')
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.index = {name: position for position, name in enumerate(columns)}
+        self.record_class = type('Record', (Record,), {'__slots__': (), '_index': self.index})
+        # 按类型缓存的序列化函数
+        self.encoders = {}
+
+    def records(self, rows):
+        """把元组行包装为Record"""
+        record_class = self.record_class
+        return [record_class(row) for row in rows]
+
+    def encoder(self, kind):
+        """返回该布局下 kind（'event'或'era'）的序列化函数: 元组行 -> UTF-8 JSON字节"""
+        encode = self.encoders.get(kind)
+        if encode is None:
+            encode = self.encoders[kind] = ENCODER_FACTORIES[kind](self.index)
+        return encode
+
+
+_layouts = {}
+
+
+def layout_for(cursor):
+    """按游标的列名取得（必要时创建）布局"""
+    columns = tuple(column[0] for column in cursor.description)
+    layout = _layouts.get(columns)
+    if layout is None:
+        layout = _layouts.setdefault(columns, RecordLayout(columns))
+    return layout
+
+
+def tuple_cursor(conn, sql, params=()):
+    """执行查询，结果行为普通元组（不创建sqlite3.Row），返回 (游标, 布局)"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    return cursor, layout_for(cursor)
+
+
+def _members(index, prefix, keys):
+    """[(下标, '"键":'), ...]，只包含表中存在的列"""
+    return tuple((index[prefix + key], f'"{key}":') for key in keys if prefix + key in index)
+
+
+def _object(row, members):
+    """写出非空成员组成的JSON对象（值为空、0或空字符串的成员省略）"""
+    parts = [key + encode_value(row[position]) for position, key in members if row[position]]
+    return '{' + ','.join(parts) + '}'
+
+
+def _event_encoder(index):
+    start = _members(index, 'start_', DATE_KEYS)
+    end = _members(index, 'end_', DATE_KEYS)
+    media = _members(index, 'media_', MEDIA_KEYS)
+    background = _members(index, 'background_', BACKGROUND_KEYS)
+    optional = tuple((index[column], f'"{key}":') for column, key in (
+        ('display_date', 'display_date'), ('event_group', 'group'), ('unique_id', 'unique_id')))
+    headline, text = index['headline'], index['text']
+    start_year, end_year = index['start_year'], index['end_year']
+    media_url, background_url = index['media_url'], index['background_url']
+    autolink = index.get('autolink')
+    # 有限宽副本时输出副本的url（media成员中url是第一个）
+    optimized = index.get('media_optimized_url')
+    if optimized is not None and media and media[0][1] == '"url":':
+        optimized_media = ((optimized, '"url":'),) + media[1:]
+    else:
+        optimized = None
+
+    def encode(row):
+        """把一行事件编码为TimelineJS事件对象"""
+        parts = ['{"start_date":', _object(row, start) if row[start_year] else '{}',
+                 ',"text":{"headline":', encode_value(row[headline]),
+                 ',"text":', encode_value(row[text]), '}']
+        if row[end_year]:
+            parts.append(',"end_date":')
+            parts.append(_object(row, end))
+        for position, key in optional:
+            value = row[position]
+            if value:
+                parts.append(',' + key + encode_value(value))
+        if row[media_url]:
+            parts.append(',"media":')
+            parts.append(_object(row, optimized_media if optimized is not None and row[optimized] else media))
+        if row[background_url]:
+            parts.append(',"background":')
+            parts.append(_object(row, background))
+        if autolink is not None:
+            parts.append(',"autolink":true' if row[autolink] else ',"autolink":false')
+        parts.append('}')
+        return ''.join(parts).encode('utf-8')
+
+    return encode
+
+
+def _era_encoder(index):
+    start = _members(index, 'start_', DATE_KEYS[1:3])
+    end = _members(index, 'end_', DATE_KEYS[1:3])
+    headline, text = index['headline'], index['text']
+    start_year, end_year = index['start_year'], index['end_year']
+
+    def date(row, year, members):
+        # 时代的年份总是输出，月、日为空时省略
+        parts = ['"year":' + encode_value(row[year])]
+        parts.extend(key + encode_value(row[position]) for position, key in members if row[position])
+        return '{' + ','.join(parts) + '}'
+
+    def encode(row):
+        """把一行时代编码为TimelineJS时代对象"""
+        return ''.join(('{"start_date":', date(row, start_year, start),
+                        ',"end_date":', date(row, end_year, end),
+                        ',"text":{"headline":', encode_value(row[headline]),
+                        ',"text":', encode_value(row[text]), '}}')).encode('utf-8')
+
+    return encode
+
+
+ENCODER_FACTORIES = {'event': _event_encoder, 'era': _era_encoder}
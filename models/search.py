@@ -0,0 +1,226 @@
+"""
+事件全文搜索（SQLite FTS5）与离线lunr索引
+文件名: models/search.py
+"""
+
+import re
+import html
+
+try:
+    import lunr
+except ImportError:
+    lunr = None
+
+# 参与全文索引的事件列
+SEARCH_COLUMNS = ('headline', 'text', 'media_caption')
+
+# bm25列权重：标题 > 媒体说明 > 正文
+SEARCH_WEIGHTS = {'headline': 10.0, 'text': 1.0, 'media_caption': 3.0}
+
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+SNIPPET_ELLIPSIS = '…'
+SNIPPET_LENGTH = 32
+
+# trigram分词器只能匹配至少3个字符的词，更短的词改用LIKE过滤
+MIN_MATCH_LENGTH = 3
+MAX_QUERY_TERMS = 16
+
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def create_search_index(cursor):
+    """创建事件全文索引及同步触发器；索引是新建的时从现有事件重建"""
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'timeline_events_fts'"
+    ).fetchone()
+
+    # trigram分词器按3字符子串索引，中文无需分词即可检索
+    cursor.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS timeline_events_fts USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content='timeline_events', content_rowid='id',
+        tokenize='trigram'
+    )
+    ''')
+
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS timeline_events_fts_insert AFTER INSERT ON timeline_events BEGIN
+        INSERT INTO timeline_events_fts (rowid, {columns}) VALUES (new.id, {new_values});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS timeline_events_fts_delete AFTER DELETE ON timeline_events BEGIN
+        INSERT INTO timeline_events_fts (timeline_events_fts, rowid, {columns})
+        VALUES ('delete', old.id, {old_values});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS timeline_events_fts_update AFTER UPDATE OF {columns} ON timeline_events BEGIN
+        INSERT INTO timeline_events_fts (timeline_events_fts, rowid, {columns})
+        VALUES ('delete', old.id, {old_values});
+        INSERT INTO timeline_events_fts (rowid, {columns}) VALUES (new.id, {new_values});
+    END
+    ''')
+
+    if not exists:
+        cursor.execute("INSERT INTO timeline_events_fts (timeline_events_fts) VALUES ('rebuild')")
+
+
+def parse_query(text):
+    """把搜索词拆分为 (FTS5 MATCH表达式或None, 需要LIKE匹配的短词列表)"""
+    terms = text.split()[:MAX_QUERY_TERMS]
+    if not terms:
+        raise ValueError("搜索词不能为空")
+
+    long_terms = [term for term in terms if len(term) >= MIN_MATCH_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_MATCH_LENGTH]
+    # 每个词作为短语，多个词之间为AND
+    match = ' AND '.join('"%s"' % term.replace('"', '""') for term in long_terms) or None
+    return match, short_terms
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_events(conn, text, limit, offset=0, order_by='id', timeline_id=1):
+    """搜索时间线的有效事件，按相关度排序（只有短词时按order_by），返回 (结果列表, 是否还有更多)"""
+    match, short_terms = parse_query(text)
+
+    conditions = ['e.timeline_id = ?', 'e.is_active = 1']
+    params = [timeline_id]
+    for term in short_terms:
+        pattern = _like_pattern(term)
+        conditions.append('(' + ' OR '.join(f"e.{column} LIKE ? ESCAPE '\\'"
+                                             for column in SEARCH_COLUMNS) + ')')
+        params.extend([pattern] * len(SEARCH_COLUMNS))
+
+    fields = 'e.id, e.headline, e.display_date, e.start_year, e.start_month, e.start_day, e.event_group'
+    if match:
+        weights = ', '.join(str(SEARCH_WEIGHTS[column]) for column in SEARCH_COLUMNS)
+        sql = f'''
+        SELECT {fields},
+               bm25(timeline_events_fts, {weights}) AS score,
+               highlight(timeline_events_fts, 0, ?, ?) AS headline_highlight,
+               snippet(timeline_events_fts, -1, ?, ?, ?, {SNIPPET_LENGTH}) AS snippet
+        FROM timeline_events_fts
+        JOIN timeline_events e ON e.id = timeline_events_fts.rowid
+        WHERE timeline_events_fts MATCH ? AND {' AND '.join(conditions)}
+        ORDER BY score, e.id
+        LIMIT ? OFFSET ?
+        '''
+        params = [HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE, HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE,
+                  SNIPPET_ELLIPSIS, match] + params
+    else:
+        # 只有短词时没有可用的全文索引查询，按时间顺序返回
+        sql = f'''
+        SELECT {fields}, NULL AS score, e.text, e.media_caption
+        FROM timeline_events e
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order_by}
+        LIMIT ? OFFSET ?
+        '''
+    # 多取一行用于判断是否还有下一页
+    params.extend([limit + 1, offset])
+
+    rows = conn.execute(sql, params).fetchall()
+    results = []
+    for row in rows[:limit]:
+        item = dict(row)
+        if not match:
+            text, caption = item.pop('text') or '', item.pop('media_caption') or ''
+            source = caption if caption and not _contains(text, short_terms) else text
+            item['headline_highlight'] = item['headline']
+            item['snippet'] = _snippet(source, short_terms)
+        for term in short_terms:
+            # 短词不在FTS的高亮结果中，补充标记
+            item['headline_highlight'] = _mark(item['headline_highlight'], term)
+            item['snippet'] = _mark(item['snippet'], term)
+        results.append(item)
+
+    return results, len(rows) > limit
+
+
+def _contains(text, terms):
+    lowered = text.lower()
+    return any(term.lower() in lowered for term in terms)
+
+
+def _mark(text, term):
+    """在文本中标记搜索词（忽略大小写，已在标记内的部分不重复标记）"""
+    if not text:
+        return text
+    pattern = re.compile(f'({re.escape(HIGHLIGHT_OPEN)}.*?{re.escape(HIGHLIGHT_CLOSE)})|({re.escape(term)})',
+                         re.IGNORECASE)
+    return pattern.sub(lambda m: m.group(1) or f'{HIGHLIGHT_OPEN}{m.group(2)}{HIGHLIGHT_CLOSE}', text)
+
+
+def _snippet(text, terms):
+    """截取包含第一个匹配词的片段"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [pos for pos in positions if pos >= 0]
+    start = max(min(positions) - SNIPPET_LENGTH // 2, 0) if positions else 0
+    end = start + SNIPPET_LENGTH * 2
+    snippet = text[start:end]
+    if start > 0:
+        snippet = SNIPPET_ELLIPSIS + snippet
+    if end < len(text):
+        snippet += SNIPPET_ELLIPSIS
+    return snippet
+
+
+def plain_text(value):
+    """去掉HTML标签和多余空白"""
+    return ' '.join(html.unescape(_TAG_RE.sub(' ', value or '')).split())
+
+
+def build_lunr_index(conn, order_by='id', timeline_id=1):
+    """生成离线搜索数据
+
+    安装了lunr（lunr.py）时生成可由lunr.js直接加载的预构建索引，store中只保留展示字段；
+    否则只输出store（含正文），由浏览器端构建索引。
+    """
+    rows = conn.execute(f'''
+    SELECT id, headline, text, media_caption, display_date, start_year, start_month, start_day, event_group
+    FROM timeline_events
+    WHERE timeline_id = ? AND is_active = 1
+    ORDER BY {order_by}
+    ''', (timeline_id,)).fetchall()
+
+    documents = [{
+        'id': str(row['id']),
+        'headline': plain_text(row['headline']),
+        'text': plain_text(row['text']),
+        'caption': plain_text(row['media_caption'])
+    } for row in rows]
+
+    index = None
+    if lunr is not None:
+        index = lunr.lunr(ref='id', fields=[
+            {'field_name': 'headline', 'boost': 10},
+            {'field_name': 'caption', 'boost': 3},
+            'text'
+        ], documents=documents).serialize()
+
+    store = {}
+    for row, document in zip(rows, documents):
+        entry = {
+            'headline': document['headline'],
+            'date': row['display_date'] or '-'.join(
+                str(part) for part in (row['start_year'], row['start_month'], row['start_day'])
+                if part is not None),
+        }
+        if row['event_group']:
+            entry['group'] = row['event_group']
+        if index is None:
+            entry['text'] = document['text']
+            entry['caption'] = document['caption']
+        store[document['id']] = entry
+
+    return {'index': index, 'store': store}
@@ -0,0 +1,94 @@
+"""
+时间区间索引（SQLite R*Tree）：按时间窗口查找与之重叠的事件和时代
+文件名: models/spans.py
+"""
+
+# 有区间索引的表：类型 -> (表名, 区间表名)
+SPAN_TABLES = {
+    'event': ('timeline_events', 'timeline_event_spans'),
+    'era': ('timeline_eras', 'timeline_era_spans'),
+}
+
+# 影响区间的列，只有这些列变化时才更新区间表
+SPAN_COLUMNS = ('timeline_id', 'is_active') + tuple(
+    f'{prefix}_{field}' for prefix in ('start', 'end')
+    for field in ('year', 'month', 'day', 'hour', 'minute', 'second', 'millisecond'))
+
+# 区间的两端（没有结束日期时为一个点；结束早于开始的数据按两端的较小/较大值）
+SPAN_LOW = 'MIN({row}.start_key, IFNULL({row}.end_key, {row}.start_key))'
+SPAN_HIGH = 'MAX({row}.start_key, IFNULL({row}.end_key, {row}.start_key))'
+
+
+def create_span_index(cursor):
+    """创建区间表及同步触发器；区间表是新建的时从现有记录填充
+
+    区间表是二维R*Tree：第一维是所属时间线（两端相同），第二维是start_key/end_key，
+    只包含有效（is_active = 1）的记录。R*Tree用32位浮点数保存坐标（向外取整），
+    查询结果需要再按表中的精确排序键过滤，见find_overlapping。
+    """
+    for table, spans in SPAN_TABLES.values():
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (spans,)
+        ).fetchone()
+
+        cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {spans} USING rtree(
+            row_id, timeline_min, timeline_max, low, high
+        )
+        ''')
+
+        insert = f'''
+            INSERT INTO {spans} (row_id, timeline_min, timeline_max, low, high)
+            SELECT new.id, new.timeline_id, new.timeline_id,
+                   {SPAN_LOW.format(row='new')}, {SPAN_HIGH.format(row='new')}
+            WHERE new.is_active = 1;
+        '''
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_spans_insert AFTER INSERT ON {table} BEGIN
+            {insert}
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_spans_update
+        AFTER UPDATE OF {', '.join(SPAN_COLUMNS)} ON {table} BEGIN
+            DELETE FROM {spans} WHERE row_id = old.id;
+            {insert}
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_spans_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM {spans} WHERE row_id = old.id;
+        END
+        ''')
+
+        if not exists:
+            cursor.execute(f'''
+            INSERT INTO {spans} (row_id, timeline_min, timeline_max, low, high)
+            SELECT id, timeline_id, timeline_id, {SPAN_LOW.format(row=table)}, {SPAN_HIGH.format(row=table)}
+            FROM {table} WHERE is_active = 1
+            ''')
+
+
+def find_overlapping(conn, kind, timeline_id, low=None, high=None, order_by='id'):
+    """时间线中区间与 [low, high]（排序键，None表示不限）重叠的有效记录，按order_by排序
+
+    先用R*Tree找出候选记录（只访问与窗口相交的索引节点），再按精确的排序键过滤。
+    """
+    table, spans = SPAN_TABLES[kind]
+    conditions = ['s.timeline_min <= ?', 's.timeline_max >= ?']
+    params = [timeline_id, timeline_id]
+    if high is not None:
+        conditions.append('s.low <= ?')
+        conditions.append(f"{SPAN_LOW.format(row='t')} <= ?")
+        params.extend((high, high))
+    if low is not None:
+        conditions.append('s.high >= ?')
+        conditions.append(f"{SPAN_HIGH.format(row='t')} >= ?")
+        params.extend((low, low))
+
+    return conn.execute(f'''
+    SELECT t.* FROM {spans} s
+    JOIN {table} t ON t.id = s.row_id
+    WHERE {' AND '.join(conditions)}
+    ORDER BY {order_by}
+    ''', params).fetchall()
@@ -0,0 +1,157 @@
+"""
+增量同步：触发器维护的变更序号，按 ?since=<版本> 返回变化的记录和删除标记
+文件名: models/sync.py
+"""
+
+# 参与同步的表：类型 -> 表名
+SYNC_TABLES = {'event': 'timeline_events', 'era': 'timeline_eras'}
+
+# 记入变更表的表：类型 -> (表名, 所属时间线的列)
+LOGGED_TABLES = {'event': ('timeline_events', 'timeline_id'), 'era': ('timeline_eras', 'timeline_id'),
+                 'timeline': ('timeline_config', 'id')}
+
+
+def create_change_log(cursor):
+    """创建变更表及同步触发器；变更表是新建的时为现有记录补写变更
+
+    每条记录在timeline_changes中只保留最后一次变更，seq为AUTOINCREMENT，
+    删除后重新插入也不会复用序号，因此seq随提交单调递增，可直接作为同步版本。
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'timeline_changes'"
+    ).fetchone()
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS timeline_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        timeline_id INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (entity, row_id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_changes_timeline_seq
+    ON timeline_changes (timeline_id, entity, seq)
+    ''')
+
+    for entity, table in SYNC_TABLES.items():
+        # INSERT OR REPLACE删除旧的变更行并以新的seq插入
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN
+            INSERT OR REPLACE INTO timeline_changes (entity, row_id, timeline_id)
+            VALUES ('{entity}', new.id, new.timeline_id);
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN
+            INSERT OR REPLACE INTO timeline_changes (entity, row_id, timeline_id)
+            VALUES ('{entity}', new.id, new.timeline_id);
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN
+            INSERT OR REPLACE INTO timeline_changes (entity, row_id, timeline_id, deleted)
+            VALUES ('{entity}', old.id, old.timeline_id, 1);
+        END
+        ''')
+
+    if not exists:
+        for entity, table in SYNC_TABLES.items():
+            cursor.execute(f'''
+            INSERT INTO timeline_changes (entity, row_id, timeline_id)
+            SELECT '{entity}', id, timeline_id FROM {table} ORDER BY id
+            ''')
+
+
+def create_timeline_change_log(cursor):
+    """时间线配置（标题等）的修改也记入变更表（类型为timeline，id和所属时间线都是时间线id）
+
+    get_changes只返回事件和时代；这些记录使变更序号覆盖所有数据，其他进程写入数据库后，
+    运行中的服务器可以据此发现哪些时间线已变化（见TimelineDatabase.check_external）。
+    """
+    for op, row, deleted in (('INSERT', 'new', 0), ('UPDATE', 'new', 0), ('DELETE', 'old', 1)):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS timeline_config_changes_{op.lower()} AFTER {op} ON timeline_config BEGIN
+            INSERT OR REPLACE INTO timeline_changes (entity, row_id, timeline_id, deleted)
+            VALUES ('timeline', {row}.id, {row}.id, {deleted});
+        END
+        ''')
+
+
+def current_version(conn):
+    """当前的同步版本（最后分配的变更序号）"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'timeline_changes'").fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(conn, seq):
+    """序号seq之后变化的记录 [(类型, id, 时间线id)]，包括时间线配置"""
+    rows = conn.execute(
+        'SELECT entity, row_id, timeline_id FROM timeline_changes WHERE seq > ? ORDER BY seq', (seq,)
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def change_log_snapshot(conn):
+    """数据库被整体替换前调用：返回 (当前同步版本, 变更表中的全部记录 [(类型, id, 时间线id)])"""
+    rows = conn.execute('SELECT entity, row_id, timeline_id FROM timeline_changes').fetchall()
+    return current_version(conn), [tuple(row) for row in rows]
+
+
+def restore_change_log(conn, snapshot):
+    """数据库被整体替换（如从备份恢复）后在写事务中调用，snapshot为替换前的change_log_snapshot()
+
+    恢复的变更序号可能比客户端已同步到的版本小，客户端会漏掉之后的变更。这里先把序号提高到
+    替换前的版本，再为替换前存在而现在不存在的记录写删除标记，并把现有记录全部重新记为变更，
+    持有任意旧版本的客户端下一次同步时都会收到与当前数据一致的全部记录。
+    """
+    version, previous = snapshot
+    if not conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'timeline_changes'",
+                        (version,)).rowcount:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('timeline_changes', ?)", (version,))
+
+    for entity, (table, timeline_column) in LOGGED_TABLES.items():
+        conn.executemany(f'''
+        INSERT OR REPLACE INTO timeline_changes (entity, row_id, timeline_id, deleted)
+        SELECT ?, ?, ?, 1 WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE id = ?)
+        ''', [(entity, row_id, timeline_id, row_id)
+              for row_entity, row_id, timeline_id in previous if row_entity == entity])
+        conn.execute(f'''
+        INSERT OR REPLACE INTO timeline_changes (entity, row_id, timeline_id)
+        SELECT '{entity}', id, {timeline_column} FROM {table} ORDER BY id
+        ''')
+
+
+def get_changes(conn, entity, since, limit, timeline_id):
+    """返回版本since之后变化的记录，按变更顺序
+
+    返回 (变化的记录列表, 删除标记列表, 新版本, 是否还有更多)。删除标记为
+    {"id", "seq", "deleted": "soft"|"hard"}，soft表示已停用（is_active = 0），hard表示已删除。
+    还有更多时新版本为本页最后一条变更的序号，用它作为since继续读取。
+    """
+    rows = conn.execute(f'''
+    SELECT c.seq AS _seq, c.row_id AS _row_id, t.*
+    FROM timeline_changes c
+    LEFT JOIN {SYNC_TABLES[entity]} t ON t.id = c.row_id
+    WHERE c.timeline_id = ? AND c.entity = ? AND c.seq > ?
+    ORDER BY c.seq
+    LIMIT ?
+    ''', (timeline_id, entity, since, limit + 1)).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items, deleted = [], []
+    for row in rows:
+        if row['id'] is None:
+            deleted.append({'id': row['_row_id'], 'seq': row['_seq'], 'deleted': 'hard'})
+        elif not row['is_active']:
+            deleted.append({'id': row['_row_id'], 'seq': row['_seq'], 'deleted': 'soft'})
+        else:
+            item = dict(row)
+            del item['_seq'], item['_row_id']
+            items.append(item)
+
+    version = rows[-1]['_seq'] if has_more else max(current_version(conn), since)
+    return items, deleted, version, has_more
@@ -3,32 +3,244 @@ TimelineJS SQLite 数据模型
 文件名: models/tl-story.py
 """
 
+import os
+import re
 import sqlite3
+import threading
 from datetime import datetime
 import json
 
+from .cache import DocumentCache, FragmentCache
+from .changes import ChangeFeed
+from .connection import ConnectionPool
+from .migrations import migrate, rebuild_table
+from .records import tuple_cursor
+from .search import create_search_index, search_events, build_lunr_index
+from .sync import create_change_log, create_timeline_change_log, current_version, changes_since, get_changes
+from .media import create_media_tables
+from .spans import create_span_index, find_overlapping
+from .paging import date_key_sql, date_range_keys
+
+# 缓存未命中时按id批量读取的行数（低于SQLite的参数个数上限）
+FRAGMENT_BATCH_SIZE = 500
+
+# 事件和时代的显示顺序：start_key是由开始日期计算的整数（见paging.date_key，
+# 月、日等为空时按0排序，排在同年/同月的最前面），末尾加id使排序键唯一，可直接用于键集分页。
+# 排序索引按相同的列创建，排序、分页和from/to过滤都是一次索引范围扫描。
+DISPLAY_KEY = ("start_key", "sort_order", "id")
+DISPLAY_ORDER = ", ".join(DISPLAY_KEY)
+
+# 默认时间线（timeline_config的第一行），未指定时间线的旧接口都作用于它
+DEFAULT_TIMELINE_ID = 1
+
+# 内部使用的列（所属时间线、排序键生成列、派生图），不出现在API返回的事件和时代中
+INTERNAL_COLUMNS = frozenset({'timeline_id', 'start_key', 'end_key', 'media_optimized_url'})
+
+def public_dict(row, skip=0):
+    """查询结果的一行转换为API返回的字典（去掉内部使用的列），skip为结果前面附加的列数"""
+    keys = row.keys()
+    return {keys[i]: row[i] for i in range(skip, len(keys)) if keys[i] not in INTERNAL_COLUMNS}
+
+def dumps_compact(value):
+    """编码为紧凑的JSON文本（保留中文字符）"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class BatchError(ValueError):
+    """批量操作中的某一项失败（整个批次已回滚）"""
+    
+    def __init__(self, index, message):
+        super().__init__(f"第 {index} 个操作失败: {message}")
+        self.index = index
+        self.message = message
+
+
 class TimelineDatabase:
-    def __init__(self, db_path='static/data/timeline.db'):
+    def __init__(self, db_path='static/data/timeline.db', document_cache_entries=256,
+                 document_cache_bytes=64 * 1024 * 1024, change_buffer=4096, **connection_options):
         self.db_path = db_path
-        self.conn = None
-        self.init_database()
+        # 每个线程一个长连接，WAL、缓存等PRAGMA在创建连接时配置一次
+        self.pool = ConnectionPool(db_path, **connection_options)
+        
+        # 数据版本：每次写事务提交后递增
+        self.data_version = 0
+        # 每个时间线的版本：该时间线的数据最后一次变化时的data_version，
+        # 生成的JSON按 (时间线, 版本) 缓存，写入一个时间线不会使其他时间线的缓存失效
+        self._timeline_versions = {}
+        self._base_version = 0
+        self.document_cache = DocumentCache(document_cache_entries, document_cache_bytes,
+                                            on_evict=self._drop_fragments)
+        # 单条事件/时代序列化结果的缓存，按 (类型, 时间线) 存放，按id和updated_at失效
+        self.fragments = FragmentCache()
+        self._saved_json = {}
+        # 最近提交的变更（/api/changes推送）
+        self.changes = ChangeFeed(change_buffer)
+        self.pool.add_commit_hook(self._bump_version)
+        # 本进程已知的变更表序号，与数据库中的不同说明其他进程写入过（见check_external）
+        self._known_seq = None
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+        self.pool.add_begin_hook(self._sync_external)
+        self.pool.add_precommit_hook(self._note_commit)
+        
+        # 表结构在第一次打开连接时检查（已是最新版本时只读取user_version），创建实例不访问数据库
+        self._schema_ready = False
+        self._schema_lock = threading.RLock()
+        self.pool.add_open_hook(self._check_schema)
+    
+    @property
+    def conn(self):
+        """当前线程的数据库连接"""
+        return self.pool.current()
     
     def connect(self):
-        """连接到数据库"""
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row  # 返回字典格式的结果
-        return self.conn
+        """获取当前线程的数据库连接"""
+        return self.pool.connection()
     
     def close(self):
-        """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        """关闭所有数据库连接"""
+        self.pool.close_all()
+    
+    def _bump_version(self):
+        """数据已变化（在写锁内调用）"""
+        self.data_version += 1
+    
+    def timeline_version(self, timeline_id):
+        """时间线的数据版本"""
+        return self._timeline_versions.get(timeline_id, self._base_version)
+    
+    def touch(self, timeline_id, entity='timeline', row_id=None, op='update'):
+        """标记时间线的数据已变化并记录变更，当前写事务提交后生效（回滚时不变）
+        
+        提交后先丢弃受影响的片段再发布新版本：按新版本生成的文档不会用到修改前的片段
+        （片段按updated_at判断是否过期，同一秒内的修改无法区分）。
+        """
+        def committed():
+            if entity in ('event', 'era') and row_id is not None:
+                self.fragments.discard((entity, timeline_id), row_id)
+            elif entity == 'timeline' and op in ('import', 'delete'):
+                self._drop_fragments(timeline_id)
+            version = self._timeline_versions[timeline_id] = self.data_version
+            self.changes.publish(entity, timeline_id if row_id is None else row_id, op, timeline_id, version)
+        self.pool.after_commit(committed)
+    
+    def _drop_fragments(self, timeline_id):
+        """时间线的文档被移出缓存时，一并丢弃它的片段"""
+        self.fragments.drop(('event', timeline_id))
+        self.fragments.drop(('era', timeline_id))
+    
+    def invalidate(self):
+        """数据库文件被整体替换（如从备份恢复）后，丢弃所有缓存"""
+        with self.pool.write_lock:
+            self.fragments.clear()
+            self.document_cache.clear()
+            self._saved_json = {}
+            self._bump_version()
+            self._timeline_versions.clear()
+            self._base_version = self.data_version
+            # 所有时间线都可能已变化，订阅者需要重新加载
+            self.changes.publish('timeline', None, 'reset', None, self.data_version)
+    
+    def check_external(self):
+        """发现其他进程（命令行导入、图片处理、恢复备份等）的写入，使受影响的时间线的缓存失效
+        
+        比较变更表的序号与本进程已知的序号，没有变化时只执行一次查询。返回已变化的时间线数。
+        """
+        with self.pool.read() as conn:
+            if current_version(conn) == self._known_seq:
+                return 0
+        with self.pool.write_lock, self.pool.read() as conn:
+            return self._sync_external(conn)
     
-    def init_database(self):
-        """初始化数据库表结构"""
-        conn = self.connect()
-        cursor = conn.cursor()
+    def _sync_external(self, conn):
+        """（在写锁内调用）本进程已知的序号之后的变更都来自其他进程：丢弃其片段并更新时间线版本"""
+        seq = current_version(conn)
+        if self._known_seq is None or seq == self._known_seq:
+            # 第一次检查时还没有缓存任何内容
+            self._known_seq = seq
+            return 0
+        if seq < self._known_seq:
+            # 数据库文件被整体替换，无法知道哪些记录变化了
+            self._known_seq = seq
+            self.invalidate()
+            return len(self._timeline_versions)
         
+        changed = {}
+        for entity, row_id, timeline_id in changes_since(conn, self._known_seq):
+            changed.setdefault(timeline_id, []).append((entity, row_id))
+        self._known_seq = seq
+        self._bump_version()
+        for timeline_id, rows in changed.items():
+            # 先丢弃片段再发布新版本（同touch）
+            if len(rows) > FRAGMENT_BATCH_SIZE:
+                self._drop_fragments(timeline_id)
+            else:
+                for entity, row_id in rows:
+                    if entity in ('event', 'era'):
+                        self.fragments.discard((entity, timeline_id), row_id)
+            version = self._timeline_versions[timeline_id] = self.data_version
+            self.changes.publish('timeline', timeline_id, 'reset', timeline_id, version)
+        return len(changed)
+    
+    def _note_commit(self, conn):
+        """写事务提交前记录本事务写入后的序号，提交后成为已知序号（本进程的写入不算外部写入）"""
+        seq = current_version(conn)
+        def committed():
+            self._known_seq = seq
+        self.pool.after_commit(committed)
+    
+    def start_watch(self, interval):
+        """启动后台线程，每interval秒检查一次其他进程的写入（没有请求时也能通知订阅者）"""
+        if self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._run_watch, args=(interval,),
+                                              name='external-changes', daemon=True)
+        self._watch_thread.start()
+    
+    def _run_watch(self, interval):
+        while not self._watch_stop.wait(interval):
+            try:
+                self.check_external()
+            except sqlite3.Error as e:
+                print(f"检查外部写入失败: {e}")
+    
+    def stop_watch(self):
+        """停止检查线程"""
+        if self._watch_thread is None:
+            return
+        self._watch_stop.set()
+        self._watch_thread.join()
+        self._watch_thread = None
+    
+    @property
+    def migrations(self):
+        """结构迁移：第i个把版本i升级到i + 1（只能在末尾追加，已发布的迁移不能修改）"""
+        return (self._create_schema, self._scope_unique_id, create_timeline_change_log)
+    
+    def _check_schema(self, conn):
+        """新连接的回调：第一次打开连接时创建或升级表结构"""
+        if not self._schema_ready:
+            self.init_database(conn)
+    
+    def init_database(self, conn=None):
+        """创建或升级表结构（从备份恢复后也需调用），返回执行的迁移个数"""
+        with self._schema_lock:
+            if conn is None:
+                conn = self.pool.connection()
+            with self.pool.write_lock:
+                applied = migrate(conn, self.migrations)
+            self._schema_ready = True
+        
+        if applied:
+            print(f"数据库结构已升级到版本 {len(self.migrations)}: {self.db_path}")
+        return applied
+    
+    def _create_schema(self, cursor):
+        """版本1：创建表结构和默认配置
+        
+        此前的数据库没有记录版本，这一步是幂等的，可以把任何旧的结构补齐到当前结构。
+        """
         # 1. 创建timeline主表（存储标题和设置）
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS timeline_config (
@@ -74,8 +286,11 @@ class TimelineDatabase:
             -- 分组
             event_group TEXT,
             
-            -- 唯一ID
-            unique_id TEXT UNIQUE,
+            -- 所属时间线（timeline_config.id）
+            timeline_id INTEGER NOT NULL DEFAULT 1,
+            
+            -- 唯一ID（在时间线内唯一）
+            unique_id TEXT,
             
             -- 媒体信息
             media_url TEXT,
@@ -86,6 +301,8 @@ class TimelineDatabase:
             media_title TEXT,
             media_link TEXT,
             media_link_target TEXT,
+            -- 自动生成的限宽图片（MediaPipeline维护，非空时代替media_url输出）
+            media_optimized_url TEXT,
             
             -- 背景设置
             background_url TEXT,
@@ -107,6 +324,7 @@ class TimelineDatabase:
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS timeline_eras (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timeline_id INTEGER NOT NULL DEFAULT 1,
             headline TEXT NOT NULL,
             text TEXT,
             
@@ -170,6 +388,56 @@ class TimelineDatabase:
         )
         ''')
         
+        # 为旧数据库补充后来增加的列（已有的事件和时代归入默认时间线）；
+        # start_key/end_key是由日期计算的虚拟列，不占存储，写入时无需维护
+        date_keys = [(f'{prefix}_key', f'INTEGER GENERATED ALWAYS AS ({date_key_sql(prefix)}) VIRTUAL')
+                     for prefix in ('start', 'end')]
+        added_columns = {
+            'timeline_events': [('timeline_id', 'INTEGER NOT NULL DEFAULT 1'), ('media_optimized_url', 'TEXT'),
+                                *date_keys],
+            'timeline_eras': [('timeline_id', 'INTEGER NOT NULL DEFAULT 1'), *date_keys],
+        }
+        for table, definitions in added_columns.items():
+            columns = {row['name'] for row in cursor.execute(f'PRAGMA table_xinfo({table})')}
+            for name, definition in definitions:
+                if name not in columns:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+        
+        # 6. 创建排序索引（以timeline_id开头，与DISPLAY_ORDER一致，
+        #    每个时间线的查询只扫描自己的索引范围，按时间排序和分页时无需额外排序）
+        for name in ('idx_events_active_start', 'idx_events_group_start', 'idx_eras_active_start',
+                     'idx_events_timeline_start', 'idx_events_timeline_group_start', 'idx_eras_timeline_start'):
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_events_timeline_key
+        ON timeline_events (timeline_id, is_active, {DISPLAY_ORDER})
+        ''')
+        cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_events_timeline_group_key
+        ON timeline_events (timeline_id, event_group, is_active, {DISPLAY_ORDER})
+        ''')
+        cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_eras_timeline_key
+        ON timeline_eras (timeline_id, is_active, {DISPLAY_ORDER})
+        ''')
+        # unique_id在时间线内唯一（旧数据库的列上仍有全局UNIQUE约束）
+        cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_events_timeline_unique_id
+        ON timeline_events (timeline_id, unique_id)
+        ''')
+        
+        # 7. 创建事件全文索引（FTS5，由触发器与timeline_events保持同步）
+        create_search_index(cursor)
+        
+        # 8. 创建变更表（增量同步，由触发器维护变更序号和删除标记）
+        create_change_log(cursor)
+        
+        # 9. 创建图片派生表（缩略图和限宽副本，由MediaPipeline生成）
+        create_media_tables(cursor)
+        
+        # 10. 创建时间区间索引（R*Tree，由触发器与事件和时代保持同步）
+        create_span_index(cursor)
+        
         # 初始化默认配置
         cursor.execute('SELECT COUNT(*) as count FROM timeline_config')
         if cursor.fetchone()['count'] == 0:
@@ -177,29 +445,67 @@ class TimelineDatabase:
             INSERT INTO timeline_config (title_headline, title_text, scale)
             VALUES (?, ?, ?)
             ''', ('科技发展里程碑', '从工业革命到人工智能时代的重要科技突破', 'human'))
+    
+    def _scope_unique_id(self, cursor):
+        """版本2：旧数据库的unique_id列上有全局UNIQUE约束，不同时间线不能使用相同的unique_id；
+        重建事件表去掉该约束（时间线内唯一由idx_events_timeline_unique_id保证）"""
+        if not any(row['origin'] == 'u' for row in cursor.execute('PRAGMA index_list(timeline_events)')):
+            return
+        rebuild_table(cursor, 'timeline_events',
+                      lambda sql: re.sub(r'(unique_id\s+TEXT)\s+UNIQUE', r'\1', sql, flags=re.IGNORECASE))
+        # 重新创建随旧表删除的索引和触发器
+        self._create_schema(cursor)
+    
+    def list_timelines(self):
+        """获取所有时间线的配置"""
+        with self.pool.read() as conn:
+            rows = conn.execute('SELECT * FROM timeline_config ORDER BY id').fetchall()
+        return [dict(row) for row in rows]
+    
+    def timeline_exists(self, timeline_id):
+        """时间线是否存在"""
+        with self.pool.read() as conn:
+            row = conn.execute('SELECT 1 FROM timeline_config WHERE id = ?', (timeline_id,)).fetchone()
+        return row is not None
+    
+    def create_timeline(self, title_headline=None, title_text=None, scale=None):
+        """创建时间线，返回新时间线的id"""
+        with self.pool.transaction() as conn:
+            timeline_id = conn.execute('''
+            INSERT INTO timeline_config (title_headline, title_text, scale)
+            VALUES (?, ?, ?)
+            ''', (title_headline, title_text, scale or 'human')).lastrowid
+            self.touch(timeline_id, op='create')
+        return timeline_id
+    
+    def delete_timeline(self, timeline_id):
+        """删除时间线及其全部事件和时代（默认时间线不能删除），时间线不存在时返回False"""
+        if timeline_id == DEFAULT_TIMELINE_ID:
+            raise ValueError("默认时间线不能删除")
         
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            deleted = conn.execute('DELETE FROM timeline_config WHERE id = ?', (timeline_id,)).rowcount
+            if deleted:
+                conn.execute('DELETE FROM timeline_events WHERE timeline_id = ?', (timeline_id,))
+                conn.execute('DELETE FROM timeline_eras WHERE timeline_id = ?', (timeline_id,))
+                self.touch(timeline_id, op='delete')
         
-        print(f"数据库初始化完成: {self.db_path}")
+        if deleted:
+            self.document_cache.discard(timeline_id)
+        return bool(deleted)
     
-    def get_timeline_config(self):
+    def get_timeline_config(self, timeline_id=DEFAULT_TIMELINE_ID):
         """获取时间线配置"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM timeline_config LIMIT 1')
-        row = cursor.fetchone()
-        conn.close()
+        with self.pool.read() as conn:
+            row = conn.execute('SELECT * FROM timeline_config WHERE id = ?', (timeline_id,)).fetchone()
         
         if row:
             return dict(row)
         return None
     
-    def update_timeline_config(self, title_headline=None, title_text=None, scale=None):
+    def update_timeline_config(self, title_headline=None, title_text=None, scale=None,
+                               timeline_id=DEFAULT_TIMELINE_ID):
         """更新时间线配置"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
         # 构建更新语句
         updates = []
         params = []
@@ -219,359 +525,523 @@ class TimelineDatabase:
         updates.append("updated_at = CURRENT_TIMESTAMP")
         
         if updates:
-            sql = f"UPDATE timeline_config SET {', '.join(updates)} WHERE id = 1"
-            cursor.execute(sql, params)
-            conn.commit()
+            sql = f"UPDATE timeline_config SET {', '.join(updates)} WHERE id = ?"
+            params.append(timeline_id)
+            with self.pool.transaction() as conn:
+                if not conn.execute(sql, params).rowcount:
+                    return False
+                self.touch(timeline_id)
         
-        conn.close()
         return True
     
-    def get_all_events(self, active_only=True):
-        """获取所有事件"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def get_all_events(self, active_only=True, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取时间线的所有事件（Record列表）"""
         sql = '''
         SELECT * FROM timeline_events 
-        WHERE 1=1
+        WHERE timeline_id = ?
         '''
-        params = []
+        params = [timeline_id]
         
         if active_only:
             sql += " AND is_active = 1"
         
-        sql += " ORDER BY start_year, start_month, start_day, sort_order"
+        sql += f" ORDER BY {DISPLAY_ORDER}"
         
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        conn.close()
+        with self.pool.read() as conn:
+            cursor, layout = tuple_cursor(conn, sql, params)
+            rows = cursor.fetchall()
         
-        return [dict(row) for row in rows]
+        # 只读的Record（按列名取值，dict(record)转换为字典），列名映射所有行共享
+        return layout.records(rows)
+    
+    def get_events_page(self, limit=None, cursor=None, date_from=None, date_to=None,
+                        group=None, active_only=True, timeline_id=DEFAULT_TIMELINE_ID):
+        """按时间顺序分页获取事件（键集分页）
+        
+        cursor是上一页返回的排序键，date_from/date_to是开始日期的 (年, 月, 日) 闭区间，
+        返回 (事件列表, 下一页的排序键或None)。
+        """
+        conditions = ["timeline_id = ?"]
+        params = [timeline_id]
+        
+        if active_only:
+            conditions.append("is_active = 1")
+        if group is not None:
+            conditions.append("event_group = ?")
+            params.append(group)
+        
+        return self._get_page('timeline_events', conditions, params, limit, cursor, date_from, date_to)
+    
+    def _get_page(self, table, conditions, params, limit, cursor, date_from, date_to):
+        """键集分页查询：WHERE (排序键) > (游标) ORDER BY 排序键 LIMIT n"""
+        key_count = len(DISPLAY_KEY)
+        low, high = date_range_keys(date_from, date_to)
+        if low is not None:
+            conditions.append("start_key >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append("start_key <= ?")
+            params.append(high)
+        if cursor is not None:
+            if len(cursor) != key_count:
+                raise ValueError("游标与排序键不匹配")
+            conditions.append(f"({DISPLAY_ORDER}) > ({', '.join('?' * len(cursor))})")
+            params.extend(cursor)
+        
+        # 排序键放在查询结果的最前面，最后一行的排序键即为下一页的游标
+        sql = f"SELECT {DISPLAY_ORDER}, * FROM {table}"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        sql += f" ORDER BY {DISPLAY_ORDER}"
+        if limit is not None:
+            # 多取一行用于判断是否还有下一页
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        
+        with self.pool.read() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = list(rows[-1])[:key_count]
+        
+        return [public_dict(row, key_count) for row in rows], next_cursor
+    
+    def get_range(self, date_from=None, date_to=None, timeline_id=DEFAULT_TIMELINE_ID):
+        """时间线中与日期窗口（(年, 月, 日) 闭区间，None表示不限）重叠的有效事件和时代，
+        按显示顺序返回 (事件列表, 时代列表)"""
+        low, high = date_range_keys(date_from, date_to)
+        with self.pool.read() as conn:
+            events = find_overlapping(conn, 'event', timeline_id, low, high, order_by=DISPLAY_ORDER)
+            eras = find_overlapping(conn, 'era', timeline_id, low, high, order_by=DISPLAY_ORDER)
+        return [public_dict(row) for row in events], [public_dict(row) for row in eras]
     
-    def get_event_by_id(self, event_id):
-        """根据ID获取事件"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM timeline_events WHERE id = ?', (event_id,))
-        row = cursor.fetchone()
-        conn.close()
+    def get_changes(self, kind, since, limit, timeline_id=DEFAULT_TIMELINE_ID):
+        """版本since之后变化的事件（kind='event'）或时代（kind='era'），
+        返回 (记录列表, 删除标记列表, 新版本, 是否还有更多)"""
+        with self.pool.read() as conn:
+            items, deleted, version, has_more = get_changes(conn, kind, since, limit, timeline_id)
+        items = [{key: value for key, value in item.items() if key not in INTERNAL_COLUMNS} for item in items]
+        return items, deleted, version, has_more
+    
+    def search_events(self, query, limit, offset=0, timeline_id=DEFAULT_TIMELINE_ID):
+        """全文搜索时间线的有效事件，返回 (结果列表, 是否还有更多)"""
+        with self.pool.read() as conn:
+            return search_events(conn, query, limit, offset, order_by=DISPLAY_ORDER,
+                                 timeline_id=timeline_id)
+    
+    def get_event_by_id(self, event_id, timeline_id=None):
+        """根据ID获取事件（指定timeline_id时只查找该时间线）"""
+        sql, params = 'SELECT * FROM timeline_events WHERE id = ?', [event_id]
+        if timeline_id is not None:
+            sql += ' AND timeline_id = ?'
+            params.append(timeline_id)
+        with self.pool.read() as conn:
+            row = conn.execute(sql, params).fetchone()
         
         if row:
-            return dict(row)
+            return public_dict(row)
         return None
     
-    def add_event(self, event_data):
-        """添加新事件"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def add_event(self, event_data, timeline_id=DEFAULT_TIMELINE_ID):
+        """向时间线添加新事件（所属时间线由timeline_id决定，数据中的timeline_id被忽略）"""
         # 构建字段和值
         fields = []
         placeholders = []
         values = []
         
         for field, value in event_data.items():
-            if value is not None:
+            if value is not None and field != 'timeline_id':
                 fields.append(field)
                 placeholders.append('?')
                 values.append(value)
+        fields.append('timeline_id')
+        placeholders.append('?')
+        values.append(timeline_id)
         
         sql = f"INSERT INTO timeline_events ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
-        cursor.execute(sql, values)
-        
-        event_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            event_id = conn.execute(sql, values).lastrowid
+            self.touch(timeline_id, 'event', event_id, 'create')
         
         return event_id
     
-    def update_event(self, event_id, event_data):
-        """更新事件"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def update_event(self, event_id, event_data, timeline_id=None):
+        """更新事件（指定timeline_id时只更新该时间线的事件，时间线不能修改），事件不存在时返回False"""
         # 构建更新语句
         updates = []
         values = []
         
         for field, value in event_data.items():
-            if value is not None:
+            if value is not None and field != 'timeline_id':
                 updates.append(f"{field} = ?")
                 values.append(value)
         
-        if updates:
-            updates.append("updated_at = CURRENT_TIMESTAMP")
-            sql = f"UPDATE timeline_events SET {', '.join(updates)} WHERE id = ?"
-            values.append(event_id)
-            cursor.execute(sql, values)
-            conn.commit()
+        if not updates:
+            return self.get_event_by_id(event_id, timeline_id) is not None
         
-        conn.close()
-        return True
+        updates.append("updated_at = CURRENT_TIMESTAMP")
+        sql = f"UPDATE timeline_events SET {', '.join(updates)} WHERE id = ?"
+        values.append(event_id)
+        return self._write_event(sql, values, event_id, timeline_id, 'update')
     
-    def delete_event(self, event_id, soft_delete=True):
-        """删除事件"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def delete_event(self, event_id, soft_delete=True, timeline_id=None):
+        """删除事件（指定timeline_id时只删除该时间线的事件），事件不存在时返回False"""
         if soft_delete:
-            cursor.execute('UPDATE timeline_events SET is_active = 0 WHERE id = ?', (event_id,))
+            sql = 'UPDATE timeline_events SET is_active = 0 WHERE id = ?'
         else:
-            cursor.execute('DELETE FROM timeline_events WHERE id = ?', (event_id,))
-        
-        conn.commit()
-        conn.close()
+            sql = 'DELETE FROM timeline_events WHERE id = ?'
+        return self._write_event(sql, [event_id], event_id, timeline_id, 'delete')
+    
+    def _write_event(self, sql, values, event_id, timeline_id, op):
+        """执行修改单个事件的语句，使其所属时间线的文档和该事件的片段失效"""
+        if timeline_id is not None:
+            sql += ' AND timeline_id = ?'
+            values.append(timeline_id)
+        with self.pool.transaction() as conn:
+            row = conn.execute(sql + ' RETURNING timeline_id', values).fetchone()
+            if row is None:
+                return False
+            self.touch(row[0], 'event', event_id, op)
         return True
     
-    def get_all_eras(self, active_only=True):
-        """获取所有时代"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def get_all_eras(self, active_only=True, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取时间线的所有时代（Record列表）"""
         sql = '''
         SELECT * FROM timeline_eras 
-        WHERE 1=1
+        WHERE timeline_id = ?
         '''
-        params = []
+        params = [timeline_id]
         
         if active_only:
             sql += " AND is_active = 1"
         
-        sql += " ORDER BY start_year, sort_order"
+        sql += f" ORDER BY {DISPLAY_ORDER}"
         
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        conn.close()
+        with self.pool.read() as conn:
+            cursor, layout = tuple_cursor(conn, sql, params)
+            rows = cursor.fetchall()
         
-        return [dict(row) for row in rows]
+        # 只读的Record（按列名取值，dict(record)转换为字典），列名映射所有行共享
+        return layout.records(rows)
     
-    def add_era(self, era_data):
-        """添加新时代"""
-        conn = self.connect()
-        cursor = conn.cursor()
+    def get_eras_page(self, limit=None, cursor=None, date_from=None, date_to=None,
+                      active_only=True, timeline_id=DEFAULT_TIMELINE_ID):
+        """按时间顺序分页获取时代（键集分页），参数和返回值同get_events_page"""
+        conditions = ["timeline_id = ?"]
+        params = [timeline_id]
+        
+        if active_only:
+            conditions.append("is_active = 1")
         
+        return self._get_page('timeline_eras', conditions, params, limit, cursor, date_from, date_to)
+    
+    def get_era_by_id(self, era_id, timeline_id=None):
+        """根据ID获取时代（指定timeline_id时只查找该时间线）"""
+        sql, params = 'SELECT * FROM timeline_eras WHERE id = ?', [era_id]
+        if timeline_id is not None:
+            sql += ' AND timeline_id = ?'
+            params.append(timeline_id)
+        with self.pool.read() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return public_dict(row) if row else None
+    
+    def add_era(self, era_data, timeline_id=DEFAULT_TIMELINE_ID):
+        """向时间线添加新时代（所属时间线由timeline_id决定，数据中的timeline_id被忽略）"""
         fields = []
         placeholders = []
         values = []
         
         for field, value in era_data.items():
-            if value is not None:
+            if value is not None and field != 'timeline_id':
                 fields.append(field)
                 placeholders.append('?')
                 values.append(value)
+        fields.append('timeline_id')
+        placeholders.append('?')
+        values.append(timeline_id)
         
         sql = f"INSERT INTO timeline_eras ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
-        cursor.execute(sql, values)
-        
-        era_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            era_id = conn.execute(sql, values).lastrowid
+            self.touch(timeline_id, 'era', era_id, 'create')
         
         return era_id
     
-    def update_era(self, era_id, era_data):
-        """更新时代"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def update_era(self, era_id, era_data, timeline_id=None):
+        """更新时代（指定timeline_id时只更新该时间线的时代，时间线不能修改），时代不存在时返回False"""
+        # 构建更新语句
         updates = []
         values = []
         
         for field, value in era_data.items():
-            if value is not None:
+            if value is not None and field != 'timeline_id':
                 updates.append(f"{field} = ?")
                 values.append(value)
         
-        if updates:
-            updates.append("updated_at = CURRENT_TIMESTAMP")
-            sql = f"UPDATE timeline_eras SET {', '.join(updates)} WHERE id = ?"
-            values.append(era_id)
-            cursor.execute(sql, values)
-            conn.commit()
+        if not updates:
+            return self.get_era_by_id(era_id, timeline_id) is not None
         
-        conn.close()
-        return True
+        updates.append("updated_at = CURRENT_TIMESTAMP")
+        sql = f"UPDATE timeline_eras SET {', '.join(updates)} WHERE id = ?"
+        values.append(era_id)
+        return self._write_era(sql, values, era_id, timeline_id, 'update')
     
-    def delete_era(self, era_id, soft_delete=True):
-        """删除时代"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+    def delete_era(self, era_id, soft_delete=True, timeline_id=None):
+        """删除时代（指定timeline_id时只删除该时间线的时代），时代不存在时返回False"""
         if soft_delete:
-            cursor.execute('UPDATE timeline_eras SET is_active = 0 WHERE id = ?', (era_id,))
+            sql = 'UPDATE timeline_eras SET is_active = 0 WHERE id = ?'
         else:
-            cursor.execute('DELETE FROM timeline_eras WHERE id = ?', (era_id,))
-        
-        conn.commit()
-        conn.close()
+            sql = 'DELETE FROM timeline_eras WHERE id = ?'
+        return self._write_era(sql, [era_id], era_id, timeline_id, 'delete')
+    
+    def _write_era(self, sql, values, era_id, timeline_id, op):
+        """执行修改单个时代的语句，使其所属时间线的文档和该时代的片段失效"""
+        if timeline_id is not None:
+            sql += ' AND timeline_id = ?'
+            values.append(timeline_id)
+        with self.pool.transaction() as conn:
+            row = conn.execute(sql + ' RETURNING timeline_id', values).fetchone()
+            if row is None:
+                return False
+            self.touch(row[0], 'era', era_id, op)
         return True
     
-    def generate_json(self):
-        """从数据库生成TimelineJS JSON格式"""
-        timeline_data = {
-            "title": {},
-            "events": [],
-            "eras": [],
-            "scale": "human"
+    def _table_columns(self, table):
+        """表的可写列名（不含id、所属时间线、时间戳和自动生成的列）"""
+        with self.pool.read() as conn:
+            rows = conn.execute(f'PRAGMA table_info({table})').fetchall()
+        return {row['name'] for row in rows} - {'id', 'timeline_id', 'created_at', 'updated_at',
+                                                 'media_optimized_url'}
+    
+    def apply_batch(self, operations, timeline_id=DEFAULT_TIMELINE_ID):
+        """在一个事务中按顺序执行时间线内的多个增删改操作，任一操作失败时全部回滚
+        
+        操作格式: {"op": "create|update|delete", "type": "event|era", "id": 1, "data": {...}, "soft": true}
+        返回每个操作的结果；失败时抛出BatchError（index为出错操作的序号）。
+        """
+        if not isinstance(operations, list):
+            raise ValueError("operations 必须是数组")
+        
+        handlers = {
+            'event': (self.add_event, self.update_event, self.delete_event, 'timeline_events'),
+            'era': (self.add_era, self.update_era, self.delete_era, 'timeline_eras'),
         }
+        columns = {kind: self._table_columns(table) for kind, (*_, table) in handlers.items()}
         
-        # 1. 获取配置
-        config = self.get_timeline_config()
-        if config:
-            timeline_data["title"] = {
-                "text": {
-                    "headline": config.get("title_headline", ""),
-                    "text": config.get("title_text", "")
-                }
-            }
-            timeline_data["scale"] = config.get("scale", "human")
-        
-        # 2. 获取事件
-        events = self.get_all_events()
-        for event in events:
-            # 构建日期对象
-            start_date = {}
-            if event.get("start_year"):
-                start_date["year"] = event["start_year"]
-                if event.get("start_month"):
-                    start_date["month"] = event["start_month"]
-                if event.get("start_day"):
-                    start_date["day"] = event["start_day"]
-                if event.get("start_hour"):
-                    start_date["hour"] = event["start_hour"]
-                if event.get("start_minute"):
-                    start_date["minute"] = event["start_minute"]
-                if event.get("start_second"):
-                    start_date["second"] = event["start_second"]
-                if event.get("start_millisecond"):
-                    start_date["millisecond"] = event["start_millisecond"]
-                if event.get("start_display_date"):
-                    start_date["display_date"] = event["start_display_date"]
-            
-            # 构建结束日期对象
-            end_date = None
-            if event.get("end_year"):
-                end_date = {"year": event["end_year"]}
-                if event.get("end_month"):
-                    end_date["month"] = event["end_month"]
-                if event.get("end_day"):
-                    end_date["day"] = event["end_day"]
-                if event.get("end_hour"):
-                    end_date["hour"] = event["end_hour"]
-                if event.get("end_minute"):
-                    end_date["minute"] = event["end_minute"]
-                if event.get("end_second"):
-                    end_date["second"] = event["end_second"]
-                if event.get("end_millisecond"):
-                    end_date["millisecond"] = event["end_millisecond"]
-                if event.get("end_display_date"):
-                    end_date["display_date"] = event["end_display_date"]
-            
-            # 构建事件对象
-            event_obj = {
-                "start_date": start_date,
-                "text": {
-                    "headline": event.get("headline", ""),
-                    "text": event.get("text", "")
-                }
-            }
-            
-            # 添加可选字段
-            if end_date:
-                event_obj["end_date"] = end_date
-            
-            if event.get("display_date"):
-                event_obj["display_date"] = event["display_date"]
-            
-            if event.get("event_group"):
-                event_obj["group"] = event["event_group"]
-            
-            if event.get("unique_id"):
-                event_obj["unique_id"] = event["unique_id"]
-            
-            # 媒体
-            media_fields = {}
-            if event.get("media_url"):
-                media_fields["url"] = event["media_url"]
-                if event.get("media_caption"):
-                    media_fields["caption"] = event["media_caption"]
-                if event.get("media_credit"):
-                    media_fields["credit"] = event["media_credit"]
-                if event.get("media_thumbnail"):
-                    media_fields["thumbnail"] = event["media_thumbnail"]
-                if event.get("media_alt"):
-                    media_fields["alt"] = event["media_alt"]
-                if event.get("media_title"):
-                    media_fields["title"] = event["media_title"]
-                if event.get("media_link"):
-                    media_fields["link"] = event["media_link"]
-                if event.get("media_link_target"):
-                    media_fields["link_target"] = event["media_link_target"]
-            
-            if media_fields:
-                event_obj["media"] = media_fields
+        results = []
+        with self.pool.transaction():
+            for index, operation in enumerate(operations):
+                try:
+                    if not isinstance(operation, dict):
+                        raise ValueError("操作必须是对象")
+                    op, kind = operation.get('op'), operation.get('type')
+                    if kind not in handlers:
+                        raise ValueError(f"无效的类型: {kind}")
+                    add, update, delete, _ = handlers[kind]
+                    
+                    if op in ('create', 'update'):
+                        data = operation.get('data')
+                        if not isinstance(data, dict) or not data:
+                            raise ValueError("缺少 data")
+                        unknown = set(data) - columns[kind]
+                        if unknown:
+                            raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+                    if op in ('update', 'delete'):
+                        row_id = operation.get('id')
+                        if not isinstance(row_id, int) or isinstance(row_id, bool):
+                            raise ValueError("缺少有效的 id")
+                    
+                    if op == 'create':
+                        row_id = add(data, timeline_id=timeline_id)
+                    elif op == 'update':
+                        found = update(row_id, data, timeline_id=timeline_id)
+                    elif op == 'delete':
+                        found = delete(row_id, soft_delete=operation.get('soft', True) is not False,
+                                       timeline_id=timeline_id)
+                    else:
+                        raise ValueError(f"无效的操作: {op}")
+                    if op != 'create' and not found:
+                        raise ValueError(f"{kind} {row_id} 不存在")
+                except (ValueError, sqlite3.Error) as e:
+                    raise BatchError(index, str(e))
+                
+                results.append({'index': index, 'op': op, 'type': kind, 'id': row_id, 'status': 'success'})
+        
+        return results
+    
+    def import_json(self, stream, replace=False, batch_size=1000, timeline_id=DEFAULT_TIMELINE_ID):
+        """从字节流向时间线批量导入TimelineJS JSON（单个事务），返回导入报告"""
+        from .importer import TimelineImporter
+        return TimelineImporter(self, batch_size=batch_size,
+                                timeline_id=timeline_id).run(stream, replace=replace)
+    
+    def generate_json(self, timeline_id=DEFAULT_TIMELINE_ID):
+        """从数据库生成TimelineJS JSON格式（解析缓存的文档，数据未变化时不再查询数据库）"""
+        return json.loads(self.get_json_document(timeline_id).body)
+    
+    def _event_fragments(self, timeline_id, generation):
+        """按时间顺序返回时间线所有有效事件编码后的JSON（UTF-8字节）"""
+        sql = f'''
+        SELECT id, updated_at FROM timeline_events
+        WHERE timeline_id = ? AND is_active = 1
+        ORDER BY {DISPLAY_ORDER}
+        '''
+        return self._load_fragments(('event', timeline_id), 'timeline_events', sql, timeline_id, generation)
+    
+    def _era_fragments(self, timeline_id, generation):
+        """按时间顺序返回时间线所有有效时代编码后的JSON（UTF-8字节）"""
+        sql = f'''
+        SELECT id, updated_at FROM timeline_eras
+        WHERE timeline_id = ? AND is_active = 1
+        ORDER BY {DISPLAY_ORDER}
+        '''
+        return self._load_fragments(('era', timeline_id), 'timeline_eras', sql, timeline_id, generation)
+    
+    def _load_fragments(self, kind, table, sql, timeline_id, generation):
+        """先只读取id和updated_at，缓存未命中的记录再整行读取并序列化"""
+        with self.pool.read() as conn:
+            keys = conn.execute(sql, (timeline_id,)).fetchall()
             
-            # 背景
-            background_fields = {}
-            if event.get("background_url"):
-                background_fields["url"] = event["background_url"]
-                if event.get("background_color"):
-                    background_fields["color"] = event["background_color"]
-                if event.get("background_alt"):
-                    background_fields["alt"] = event["background_alt"]
+            fragments = {}
+            missing = []
+            for row_id, updated_at in keys:
+                fragment = self.fragments.get(kind, row_id, updated_at)
+                if fragment is None:
+                    missing.append(row_id)
+                else:
+                    fragments[row_id] = fragment
             
-            if background_fields:
-                event_obj["background"] = background_fields
+            for i in range(0, len(missing), FRAGMENT_BATCH_SIZE):
+                batch = missing[i:i + FRAGMENT_BATCH_SIZE]
+                placeholders = ', '.join('?' * len(batch))
+                cursor, layout = tuple_cursor(conn, f'SELECT * FROM {table} WHERE id IN ({placeholders})', batch)
+                encode = layout.encoder(kind[0])
+                id_index, stamp_index = layout.index['id'], layout.index['updated_at']
+                for row in cursor:
+                    fragment = encode(row)
+                    self.fragments.put(kind, row[id_index], row[stamp_index], fragment, generation)
+                    fragments[row[id_index]] = fragment
+        
+        self.fragments.prune(kind, fragments.keys())
+        return [fragments[row_id] for row_id, _ in keys]
+    
+    def get_json_document(self, timeline_id=DEFAULT_TIMELINE_ID):
+        """获取时间线当前版本的TimelineJS文档（已编码的字节和ETag），数据未变化时直接返回缓存"""
+        self.check_external()
+        return self.document_cache.get(timeline_id, self.timeline_version(timeline_id),
+                                       lambda: self._encode_json(timeline_id))
+    
+    def peek_json_document(self, timeline_id=DEFAULT_TIMELINE_ID):
+        """返回已缓存且仍有效的文档，没有时返回None（不触发生成）"""
+        self.check_external()
+        return self.document_cache.peek(timeline_id, self.timeline_version(timeline_id))
+    
+    def _encode_json(self, timeline_id):
+        """生成并编码TimelineJS文档：直接拼接缓存的事件和时代片段"""
+        generation = self.fragments.generation
+        with self.pool.read():
+            title, scale = self._encode_title(self.get_timeline_config(timeline_id))
+            events = self._event_fragments(timeline_id, generation)
+            eras = self._era_fragments(timeline_id, generation)
+        
+        # 片段已是UTF-8字节，直接拼接，不再生成整个文档的字符串
+        parts = [
+            b'{"title":', title.encode('utf-8'),
+            b',"events":[', b','.join(events),
+            b'],"eras":[', b','.join(eras),
+            b'],"scale":', scale.encode('utf-8'),
+            b'}'
+        ]
+        return b''.join(parts)
+    
+    def iter_json_chunks(self, batch_size=500, timeline_id=DEFAULT_TIMELINE_ID):
+        """逐批生成TimelineJS文档的JSON（UTF-8字节），用于流式导出
+        
+        在一个读事务中用游标逐批读取事件和时代，内存占用与数据量无关。
+        调用方提前结束时应调用生成器的close()，以结束读事务。
+        """
+        generation = self.fragments.generation
+        with self.pool.read() as conn:
+            title, scale = self._encode_title(self.get_timeline_config(timeline_id))
+            yield ('{"title":' + title + ',"events":[').encode('utf-8')
             
-            if "autolink" in event:
-                event_obj["autolink"] = bool(event["autolink"])
+            sql = f"SELECT * FROM timeline_events WHERE timeline_id = ? AND is_active = 1 ORDER BY {DISPLAY_ORDER}"
+            yield from self._iter_fragments(conn, sql, ('event', timeline_id), generation, batch_size)
+            yield b'],"eras":['
             
-            timeline_data["events"].append(event_obj)
-        
-        # 3. 获取时代
-        eras = self.get_all_eras()
-        for era in eras:
-            # 构建开始日期
-            start_date = {"year": era["start_year"]}
-            if era.get("start_month"):
-                start_date["month"] = era["start_month"]
-            if era.get("start_day"):
-                start_date["day"] = era["start_day"]
+            sql = f"SELECT * FROM timeline_eras WHERE timeline_id = ? AND is_active = 1 ORDER BY {DISPLAY_ORDER}"
+            yield from self._iter_fragments(conn, sql, ('era', timeline_id), generation, batch_size)
+            yield ('],"scale":' + scale + '}').encode('utf-8')
+    
+    def _iter_fragments(self, conn, sql, kind, generation, batch_size):
+        """按批读取整行，优先使用缓存的片段，每批产出一段以逗号连接的JSON"""
+        cursor, layout = tuple_cursor(conn, sql, (kind[1],))
+        encode = layout.encoder(kind[0])
+        id_index, stamp_index = layout.index['id'], layout.index['updated_at']
+        separator = b''
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
             
-            # 构建结束日期
-            end_date = {"year": era["end_year"]}
-            if era.get("end_month"):
-                end_date["month"] = era["end_month"]
-            if era.get("end_day"):
-                end_date["day"] = era["end_day"]
+            parts = []
+            for row in rows:
+                fragment = self.fragments.get(kind, row[id_index], row[stamp_index])
+                if fragment is None:
+                    fragment = encode(row)
+                    self.fragments.put(kind, row[id_index], row[stamp_index], fragment, generation)
+                parts.append(fragment)
             
-            era_obj = {
-                "start_date": start_date,
-                "end_date": end_date,
-                "text": {
-                    "headline": era.get("headline", ""),
-                    "text": era.get("text", "")
-                }
+            yield separator + b','.join(parts)
+            separator = b','
+    
+    @staticmethod
+    def _encode_title(config):
+        """返回编码后的 (title, scale)"""
+        if not config:
+            return dumps_compact({}), dumps_compact("human")
+        
+        title = {
+            "text": {
+                "headline": config.get("title_headline", ""),
+                "text": config.get("title_text", "")
             }
-            
-            timeline_data["eras"].append(era_obj)
+        }
+        return dumps_compact(title), dumps_compact(config.get("scale", "human"))
+    
+    def save_search_index(self, filepath='static/data/search-index.json', timeline_id=DEFAULT_TIMELINE_ID):
+        """生成时间线离线搜索用的lunr索引文件"""
+        with self.pool.read() as conn:
+            data = build_lunr_index(conn, order_by=DISPLAY_ORDER, timeline_id=timeline_id)
+        
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(dumps_compact(data))
+        os.replace(tmp_path, filepath)
         
-        return timeline_data
+        print(f"搜索索引已保存: {filepath}（{'预构建索引' if data['index'] else '仅数据'}）")
+        return filepath
     
-    def save_json_to_file(self, filepath='static/data/tl-story.json'):
-        """保存JSON到文件"""
-        timeline_data = self.generate_json()
+    def save_json_to_file(self, filepath='static/data/tl-story.json', timeline_id=DEFAULT_TIMELINE_ID):
+        """保存时间线的JSON到文件"""
+        document = self.get_json_document(timeline_id)
+        
+        # 文件已是当前内容时不重复写入
+        if self._saved_json.get(filepath) == document.etag and os.path.exists(filepath):
+            return filepath
         
         # 确保目录存在
-        import os
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(timeline_data, f, indent=2, ensure_ascii=False)
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(document.body)
+        os.replace(tmp_path, filepath)
+        self._saved_json[filepath] = document.etag
         
         print(f"JSON文件已保存: {filepath}")
         return filepath
-
-
-# 创建全局数据库实例
-db = TimelineDatabase()
\ No newline at end of file
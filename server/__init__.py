@@ -0,0 +1,4 @@
+"""
+HTTP服务辅助模块
+文件名: server/__init__.py
+"""
@@ -0,0 +1,191 @@
+"""
+响应压缩：Accept-Encoding协商、动态压缩和静态文件预压缩
+文件名: server/compression.py
+"""
+
+import os
+import gzip
+import zlib
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 服务器支持的编码，q值相同时按此顺序优先
+SUPPORTED_ENCODINGS = tuple(name for name, available in (
+    ('br', brotli is not None),
+    ('zstd', zstandard is not None),
+    ('gzip', True),
+) if available)
+
+# 预压缩文件的后缀
+SUFFIXES = {'br': '.br', 'zstd': '.zst', 'gzip': '.gz'}
+
+# 值得压缩的内容类型（图片、字体等已压缩格式除外）
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'application/vnd.ms-fontobject',
+    'font/ttf',
+)
+
+# 动态压缩使用较快的级别，预压缩只做一次，使用最高级别
+DYNAMIC_LEVELS = {'br': 5, 'zstd': 3, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'zstd': 19, 'gzip': 9}
+
+
+def is_compressible(content_type):
+    """内容类型是否值得压缩"""
+    if not content_type:
+        return False
+    return content_type.split(';', 1)[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def parse_accept_encoding(header):
+    """解析Accept-Encoding请求头，返回 {编码: q值}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header, available=SUPPORTED_ENCODINGS):
+    """按Accept-Encoding选择响应编码，不压缩时返回None"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+
+    best, best_q = None, 0.0
+    for name in available:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(data, encoding, levels=DYNAMIC_LEVELS):
+    """按指定编码压缩整段数据"""
+    level = levels[encoding]
+    if encoding == 'gzip':
+        # mtime=0使相同内容的压缩结果相同
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"不支持的编码: {encoding}")
+
+
+class StreamCompressor:
+    """流式压缩器：compress()返回已产生的压缩数据，finish()返回剩余数据"""
+
+    def __init__(self, encoding, levels=DYNAMIC_LEVELS):
+        level = levels[encoding]
+        if encoding == 'gzip':
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._finish = self._obj.compress, self._obj.flush
+        elif encoding == 'br':
+            self._obj = brotli.Compressor(quality=level)
+            self._compress, self._finish = self._obj.process, self._obj.finish
+        elif encoding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._finish = self._obj.compress, self._obj.flush
+        else:
+            raise ValueError(f"不支持的编码: {encoding}")
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def finish(self):
+        return self._finish()
+
+
+class PrecompressedFiles:
+    """静态文件的预压缩副本：存放在缓存目录中，源文件修改后自动重新生成"""
+
+    def __init__(self, root, cache_dir, min_size=1024, encodings=SUPPORTED_ENCODINGS):
+        self.root = os.path.abspath(root)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.min_size = min_size
+        self.encodings = encodings
+        self._lock = threading.Lock()
+
+    def variant(self, path, encoding, stat=None):
+        """返回path的预压缩文件路径，不需要压缩时返回None
+
+        副本的mtime与源文件一致，源文件修改后（mtime不同）重新生成。
+        """
+        if encoding not in self.encodings:
+            return None
+        path = os.path.abspath(path)
+        if not path.startswith(self.root + os.sep) or path.startswith(self.cache_dir + os.sep):
+            return None
+
+        stat = stat or os.stat(path)
+        if stat.st_size < self.min_size:
+            return None
+
+        target = os.path.join(self.cache_dir, os.path.relpath(path, self.root)) + SUFFIXES[encoding]
+        if not self._fresh(target, stat):
+            with self._lock:
+                if not self._fresh(target, stat):
+                    self._build(path, target, encoding, stat)
+        return target
+
+    @staticmethod
+    def _fresh(target, stat):
+        try:
+            return os.stat(target).st_mtime_ns == stat.st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _build(path, target, encoding, stat):
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compress(data, encoding, STATIC_LEVELS))
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, target)
+
+    def build_all(self, directories, guess_type):
+        """预先为目录中所有可压缩文件生成压缩副本，返回生成/检查的文件数"""
+        count = 0
+        for directory in directories:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, directory)):
+                if os.path.abspath(dirpath).startswith(self.cache_dir):
+                    dirnames[:] = []
+                    continue
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if not is_compressible(guess_type(path)):
+                        continue
+                    for encoding in self.encodings:
+                        if self.variant(path, encoding):
+                            count += 1
+        return count
@@ -0,0 +1,226 @@
+"""
+Server-Sent Events推送：所有订阅连接由一个线程用selector管理，空闲连接只占用socket和一个小对象
+文件名: server/events.py
+"""
+
+import json
+import time
+import socket
+import selectors
+import threading
+from collections import deque
+
+CONTENT_TYPE = 'text/event-stream; charset=utf-8'
+
+# 心跳注释，防止代理因连接长时间无数据而断开，同时发现已断开的客户端
+HEARTBEAT = b':\n\n'
+
+
+def format_event(event, data, event_id=None):
+    """编码一条SSE消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class Subscriber:
+    """一个订阅连接：socket、已发送到的序号和未写完的数据"""
+
+    __slots__ = ('sock', 'seq', 'pending')
+
+    def __init__(self, sock, seq):
+        self.sock = sock
+        self.seq = seq
+        self.pending = b''
+
+
+class EventStream:
+    """把ChangeFeed中的变更推送给所有订阅连接
+
+    写入是非阻塞的：写不完的数据留在连接的缓冲中，超过max_buffer字节的慢客户端被断开，
+    客户端重连时用Last-Event-ID续传。
+    """
+
+    def __init__(self, feed, heartbeat=30, retry=3000, max_buffer=256 * 1024, gauge=None):
+        self.feed = feed
+        self.heartbeat = heartbeat
+        self.retry = retry
+        self.max_buffer = max_buffer
+        self.gauge = gauge
+        self._subscribers = {}
+        self._joining = deque()
+        self._selector = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closing = False
+        self._wakeup_read = self._wakeup_write = None
+        feed.add_listener(self._wakeup)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, sock, last_event_id=None):
+        """接管已发送完响应头的连接，服务器正在停止时返回False"""
+        with self._lock:
+            if self._closing:
+                return False
+            if self._thread is None:
+                self._start()
+        self._joining.append((sock, last_event_id))
+        self._wakeup()
+        return True
+
+    def _start(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, name='sse-stream', daemon=True)
+        self._thread.start()
+
+    def _wakeup(self):
+        if self._wakeup_write is None:
+            return
+        try:
+            self._wakeup_write.send(b'\0')
+        except OSError:
+            pass
+
+    def close(self):
+        """断开所有订阅连接并停止推送线程"""
+        with self._lock:
+            self._closing = True
+            thread = self._thread
+        if thread is None:
+            return
+        self._wakeup()
+        thread.join(timeout=5)
+        for sock in list(self._subscribers) + [sock for sock, _ in self._joining]:
+            self._close_socket(sock)
+        self._subscribers.clear()
+        self._joining.clear()
+        self._selector.close()
+        self._wakeup_read.close()
+        self._wakeup_write.close()
+
+    def _run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while not self._closing:
+            while self._joining:
+                self._join(*self._joining.popleft())
+            self._broadcast()
+
+            for key, events in self._selector.select(max(next_heartbeat - time.monotonic(), 0)):
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        while self._wakeup_read.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                subscriber = key.data
+                if events & selectors.EVENT_READ:
+                    # 客户端不应发送数据，可读通常表示连接已关闭
+                    try:
+                        if not subscriber.sock.recv(4096):
+                            self._drop(subscriber)
+                            continue
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        self._drop(subscriber)
+                        continue
+                if events & selectors.EVENT_WRITE:
+                    self._flush(subscriber)
+
+            if time.monotonic() >= next_heartbeat:
+                for subscriber in list(self._subscribers.values()):
+                    self._send(subscriber, HEARTBEAT)
+                next_heartbeat = time.monotonic() + self.heartbeat
+
+    def _join(self, sock, last_event_id):
+        """新订阅：能续传时从Last-Event-ID之后开始，否则从当前位置开始"""
+        sock.setblocking(False)
+        current = self.feed.last_seq
+        seq = self.feed.parse_event_id(last_event_id) if last_event_id else None
+        if seq is not None and self.feed.since(seq) is not None:
+            greeting = b'retry: %d\n\n' % self.retry
+        else:
+            # 首次连接发送当前位置；无法续传（服务器重启或落后太多）时通知客户端重新加载
+            event = 'reset' if last_event_id else 'ready'
+            greeting = b'retry: %d\n' % self.retry + format_event(
+                event, {'seq': current}, self.feed.event_id(current))
+            seq = current
+
+        subscriber = Subscriber(sock, seq)
+        self._subscribers[sock] = subscriber
+        self._selector.register(sock, selectors.EVENT_READ, subscriber)
+        if self.gauge is not None:
+            self.gauge.inc()
+        self._send(subscriber, greeting)
+
+    def _broadcast(self):
+        """把新变更发送给落后的订阅者，每条变更只编码一次"""
+        last = self.feed.last_seq
+        encoded = {}
+        for subscriber in list(self._subscribers.values()):
+            if subscriber.seq >= last:
+                continue
+            changes = self.feed.since(subscriber.seq)
+            if changes is None:
+                # 落后的变更已不在缓冲区中
+                data = format_event('reset', {'seq': last}, self.feed.event_id(last))
+            else:
+                parts = []
+                for change in changes:
+                    message = encoded.get(change.seq)
+                    if message is None:
+                        message = encoded[change.seq] = format_event(
+                            'change', change.to_dict(), self.feed.event_id(change.seq))
+                    parts.append(message)
+                data = b''.join(parts)
+            subscriber.seq = last
+            self._send(subscriber, data)
+
+    def _send(self, subscriber, data):
+        if subscriber.sock not in self._subscribers:
+            return
+        subscriber.pending += data
+        if len(subscriber.pending) > self.max_buffer:
+            self._drop(subscriber)
+            return
+        self._flush(subscriber)
+
+    def _flush(self, subscriber):
+        """尽量写出缓冲的数据，写不完时等待socket可写"""
+        try:
+            sent = subscriber.sock.send(subscriber.pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(subscriber)
+            return
+        subscriber.pending = subscriber.pending[sent:]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if subscriber.pending else 0)
+        if self._selector.get_key(subscriber.sock).events != events:
+            self._selector.modify(subscriber.sock, events, subscriber)
+
+    def _drop(self, subscriber):
+        if self._subscribers.pop(subscriber.sock, None) is None:
+            return
+        self._selector.unregister(subscriber.sock)
+        self._close_socket(subscriber.sock)
+        if self.gauge is not None:
+            self.gauge.dec()
+
+    @staticmethod
+    def _close_socket(sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
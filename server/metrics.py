@@ -0,0 +1,251 @@
+"""
+运行指标：请求计数、延迟和响应大小直方图、处理中请求数、SQL语句计时，以Prometheus文本格式输出
+文件名: server/metrics.py
+"""
+
+import re
+import time
+import bisect
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 直方图分桶上界（秒 / 字节 / 语句数）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+# SQL语句按第一个关键字分类，其他归为OTHER，避免标签数量无限增长
+SQL_OPERATIONS = frozenset({
+    'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH', 'BEGIN', 'COMMIT', 'ROLLBACK',
+    'SAVEPOINT', 'RELEASE', 'PRAGMA', 'CREATE', 'DROP', 'ALTER', 'ANALYZE', 'VACUUM'
+})
+
+_KEYWORD_RE = re.compile(r'\s*(\w+)')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """一个指标族：按标签值区分的多个时间序列"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted((key, self._snapshot(value)) for key, value in self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _snapshot(self, value):
+        return value
+
+    def _render_series(self, key, value):
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_number(value)}']
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """分桶计数的分布（每个序列为 [各桶计数..., 总和, 总数]）"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _snapshot(self, value):
+        return list(value)
+
+    def _render_series(self, key, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), value):
+            cumulative += count
+            le = 'le="%s"' % _format_number(float(bound))
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+        labels = _format_labels(self.labels, key)
+        lines.append(f'{self.name}_sum{labels} {_format_number(value[-2])}')
+        lines.append(f'{self.name}_count{labels} {value[-1]}')
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class SQLMetrics:
+    """数据库连接的观察者：统计语句数量和耗时，并累计到当前线程正在处理的请求"""
+
+    def __init__(self, registry):
+        self.statements = registry.counter(
+            'timeline_sql_statements_total', 'SQL statements executed', ('operation',))
+        self.duration = registry.histogram(
+            'timeline_sql_statement_duration_seconds', 'SQL statement execution time', ('operation',))
+        self.connections = registry.counter(
+            'timeline_db_connections_opened_total', 'SQLite connections opened')
+        self.connect_duration = registry.histogram(
+            'timeline_db_connection_setup_seconds', 'Time to open and configure a SQLite connection')
+        self._local = threading.local()
+        self._operations = {}
+
+    def connected(self, seconds):
+        """连接已创建并完成配置"""
+        self.connections.inc()
+        self.connect_duration.observe(seconds)
+
+    def statement(self, sql, seconds):
+        """一条语句执行完毕"""
+        operation = self._operations.get(sql)
+        if operation is None:
+            operation = self._operation(sql)
+        self.statements.inc(operation)
+        self.duration.observe(seconds, operation)
+
+        local = self._local
+        if getattr(local, 'active', False):
+            local.count += 1
+            local.seconds += seconds
+
+    def _operation(self, sql):
+        match = _KEYWORD_RE.match(sql)
+        operation = match.group(1).upper() if match else 'OTHER'
+        if operation not in SQL_OPERATIONS:
+            operation = 'OTHER'
+        # 固定的SQL文本重复出现，缓存分类结果（动态拼接的SQL不会无限占用内存）
+        if len(self._operations) < 1024:
+            self._operations[sql] = operation
+        return operation
+
+    def begin_request(self):
+        local = self._local
+        local.active = True
+        local.count = 0
+        local.seconds = 0.0
+
+    def end_request(self):
+        """返回当前请求执行的 (语句数, 总耗时)"""
+        local = self._local
+        local.active = False
+        return local.count, local.seconds
+
+
+class HTTPMetrics:
+    """按路由统计请求"""
+
+    def __init__(self, registry, sql=None):
+        labels = ('route', 'method')
+        self.requests = registry.counter(
+            'timeline_http_requests_total', 'HTTP requests handled', labels + ('status',))
+        self.duration = registry.histogram(
+            'timeline_http_request_duration_seconds', 'HTTP request latency', labels)
+        self.response_size = registry.histogram(
+            'timeline_http_response_size_bytes', 'HTTP response body size', labels, SIZE_BUCKETS)
+        self.in_flight = registry.gauge(
+            'timeline_http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+        self.sql = sql
+        if sql is not None:
+            self.sql_statements = registry.histogram(
+                'timeline_http_request_sql_statements', 'SQL statements per request', labels, COUNT_BUCKETS)
+            self.sql_duration = registry.histogram(
+                'timeline_http_request_sql_seconds', 'Total SQL time per request', labels)
+
+    def begin(self, route):
+        """请求开始，返回开始时间"""
+        self.in_flight.inc(route)
+        if self.sql is not None:
+            self.sql.begin_request()
+        return time.perf_counter()
+
+    def end(self, route, method, status, size, started):
+        """请求结束"""
+        elapsed = time.perf_counter() - started
+        self.in_flight.dec(route)
+        self.requests.inc(route, method, str(status))
+        self.duration.observe(elapsed, route, method)
+        self.response_size.observe(size, route, method)
+        if self.sql is not None:
+            count, seconds = self.sql.end_request()
+            self.sql_statements.observe(count, route, method)
+            self.sql_duration.observe(seconds, route, method)
@@ -0,0 +1,177 @@
+"""
+multipart/form-data流式解析：边读边交给调用方，内存占用与请求体大小无关
+文件名: server/multipart.py
+"""
+
+# 每次从请求体读取的字节数
+READ_SIZE = 64 * 1024
+
+# 单个部分的头最多字节数
+MAX_HEADER_SIZE = 16 * 1024
+
+
+class MultipartError(ValueError):
+    """请求体不是有效的multipart/form-data"""
+
+
+def parse_options_header(value):
+    """解析 'type; key=value; key="value"' 形式的头，返回 (小写的主值, 参数字典)"""
+    parts = _split_params(value or '')
+    main = parts[0].strip().lower()
+    options = {}
+    for item in parts[1:]:
+        key, sep, val = item.strip().partition('=')
+        if not sep:
+            continue
+        val = val.strip()
+        if len(val) >= 2 and val[0] == val[-1] == '"':
+            val = val[1:-1].replace('\\\\', '\\').replace('\\"', '"')
+        options[key.strip().lower()] = val
+    return main, options
+
+
+def _split_params(value):
+    """按分号分割，引号内的分号不算"""
+    parts, current, quoted, escaped = [], [], False, False
+    for char in value:
+        if escaped:
+            escaped = False
+        elif char == '\\' and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ';' and not quoted:
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current))
+    return parts
+
+
+class Part:
+    """multipart中的一个部分：头和按块读取的内容（必须在读取下一个部分前读完或丢弃）"""
+
+    __slots__ = ('headers', 'name', 'filename', 'content_type', '_reader')
+
+    def __init__(self, headers, reader):
+        self.headers = headers
+        self._reader = reader
+        _, options = parse_options_header(headers.get('content-disposition'))
+        self.name = options.get('name')
+        filename = options.get('filename')
+        # 部分浏览器发送完整路径，只保留文件名
+        self.filename = filename.replace('\\', '/').rsplit('/', 1)[-1] if filename is not None else None
+        self.content_type = parse_options_header(headers.get('content-type', 'text/plain'))[0]
+
+    def chunks(self):
+        """逐块返回部分的内容"""
+        if not self._reader._part_open:
+            return iter(())
+        return self._reader._read_part()
+
+    def discard(self):
+        for _ in self.chunks():
+            pass
+
+
+class MultipartReader:
+    """从请求体流中依次读取各个部分
+
+    用法:
+        for part in MultipartReader(stream, boundary):
+            for chunk in part.chunks(): ...
+    """
+
+    def __init__(self, stream, boundary, read_size=READ_SIZE):
+        if not boundary or len(boundary) > 70:
+            raise MultipartError("无效的multipart边界")
+        self.stream = stream
+        self.read_size = read_size
+        self._delimiter = b'\r\n--' + boundary.encode('latin-1')
+        # 前面补一个换行，使第一个边界与其余边界的格式相同
+        self._buffer = bytearray(b'\r\n')
+        self._eof = False
+        self._part_open = False
+        self._done = False
+
+    @classmethod
+    def from_content_type(cls, stream, content_type, read_size=READ_SIZE):
+        main, options = parse_options_header(content_type)
+        if main != 'multipart/form-data':
+            raise MultipartError("请求体必须是multipart/form-data")
+        return cls(stream, options.get('boundary'), read_size)
+
+    def _fill(self):
+        """读取更多数据，流已结束时返回False"""
+        if self._eof:
+            return False
+        data = self.stream.read(self.read_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def __iter__(self):
+        # 跳过第一个边界之前的内容
+        for _ in self._read_part():
+            pass
+        while not self._done:
+            part = Part(self._read_headers(), self)
+            self._part_open = True
+            yield part
+            if self._part_open:
+                part.discard()
+
+    def _read_part(self):
+        """返回到下一个边界为止的内容，并处理边界之后的结束标记"""
+        delimiter = self._delimiter
+        buffer = self._buffer
+        while True:
+            index = buffer.find(delimiter)
+            if index >= 0:
+                if index:
+                    yield bytes(buffer[:index])
+                del buffer[:index + len(delimiter)]
+                break
+            # 末尾可能是边界的开头，留在缓冲区中
+            keep = len(delimiter) - 1
+            if len(buffer) > keep:
+                yield bytes(buffer[:-keep])
+                del buffer[:-keep]
+            if not self._fill():
+                raise MultipartError("请求体在multipart结束标记之前结束")
+
+        self._part_open = False
+        while len(buffer) < 2 and self._fill():
+            pass
+        if buffer[:2] == b'--':
+            self._done = True
+        elif len(buffer) < 2:
+            raise MultipartError("请求体在multipart结束标记之前结束")
+
+    def _read_headers(self):
+        """读取边界之后的一行结束符和部分的头"""
+        buffer = self._buffer
+        while True:
+            end = buffer.find(b'\r\n\r\n')
+            if end >= 0:
+                break
+            if len(buffer) > MAX_HEADER_SIZE:
+                raise MultipartError("multipart部分的头过长")
+            if not self._fill():
+                raise MultipartError("请求体在multipart部分的头中结束")
+
+        # 边界行末尾允许有空白（RFC 2046的transport padding）
+        lines = bytes(buffer[:end]).decode('utf-8', 'replace').split('\r\n')
+        del buffer[:end + 4]
+        if lines[0].strip():
+            raise MultipartError("无效的multipart边界行")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise MultipartError(f"无效的multipart头: {line}")
+            headers[name.strip().lower()] = value.strip()
+        return headers
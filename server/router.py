@@ -0,0 +1,112 @@
+"""
+API路由表：路径模式在注册时编译，静态路径用字典查找，带参数的路径按段组成前缀树
+文件名: server/router.py
+"""
+
+import re
+
+_PARAM_RE = re.compile(r'^\{(\w+)(?::(\w+))?\}$')
+
+
+def _to_int(segment):
+    # int()还接受空格、正负号和下划线，路径参数只允许ASCII数字
+    if not (segment.isascii() and segment.isdigit()):
+        raise ValueError(segment)
+    return int(segment)
+
+
+# 路径参数类型: {name:int}、{name:str}（默认str）
+CONVERTERS = {'int': _to_int, 'str': str}
+
+
+class Route:
+    """一个路径模式及其各HTTP方法的处理函数"""
+
+    __slots__ = ('pattern', 'handlers', 'stream_body', 'allow')
+
+    def __init__(self, pattern, handlers, stream_body=False):
+        self.pattern = pattern
+        self.handlers = handlers
+        # 处理函数自行流式读取请求体
+        self.stream_body = stream_body
+        self.allow = ', '.join(sorted(handlers))
+
+
+class _Node:
+    __slots__ = ('children', 'param', 'route')
+
+    def __init__(self):
+        self.children = {}
+        self.param = None    # (参数名, 转换函数, 子节点)
+        self.route = None
+
+
+class Router:
+    """路由表：add()注册，match()按请求路径查找"""
+
+    def __init__(self):
+        self._static = {}
+        self._root = _Node()
+
+    def add(self, pattern, stream_body=False, **handlers):
+        """注册路由，handlers为 方法名=处理函数，例如 GET=func"""
+        route = Route(pattern, handlers, stream_body)
+        if '{' not in pattern:
+            self._static[pattern.rstrip('/')] = route
+            return route
+
+        node = self._root
+        for segment in pattern.strip('/').split('/'):
+            param = _PARAM_RE.match(segment)
+            if param is None:
+                node = node.children.setdefault(segment, _Node())
+                continue
+
+            name, type_name = param.group(1), param.group(2) or 'str'
+            if type_name not in CONVERTERS:
+                raise ValueError(f"未知的路径参数类型: {type_name}")
+            if node.param is None:
+                node.param = (name, CONVERTERS[type_name], _Node())
+            elif node.param[:2] != (name, CONVERTERS[type_name]):
+                raise ValueError(f"路径参数与已注册的路由冲突: {pattern}")
+            node = node.param[2]
+
+        if node.route is not None:
+            raise ValueError(f"路由重复注册: {pattern}")
+        node.route = route
+        return route
+
+    def match(self, path):
+        """返回 (路由, 路径参数)，没有匹配的路由时返回 (None, None)"""
+        route = self._static.get(path.rstrip('/'))
+        if route is not None:
+            return route, {}
+
+        params = {}
+        route = self._match(self._root, path.strip('/').split('/'), 0, params)
+        if route is None:
+            return None, None
+        return route, params
+
+    def _match(self, node, segments, index, params):
+        if index == len(segments):
+            return node.route
+
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            route = self._match(child, segments, index + 1, params)
+            if route is not None:
+                return route
+
+        if node.param is not None:
+            name, convert, child = node.param
+            try:
+                params[name] = convert(segment)
+            except ValueError:
+                return None
+            route = self._match(child, segments, index + 1, params)
+            if route is not None:
+                return route
+            del params[name]
+        return None
@@ -0,0 +1,256 @@
+"""
+静态文件服务：内存缓存热点小文件，校验器与条件请求，大文件sendfile
+文件名: server/static.py
+"""
+
+import os
+import time
+import posixpath
+import mimetypes
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import unquote
+
+from .compression import choose_encoding, is_compressible
+from .validators import encoded_etag, not_modified
+
+# 需要声明字符集的文本类型
+CHARSET_TYPES = ('text/', 'application/json', 'application/javascript')
+
+
+class StaticEntry:
+    """一个静态文件的元数据，小文件同时持有内容"""
+
+    __slots__ = ('key', 'path', 'size', 'mtime', 'mtime_ns', 'etag', 'last_modified',
+                 'content_type', 'compressible', 'body', 'variants', 'checked_at')
+
+    def __init__(self, key, path, stat, content_type, body=None):
+        self.key = key
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.compressible = is_compressible(content_type)
+        self.body = body
+        # 内存中的压缩副本 {编码: 字节}
+        self.variants = {}
+        self.checked_at = time.monotonic()
+
+    def same_file(self, stat):
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+
+class StaticFiles:
+    """root目录下的静态文件服务
+
+    不超过max_file_size的文件连同压缩副本缓存在内存中（LRU，总量不超过memory_limit），
+    缓存的文件每check_interval秒才重新stat一次；更大的文件用sendfile直接从文件发送。
+    """
+
+    def __init__(self, root, precompressed=None, memory_limit=32 * 1024 * 1024,
+                 max_file_size=256 * 1024, check_interval=1.0,
+                 immutable_prefixes=(), max_age=365 * 24 * 3600,
+                 index_files=('index.html',)):
+        self.root = os.path.abspath(root)
+        self.precompressed = precompressed
+        self.memory_limit = memory_limit
+        self.max_file_size = max_file_size
+        self.check_interval = check_interval
+        self.immutable_prefixes = tuple(immutable_prefixes)
+        self.max_age = max_age
+        self.index_files = index_files
+
+        self._entries = OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def guess_type(path):
+        """文件的Content-Type"""
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith(CHARSET_TYPES):
+            content_type += '; charset=utf-8'
+        return content_type
+
+    def serve(self, handler, url_path, head=False):
+        """发送url_path对应的静态文件"""
+        entry = self._cached(url_path)
+        if entry is None:
+            found = self._locate(url_path)
+            if found is None:
+                handler.send_error(404, 'File not found')
+                return
+            if isinstance(found, str):
+                # 目录缺少结尾斜杠时重定向，使页面中的相对路径正确
+                handler.send_response(301)
+                handler.send_header('Location', found)
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            entry = self._load(url_path, *found)
+
+        self._send(handler, entry, url_path, head)
+
+    def _cached(self, url_path):
+        """返回仍有效的缓存项；超过检查间隔时重新stat确认文件未变化"""
+        with self._lock:
+            entry = self._entries.get(url_path)
+            if entry is None:
+                return None
+            self._entries.move_to_end(url_path)
+
+        now = time.monotonic()
+        if now - entry.checked_at < self.check_interval:
+            return entry
+        try:
+            stat = os.stat(entry.path)
+        except OSError:
+            stat = None
+        if stat is not None and entry.same_file(stat):
+            entry.checked_at = now
+            return entry
+
+        self._evict(url_path)
+        return None
+
+    def _locate(self, url_path):
+        """URL路径转换为 (文件路径, stat)；需要重定向时返回新URL，不存在时返回None"""
+        parts = [part for part in posixpath.normpath(unquote(url_path)).split('/') if part]
+        # 不提供隐藏文件和目录（.git、.cache等）
+        if any(part.startswith('.') for part in parts):
+            return None
+
+        path = os.path.join(self.root, *parts)
+        try:
+            stat = os.stat(path)
+            if os.path.isdir(path):
+                if not url_path.endswith('/'):
+                    return url_path + '/'
+                for index in self.index_files:
+                    index_path = os.path.join(path, index)
+                    if os.path.isfile(index_path):
+                        return index_path, os.stat(index_path)
+                return None
+        except OSError:
+            return None
+        return path, stat
+
+    def _load(self, url_path, path, stat):
+        """创建缓存项；小文件读入内存并加入LRU"""
+        content_type = self.guess_type(path)
+        if stat.st_size > self.max_file_size:
+            return StaticEntry(url_path, path, stat, content_type)
+
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                body = f.read()
+        except OSError:
+            return StaticEntry(url_path, path, stat, content_type)
+        if len(body) != stat.st_size:
+            # 读取时文件正在被修改，这次不缓存
+            return StaticEntry(url_path, path, stat, content_type)
+
+        entry = StaticEntry(url_path, path, stat, content_type, body)
+        self._store(entry)
+        return entry
+
+    def _store(self, entry):
+        with self._lock:
+            old = self._entries.pop(entry.key, None)
+            if old is not None:
+                self._memory -= self._entry_size(old)
+            self._entries[entry.key] = entry
+            self._memory += self._entry_size(entry)
+            while self._memory > self.memory_limit and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory -= self._entry_size(evicted)
+
+    def _evict(self, url_path):
+        with self._lock:
+            entry = self._entries.pop(url_path, None)
+            if entry is not None:
+                self._memory -= self._entry_size(entry)
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry.body or b'') + sum(len(body) for body in entry.variants.values())
+
+    def _variant(self, entry, encoding):
+        """压缩副本：缓存的小文件返回字节，其他返回预压缩文件路径，没有时返回None"""
+        body = entry.variants.get(encoding)
+        if body is not None:
+            return body
+        try:
+            path = self.precompressed.variant(entry.path, encoding)
+        except OSError:
+            return None
+        if path is None or entry.body is None:
+            return path
+
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            if encoding not in entry.variants:
+                entry.variants[encoding] = body
+                if self._entries.get(entry.key) is entry:
+                    self._memory += len(body)
+        return body
+
+    def cache_control(self, url_path):
+        """按路径返回Cache-Control：第三方库目录长期缓存，其他每次重新校验"""
+        if url_path.startswith(self.immutable_prefixes):
+            return f'public, max-age={self.max_age}, immutable'
+        return 'no-cache'
+
+    def _send(self, handler, entry, url_path, head):
+        body, path, size, encoding = entry.body, entry.path, entry.size, None
+
+        if entry.compressible and self.precompressed is not None:
+            encoding = choose_encoding(handler.headers.get('Accept-Encoding'),
+                                       self.precompressed.encodings)
+            variant = self._variant(entry, encoding) if encoding else None
+            if variant is None:
+                encoding = None
+            elif isinstance(variant, bytes):
+                body, size = variant, len(variant)
+            else:
+                body, path, size = None, variant, os.path.getsize(variant)
+
+        etag = encoded_etag(entry.etag, encoding)
+        if not_modified(handler.headers, etag, entry.mtime):
+            handler.send_response(304)
+            self._send_validators(handler, entry, etag, url_path)
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', entry.content_type)
+        handler.send_header('Content-Length', str(size))
+        if encoding:
+            handler.send_header('Content-Encoding', encoding)
+        self._send_validators(handler, entry, etag, url_path)
+        handler.end_headers()
+        if head:
+            return
+
+        if body is not None:
+            handler.wfile.write(body)
+        else:
+            # 大文件由内核直接从文件复制到socket
+            with open(path, 'rb') as f:
+                handler.connection.sendfile(f, 0, size)
+
+    def _send_validators(self, handler, entry, etag, url_path):
+        handler.send_header('ETag', etag)
+        handler.send_header('Last-Modified', entry.last_modified)
+        handler.send_header('Cache-Control', self.cache_control(url_path))
+        if entry.compressible and self.precompressed is not None:
+            handler.send_header('Vary', 'Accept-Encoding')
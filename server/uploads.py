@@ -0,0 +1,72 @@
+"""
+上传文件的存储：流式写入临时文件并计算sha256，按内容命名，相同内容只保存一份
+文件名: server/uploads.py
+"""
+
+import os
+import hashlib
+import tempfile
+
+
+class UploadRejected(ValueError):
+    """上传的文件不符合限制（status为应返回的HTTP状态码）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadStore:
+    """把上传文件保存到folder中，文件名为 <sha256>.<扩展名>，URL为 url_prefix + 文件名"""
+
+    def __init__(self, folder, url_prefix, allowed_extensions, max_size):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self.allowed_extensions = frozenset(ext.lower() for ext in allowed_extensions)
+        self.max_size = max_size
+
+    def check_filename(self, filename):
+        """检查文件名的扩展名，返回小写的扩展名"""
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension not in self.allowed_extensions:
+            raise UploadRejected(f"不支持的文件类型: {extension or filename!r}", status=415)
+        return extension
+
+    def save(self, filename, chunks):
+        """写入一个文件，超过max_size时立即停止读取并删除已写入的部分
+
+        返回 {"url", "name", "filename", "size", "sha256", "duplicate"}，
+        duplicate为True表示相同内容的文件已经存在。
+        """
+        extension = self.check_filename(filename)
+        os.makedirs(self.folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.upload-', suffix='.tmp', dir=self.folder)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise UploadRejected(f"文件超过大小限制 {self.max_size} 字节", status=413)
+                    digest.update(chunk)
+                    f.write(chunk)
+            if size == 0:
+                raise UploadRejected("文件为空")
+
+            sha256 = digest.hexdigest()
+            name = sha256 + extension
+            path = os.path.join(self.folder, name)
+            duplicate = os.path.exists(path)
+            if duplicate:
+                os.remove(tmp_path)
+            else:
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return {'url': self.url_prefix + name, 'name': name, 'filename': filename,
+                'size': size, 'sha256': sha256, 'duplicate': duplicate}
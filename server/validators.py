@@ -0,0 +1,42 @@
+"""
+HTTP条件请求：ETag与Last-Modified校验
+文件名: server/validators.py
+"""
+
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+
+def etag_matches(if_none_match, etag):
+    """判断If-None-Match请求头是否包含指定ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip() in (etag, f'W/{etag}') for tag in if_none_match.split(','))
+
+
+def encoded_etag(etag, encoding):
+    """压缩后的表示使用不同的强ETag"""
+    if encoding is None:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def not_modified(headers, etag, mtime):
+    """按If-None-Match（优先）或If-Modified-Since判断客户端缓存是否仍有效"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get('If-Modified-Since')
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP日期精确到秒
+    return int(mtime) <= since.timestamp()
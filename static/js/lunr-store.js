@@ -1,12 +1,56 @@
----
-# create lunr store 
----
-var store = [ 
-    {% for item in site.html_pages %} 
-    { 
-        "url": {{ item.url | relative_url | jsonify }},
-        "title": {{ item.title | jsonify }},
-        "text": {{ item.content | strip_html | normalize_whitespace | jsonify }}
-    }{%- unless forloop.last -%},{%- endunless -%}
-    {%- endfor -%}
-];
+/**
+ * 离线事件搜索
+ * 文件名: /static/js/lunr-store.js
+ *
+ * 加载服务器生成的 search-index.json（python3 main.py search-index，或生成JSON时一并生成）。
+ * 文件中有预构建索引时直接加载；否则用其中的数据在浏览器中构建lunr索引。
+ * 依赖: /static/lib/lunr.min.js
+ */
+
+const TimelineSearch = (() => {
+    const INDEX_URL = '/static/data/search-index.json';
+
+    let index = null;
+    let store = {};
+
+    // 浏览器端构建索引（字段权重与服务器端一致）
+    function buildIndex(documents) {
+        return lunr(function () {
+            this.ref('id');
+            this.field('headline', { boost: 10 });
+            this.field('caption', { boost: 3 });
+            this.field('text');
+
+            Object.keys(documents).forEach((id) => {
+                const doc = documents[id];
+                this.add({ id, headline: doc.headline, caption: doc.caption || '', text: doc.text || '' });
+            });
+        });
+    }
+
+    async function load(url = INDEX_URL) {
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error(`加载搜索索引失败: HTTP ${response.status}`);
+        }
+        const data = await response.json();
+
+        store = data.store;
+        index = data.index ? lunr.Index.load(data.index) : buildIndex(store);
+        return index;
+    }
+
+    // 返回 [{id, score, headline, date, group}]，索引未加载时返回空数组
+    function search(query) {
+        if (!index || !query) {
+            return [];
+        }
+        return index.search(query).map((result) => ({
+            id: Number(result.ref),
+            score: result.score,
+            ...store[result.ref]
+        }));
+    }
+
+    return { load, search };
+})();
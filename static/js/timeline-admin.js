@@ -11,6 +11,9 @@ let timelineData = {
     scale: "human"
 };
 
+// 生成的TimelineJS JSON（预览用，与上面的列表数据分开保存）
+let previewData = null;
+
 // 配置
 const API_CONFIG = {
     BASE_URL: '/api',
@@ -19,12 +22,22 @@ const API_CONFIG = {
         EVENTS: '/events',
         ERAS: '/eras',
         GENERATE_JSON: '/generate-json',
+        BATCH: '/batch',
+        CHANGES: '/changes',
         HEALTH: '/health'
     },
+    TIMELINE_ID: 1, // 旧接口作用的默认时间线
     AUTO_SAVE: false,
-    AUTO_GENERATE_JSON: true // 自动生成JSON文件
+    AUTO_GENERATE_JSON: true, // 自动生成JSON文件
+    PAGE_SIZE: 50 // 事件列表每页条数
 };
 
+// 事件列表下一页的游标（null表示已全部加载）
+let eventsCursor = null;
+
+// 变更推送连接（EventSource），断开后由浏览器自动重连并用Last-Event-ID续传
+let changeFeed = null;
+
 // DOM元素引用
 const elements = {
     eventsContainer: document.getElementById('eventsContainer'),
@@ -71,9 +84,8 @@ const elements = {
 // 初始化函数
 function init() {
     bindEvents();
-    loadConfig();
-    loadEvents();
-    loadEras();
+    reloadAll();
+    connectChanges();
     updateUI();
     
     log('系统初始化完成');
@@ -83,11 +95,7 @@ function init() {
 // 绑定事件
 function bindEvents() {
     // 数据操作按钮
-    elements.loadDataBtn.addEventListener('click', () => {
-        loadConfig();
-        loadEvents();
-        loadEras();
-    });
+    elements.loadDataBtn.addEventListener('click', reloadAll);
     
     elements.saveDataBtn.addEventListener('click', saveConfig);
     elements.generateJsonBtn.addEventListener('click', generateJsonFile);
@@ -152,6 +160,123 @@ async function apiRequest(endpoint, method = 'GET', data = null) {
     }
 }
 
+// 批量操作：operations为 [{op: 'create'|'update'|'delete', type: 'event'|'era', id, data}]，
+// 在一个事务中执行，任一操作失败时全部回滚
+async function apiBatch(operations) {
+    const response = await fetch(API_CONFIG.BASE_URL + API_CONFIG.ENDPOINTS.BATCH, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ operations }),
+    });
+    const result = await response.json();
+    
+    if (!response.ok) {
+        const error = new Error(result.error || `HTTP ${response.status}: ${response.statusText}`);
+        error.index = result.index;
+        throw error;
+    }
+    return result.results;
+}
+
+// 重新加载配置、事件和时代
+function reloadAll() {
+    loadConfig();
+    loadEvents();
+    loadEras();
+}
+
+// 订阅变更推送：本页和其他编辑者的修改提交后，只更新受影响的条目，不再重新加载整个列表
+function connectChanges() {
+    if (!window.EventSource) {
+        log('浏览器不支持EventSource，修改后将重新加载列表', 'warning');
+        return;
+    }
+    
+    changeFeed = new EventSource(API_CONFIG.BASE_URL + API_CONFIG.ENDPOINTS.CHANGES);
+    changeFeed.addEventListener('change', (e) => applyChange(JSON.parse(e.data)));
+    changeFeed.addEventListener('reset', () => {
+        // 服务器重启或落后太多，无法续传
+        log('变更推送已重新连接，重新加载数据', 'warning');
+        reloadAll();
+    });
+}
+
+// 变更推送是否正常连接（未连接时修改后仍重新加载列表）
+function changesConnected() {
+    return changeFeed !== null && changeFeed.readyState === EventSource.OPEN;
+}
+
+// 应用一条变更: {entity: 'event'|'era'|'timeline', id, op, timeline, version}
+async function applyChange(change) {
+    // timeline为null表示所有时间线（数据库被整体替换）
+    if (change.timeline !== API_CONFIG.TIMELINE_ID && change.timeline !== null) {
+        return;
+    }
+    
+    if (change.entity === 'timeline') {
+        // reset: 其他进程（命令行导入、恢复备份等）修改了数据
+        if (change.op === 'import' || change.op === 'reset') {
+            reloadAll();
+        } else if (change.op === 'update' && ![elements.titleHeadline, elements.titleText].includes(document.activeElement)) {
+            // 正在编辑标题时不覆盖输入框
+            loadConfig();
+        }
+    } else if (change.entity === 'event') {
+        await applyItemChange(change, timelineData.events, API_CONFIG.ENDPOINTS.EVENTS, eventsCursor === null);
+        updateEventsList();
+        updateEventCount();
+    } else if (change.entity === 'era') {
+        await applyItemChange(change, timelineData.eras, API_CONFIG.ENDPOINTS.ERAS, true);
+        updateErasList();
+    }
+}
+
+// 按变更更新列表中的一条记录；列表未加载完（complete为false）时，
+// 新记录只有排在已加载部分之内才插入，其余的在加载下一页时出现
+async function applyItemChange(change, items, endpoint, complete) {
+    let item = null;
+    if (change.op !== 'delete') {
+        try {
+            item = await apiRequest(`${endpoint}/${change.id}`);
+        } catch (error) {
+            item = null;
+        }
+    }
+    
+    const index = items.findIndex(existing => existing.id === change.id);
+    if (index >= 0) {
+        items.splice(index, 1);
+    }
+    if (!item || !item.is_active) {
+        return;
+    }
+    if (index >= 0 || complete || (items.length && compareDisplayOrder(item, items[items.length - 1]) < 0)) {
+        items.push(item);
+        items.sort(compareDisplayOrder);
+    }
+}
+
+// 服务器的显示顺序按 (start_key, sort_order, id)，start_key由开始日期的
+// 年、月、日、时、分、秒、毫秒（空为0）依次组成，这里按相同的字段逐个比较
+// （|年| >= 400000 时服务器降低年内精度，这样的事件在同一年内的顺序可能不同）
+const DISPLAY_ORDER_FIELDS = [
+    'start_year', 'start_month', 'start_day', 'start_hour', 'start_minute',
+    'start_second', 'start_millisecond', 'sort_order', 'id'
+];
+
+function compareDisplayOrder(a, b) {
+    for (const field of DISPLAY_ORDER_FIELDS) {
+        const x = a[field] || 0;
+        const y = b[field] || 0;
+        if (x !== y) {
+            return x < y ? -1 : 1;
+        }
+    }
+    return 0;
+}
+
 // 加载配置
 async function loadConfig() {
     try {
@@ -192,14 +317,20 @@ async function saveConfig() {
     }
 }
 
-// 加载事件
-async function loadEvents() {
+// 加载事件（分页加载，append为true时追加下一页）
+async function loadEvents(append = false) {
+    let endpoint = `${API_CONFIG.ENDPOINTS.EVENTS}?limit=${API_CONFIG.PAGE_SIZE}`;
+    if (append && eventsCursor) {
+        endpoint += `&cursor=${encodeURIComponent(eventsCursor)}`;
+    }
+    
     try {
-        const events = await apiRequest(API_CONFIG.ENDPOINTS.EVENTS);
-        timelineData.events = events;
+        const page = await apiRequest(endpoint);
+        timelineData.events = append ? timelineData.events.concat(page.items) : page.items;
+        eventsCursor = page.next_cursor;
         updateEventsList();
         updateEventCount();
-        log(`已加载 ${events.length} 个事件`, 'success');
+        log(`已加载 ${timelineData.events.length} 个事件${eventsCursor ? '（还有更多）' : ''}`, 'success');
     } catch (error) {
         log(`事件加载失败: ${error.message}`, 'error');
     }
@@ -221,7 +352,7 @@ async function loadEras() {
 async function loadTimelineData() {
     try {
         const data = await apiRequest(API_CONFIG.ENDPOINTS.GENERATE_JSON);
-        timelineData = data;
+        previewData = data;
         updatePreview();
         log('时间线数据加载成功', 'success');
     } catch (error) {
@@ -244,7 +375,7 @@ async function generateJsonFile(silent = false) {
         }
         
         // 更新预览
-        timelineData = result.data;
+        previewData = result.data;
         updatePreview();
         
         return result;
@@ -325,8 +456,21 @@ function updateEventsList() {
         `;
     });
     
+    if (eventsCursor) {
+        html += `
+            <div class="text-center my-3">
+                <button id="loadMoreEventsBtn" class="btn btn-sm btn-outline-secondary">加载更多</button>
+            </div>
+        `;
+    }
+    
     elements.eventsContainer.innerHTML = html;
     
+    const loadMoreBtn = document.getElementById('loadMoreEventsBtn');
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener('click', () => loadEvents(true));
+    }
+    
     // 绑定事件操作按钮
     document.querySelectorAll('.edit-event').forEach(btn => {
         btn.addEventListener('click', function() {
@@ -376,7 +520,8 @@ function getDateDisplay(event) {
 
 // 更新事件计数
 function updateEventCount() {
-    elements.eventCount.textContent = timelineData.events ? timelineData.events.length : 0;
+    const count = timelineData.events ? timelineData.events.length : 0;
+    elements.eventCount.textContent = eventsCursor ? `${count}+` : count;
 }
 
 // 更新时代列表
@@ -443,7 +588,9 @@ function addEra() {
     apiRequest(API_CONFIG.ENDPOINTS.ERAS, 'POST', eraData)
         .then(result => {
             log(`添加时代: ${eraName}`, 'success');
-            loadEras();
+            if (!changesConnected()) {
+                loadEras();
+            }
             if (API_CONFIG.AUTO_GENERATE_JSON) {
                 generateJsonFile(true);
             }
@@ -459,7 +606,9 @@ async function deleteEra(eraId) {
         try {
             await apiRequest(`${API_CONFIG.ENDPOINTS.ERAS}/${eraId}`, 'DELETE');
             log(`时代已删除`, 'warning');
-            loadEras();
+            if (!changesConnected()) {
+                loadEras();
+            }
             if (API_CONFIG.AUTO_GENERATE_JSON) {
                 generateJsonFile(true);
             }
@@ -542,9 +691,11 @@ async function saveEvent() {
             log(`事件已添加: ${eventData.headline}`, 'success');
         }
         
-        // 关闭模态框并刷新
+        // 关闭模态框；列表由变更推送更新，未连接时重新加载
         elements.eventModal.hide();
-        loadEvents();
+        if (!changesConnected()) {
+            loadEvents();
+        }
         
         if (API_CONFIG.AUTO_GENERATE_JSON) {
             generateJsonFile(true);
@@ -560,7 +711,9 @@ async function deleteEvent(eventId) {
         try {
             await apiRequest(`${API_CONFIG.ENDPOINTS.EVENTS}/${eventId}`, 'DELETE');
             log(`事件已删除`, 'warning');
-            loadEvents();
+            if (!changesConnected()) {
+                loadEvents();
+            }
             
             if (API_CONFIG.AUTO_GENERATE_JSON) {
                 generateJsonFile(true);
@@ -581,12 +734,12 @@ function resetData() {
 
 // 更新JSON预览
 function updatePreview() {
-    elements.jsonPreview.textContent = JSON.stringify(timelineData, null, 2);
+    elements.jsonPreview.textContent = JSON.stringify(previewData || timelineData, null, 2);
 }
 
 // 复制JSON到剪贴板
 function copyJsonToClipboard() {
-    navigator.clipboard.writeText(JSON.stringify(timelineData, null, 2))
+    navigator.clipboard.writeText(JSON.stringify(previewData || timelineData, null, 2))
         .then(() => {
             log('JSON已复制到剪贴板', 'success');
             showNotification('JSON已复制到剪贴板', 'success');
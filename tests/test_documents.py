@@ -0,0 +1,65 @@
+"""
+文档缓存与其他进程的写入
+文件名: tests/test_documents.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from models.tl_story import TimelineDatabase
+
+
+class ExternalWriteTest(unittest.TestCase):
+    """其他连接（如命令行导入）写入后，缓存的文档必须失效"""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='timeline-test-')
+        self.path = os.path.join(self.workdir.name, 'timeline.db')
+        self.db = TimelineDatabase(self.path)
+        self.addCleanup(self.workdir.cleanup)
+        self.addCleanup(self.db.close)
+        self.event_id = self.db.add_event({'headline': 'old', 'start_year': 2000})
+
+    def write_externally(self, sql, params=()):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def test_event_written_by_other_connection(self):
+        before = self.db.get_json_document()
+        self.assertIn(b'old', before.body)
+
+        self.write_externally('UPDATE timeline_events SET headline = ? WHERE id = ?', ('new', self.event_id))
+
+        after = self.db.get_json_document()
+        self.assertIn(b'new', after.body)
+        self.assertNotEqual(before.etag, after.etag)
+
+    def test_title_written_by_other_connection(self):
+        self.db.get_json_document()
+        self.write_externally("UPDATE timeline_config SET title_headline = 'external title' WHERE id = 1")
+        self.assertIn(b'external title', self.db.get_json_document().body)
+
+    def test_external_write_is_published(self):
+        self.db.get_json_document()
+        self.write_externally("INSERT INTO timeline_events (headline, start_year, timeline_id) VALUES ('added', 2001, 1)")
+
+        seq = self.db.changes.last_seq
+        self.assertEqual(self.db.check_external(), 1)
+        self.assertEqual([(change.entity, change.op, change.timeline) for change in self.db.changes.since(seq)],
+                         [('timeline', 'reset', 1)])
+
+    def test_own_writes_are_not_external(self):
+        self.db.get_json_document()
+        self.db.update_event(self.event_id, {'headline': 'own', 'start_year': 2000})
+        self.assertEqual(self.db.check_external(), 0)
+        self.assertIn(b'own', self.db.get_json_document().body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+片段缓存与数据版本的一致性
+文件名: tests/test_fragments.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from models.tl_story import TimelineDatabase
+
+
+class FragmentInvalidationTest(unittest.TestCase):
+    """新版本发布时，修改前的片段必须已经失效"""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='timeline-test-')
+        self.db = TimelineDatabase(os.path.join(self.workdir.name, 'timeline.db'))
+        self.addCleanup(self.workdir.cleanup)
+        self.addCleanup(self.db.close)
+
+    def build_on_publish(self):
+        """每次发布变更时立即按新版本生成文档（模拟提交后并发的请求），返回生成的文档列表"""
+        documents = []
+        self.db.changes.add_listener(lambda: documents.append(self.db.get_json_document().body))
+        return documents
+
+    def test_update_event_during_publish(self):
+        event_id = self.db.add_event({'headline': 'old', 'start_year': 2000})
+        self.assertIn(b'old', self.db.get_json_document().body)
+
+        documents = self.build_on_publish()
+        # 与生成片段在同一秒内修改，updated_at不变
+        self.db.update_event(event_id, {'headline': 'new', 'start_year': 2000})
+
+        self.assertIn(b'new', documents[-1])
+        self.assertIn(b'new', self.db.get_json_document().body)
+
+    def test_update_era_during_publish(self):
+        self.db.add_event({'headline': 'event', 'start_year': 2000})
+        era_id = self.db.add_era({'headline': 'old era', 'start_year': 1990, 'end_year': 2010})
+        self.assertIn(b'old era', self.db.get_json_document().body)
+
+        documents = self.build_on_publish()
+        self.db.update_era(era_id, {'headline': 'new era', 'start_year': 1990, 'end_year': 2010})
+
+        self.assertIn(b'new era', documents[-1])
+        self.assertIn(b'new era', self.db.get_json_document().body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+TimelineJS JSON流式解析与批量导入
+文件名: tests/test_importer.py
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from models.importer import JSONStreamReader, iter_timeline_items
+from models.tl_story import TimelineDatabase
+
+
+def event(headline, year, **extra):
+    return dict({'text': {'headline': headline}, 'start_date': {'year': year}}, **extra)
+
+
+class ChunkedStream(io.BytesIO):
+    """每次最多返回size字节，模拟网络上分段到达的请求体"""
+
+    def __init__(self, data, size):
+        super().__init__(data)
+        self.size = size
+
+    def read(self, size=-1):
+        return super().read(self.size)
+
+
+class JSONStreamReaderTest(unittest.TestCase):
+
+    def test_values_split_across_reads(self):
+        document = {'title': {'text': {'headline': '时间线 ✓'}}, 'scale': 'human',
+                    'events': [event('事件一', -12345), event('二', 2020, unique_id='x' * 300)],
+                    'eras': [], 'extra': [1.5, None, True, 1234567890123]}
+        data = json.dumps(document, ensure_ascii=False, indent=1).encode('utf-8')
+        expected = [('title', document['title']), ('scale', 'human'),
+                    ('event', document['events'][0]), ('event', document['events'][1]),
+                    ('extra', document['extra'])]
+        for size in (1, 2, 3, 5, 64 * 1024):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_timeline_items(ChunkedStream(data, size))), expected)
+
+    def test_number_at_end_of_buffer(self):
+        reader = JSONStreamReader(ChunkedStream(b'[12345678, 9]', 4), chunk_size=4)
+        reader.expect('[')
+        self.assertEqual(reader.value(), 12345678)
+
+    def test_malformed_documents(self):
+        for data in (b'', b'[]', b'{"events": [1 2]}', b'{"events": [1,', b'{"a": 1 "b": 2}', b'{1: 2}'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    list(iter_timeline_items(io.BytesIO(data)))
+
+
+class ImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='timeline-test-')
+        self.db = TimelineDatabase(os.path.join(self.workdir.name, 'timeline.db'))
+        self.addCleanup(self.workdir.cleanup)
+        self.addCleanup(self.db.close)
+
+    def import_document(self, document, **options):
+        data = json.dumps(document).encode('utf-8')
+        return self.db.import_json(io.BytesIO(data), **options)
+
+    def headlines(self):
+        return [row['headline'] for row in self.db.get_all_events()]
+
+    def test_per_row_errors(self):
+        report = self.import_document({'events': [
+            event('ok 0', 2000, unique_id='a'),
+            {'text': {'headline': 'no start date'}},
+            event('bad year', 'MMXX'),
+            event('ok 3', 2003, media='not an object'),
+            'not an object',
+            event('duplicate unique_id', 2005, unique_id='a'),
+            event('ok 6', 2006),
+        ], 'eras': [
+            {'text': {'headline': 'era'}, 'start_date': {'year': 1990}, 'end_date': {'year': 2000}},
+            {'text': {'headline': 'era without end'}, 'start_date': {'year': 1990}},
+        ]}, batch_size=2)
+
+        self.assertEqual(report['status'], 'success')
+        self.assertEqual((report['events'], report['eras'], report['error_count']), (2, 1, 6))
+        # 唯一键冲突在批量写入时才发现，错误的顺序不固定
+        self.assertEqual(sorted((error['type'], error['index']) for error in report['errors']),
+                         [('era', 1), ('event', 1), ('event', 2), ('event', 3), ('event', 4), ('event', 5)])
+        self.assertEqual(self.headlines(), ['ok 0', 'ok 6'])
+
+    def test_malformed_json_rolls_back(self):
+        self.import_document({'events': [event('kept', 1999)]})
+        with self.assertRaises(ValueError):
+            self.db.import_json(io.BytesIO(b'{"events": [' + json.dumps(event('lost', 2000)).encode() + b', {'),
+                                replace=True)
+        self.assertEqual(self.headlines(), ['kept'])
+
+    def test_replace_and_round_trip(self):
+        self.import_document({'events': [event('old', 1999)]})
+        document = {
+            'title': {'text': {'headline': '标题', 'text': '<p>说明</p>'}},
+            'events': [event('b', 2001, group='g'), event('a', -44, display_date='44 BC')],
+            'eras': [{'text': {'headline': 'era'}, 'start_date': {'year': 1}, 'end_date': {'year': 100}}],
+        }
+        report = self.import_document(document, replace=True)
+        self.assertEqual((report['events'], report['eras'], report['error_count']), (2, 1, 0))
+
+        generated = self.db.generate_json()
+        self.assertEqual(generated['title']['text']['headline'], '标题')
+        self.assertEqual([item['text']['headline'] for item in generated['events']], ['a', 'b'])
+        self.assertEqual(len(generated['eras']), 1)
+
+        # 导出的文档可以原样导入，结果相同
+        self.import_document(generated, replace=True)
+        self.assertEqual(self.db.generate_json(), generated)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+数据库结构迁移：从未记录版本的旧数据库升级
+文件名: tests/test_migrations.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from models.migrations import schema_version
+from models.tl_story import TimelineDatabase
+
+# 引入版本号之前的表结构（user_version为0）
+V0_SCHEMA = '''
+CREATE TABLE timeline_config (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, title_headline TEXT, title_text TEXT, scale TEXT DEFAULT 'human',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE timeline_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, headline TEXT NOT NULL, text TEXT,
+    start_year INTEGER NOT NULL, start_month INTEGER, start_day INTEGER, start_hour INTEGER,
+    start_minute INTEGER, start_second INTEGER, start_millisecond INTEGER, start_display_date TEXT,
+    end_year INTEGER, end_month INTEGER, end_day INTEGER, end_hour INTEGER,
+    end_minute INTEGER, end_second INTEGER, end_millisecond INTEGER, end_display_date TEXT,
+    display_date TEXT, event_group TEXT, unique_id TEXT UNIQUE,
+    media_url TEXT, media_caption TEXT, media_credit TEXT, media_thumbnail TEXT, media_alt TEXT,
+    media_title TEXT, media_link TEXT, media_link_target TEXT,
+    background_url TEXT, background_color TEXT, background_alt TEXT, autolink BOOLEAN DEFAULT 1,
+    sort_order INTEGER DEFAULT 0, is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE timeline_eras (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, headline TEXT NOT NULL, text TEXT,
+    start_year INTEGER NOT NULL, start_month INTEGER, start_day INTEGER, start_hour INTEGER,
+    start_minute INTEGER, start_second INTEGER, start_millisecond INTEGER, start_display_date TEXT,
+    end_year INTEGER NOT NULL, end_month INTEGER, end_day INTEGER, end_hour INTEGER,
+    end_minute INTEGER, end_second INTEGER, end_millisecond INTEGER, end_display_date TEXT,
+    sort_order INTEGER DEFAULT 0, is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE timeline_media (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, event_id INTEGER, url TEXT NOT NULL, caption TEXT, credit TEXT,
+    thumbnail TEXT, alt TEXT, title TEXT, link TEXT, link_target TEXT, media_type TEXT DEFAULT 'image',
+    sort_order INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (event_id) REFERENCES timeline_events(id) ON DELETE CASCADE
+);
+CREATE TABLE timeline_groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, description TEXT, color TEXT,
+    sort_order INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+# 两种结构中都存在的列写入相同的数据
+DATA = '''
+INSERT INTO timeline_events (id, headline, text, start_year, start_month, start_day, start_hour,
+    start_minute, end_year, end_month, display_date, event_group, unique_id, media_url, media_caption,
+    media_credit, background_color, autolink, sort_order, is_active, created_at, updated_at) VALUES
+    (1, '蒸汽机', '<p>瓦特</p>', 1769, 1, 5, NULL, NULL, 1776, NULL, NULL, '工业', 'steam',
+     'https://example.com/steam.jpg', '说明', '来源', '#ffffff', 1, 0, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00'),
+    (2, 'Caesar', NULL, -44, 3, 15, 12, 30, NULL, NULL, '44 BC', NULL, NULL,
+     NULL, NULL, NULL, NULL, 0, 0, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00'),
+    (3, '同一年', NULL, 1769, NULL, NULL, NULL, NULL, NULL, NULL, NULL, '工业', 'same-year',
+     NULL, NULL, NULL, NULL, 1, -1, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00'),
+    (4, 'hidden', NULL, 2000, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, 'hidden',
+     NULL, NULL, NULL, NULL, 1, 0, 0, '2020-01-01 00:00:00', '2020-01-01 00:00:00'),
+    (9, 'Big Bang', NULL, -13800000000, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL,
+     NULL, NULL, NULL, NULL, 1, 0, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00');
+INSERT INTO timeline_eras (id, headline, start_year, start_month, end_year, end_month, sort_order,
+    is_active, created_at, updated_at) VALUES
+    (1, '工业革命', 1760, 1, 1840, 12, 0, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00'),
+    (2, '古罗马', -753, NULL, 476, NULL, 0, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00');
+'''
+
+
+class MigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='timeline-test-')
+        self.addCleanup(self.workdir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.workdir.name, name)
+
+    def write(self, path, script):
+        conn = sqlite3.connect(path)
+        try:
+            conn.executescript(script)
+        finally:
+            conn.close()
+
+    def open(self, path):
+        db = TimelineDatabase(path)
+        self.addCleanup(db.close)
+        return db
+
+    def v0_database(self):
+        path = self.path('v0.db')
+        self.write(path, V0_SCHEMA + DATA + '''
+        INSERT INTO timeline_config (id, title_headline, title_text, scale) VALUES (1, '旧时间线', '说明', 'human');
+        DELETE FROM timeline_events WHERE id = 9;
+        ''')
+        return path
+
+    def test_upgrade_gives_same_json_as_fresh_database(self):
+        upgraded = self.open(self.v0_database())
+        self.assertEqual(upgraded.init_database(), 0)
+
+        fresh_path = self.path('fresh.db')
+        self.open(fresh_path).init_database()
+        self.write(fresh_path, DATA + '''
+        UPDATE timeline_config SET title_headline = '旧时间线', title_text = '说明', scale = 'human' WHERE id = 1;
+        DELETE FROM timeline_events WHERE id = 9;
+        ''')
+        fresh = self.open(fresh_path)
+
+        self.assertEqual(upgraded.get_json_document().body, fresh.get_json_document().body)
+        self.assertEqual([item['text']['headline'] for item in upgraded.generate_json()['events']],
+                         ['Caesar', '同一年', '蒸汽机'])
+
+    def test_upgrade_records_version_and_scopes_unique_id(self):
+        path = self.v0_database()
+        db = self.open(path)
+        db.get_timeline_config()
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(schema_version(conn), len(db.migrations))
+
+        # unique_id只在同一时间线内唯一
+        other = db.create_timeline('other')
+        db.add_event({'headline': 'copy', 'start_year': 1769, 'unique_id': 'steam'}, timeline_id=other)
+        with self.assertRaises(sqlite3.IntegrityError):
+            db.add_event({'headline': 'copy', 'start_year': 1769, 'unique_id': 'steam'})
+
+        # 重建表时保留AUTOINCREMENT计数器，已删除的id不会被重新使用
+        self.assertGreater(db.add_event({'headline': 'new', 'start_year': 2020}), 9)
+
+    def test_reopen_runs_no_migrations(self):
+        path = self.v0_database()
+        self.open(path).get_timeline_config()
+        self.assertEqual(self.open(path).init_database(), 0)
+
+    def test_newer_database_is_rejected(self):
+        path = self.v0_database()
+        self.write(path, 'PRAGMA user_version = 99;')
+        with self.assertRaises(RuntimeError):
+            self.open(path).get_timeline_config()
+
+    def test_failed_migration_rolls_back(self):
+        path = self.v0_database()
+
+        def fail(cursor):
+            cursor.execute('CREATE TABLE half_done (id INTEGER)')
+            raise sqlite3.OperationalError('迁移失败')
+
+        class Failing(TimelineDatabase):
+            migrations = property(lambda self: TimelineDatabase.migrations.fget(self) + (fail,))
+
+        db = Failing(path)
+        self.addCleanup(db.close)
+        with self.assertRaises(sqlite3.OperationalError):
+            db.init_database()
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(schema_version(conn), 0)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertNotIn('half_done', tables)
+        self.assertNotIn('timeline_changes', tables)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+multipart/form-data流式解析与上传存储
+文件名: tests/test_multipart.py
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+from server.multipart import MultipartReader, MultipartError, parse_options_header
+from server.uploads import UploadStore, UploadRejected
+
+BOUNDARY = 'XyZ--boundary'
+
+
+def encode_form(parts, boundary=BOUNDARY):
+    """编码multipart请求体，parts为 [(字段名, 文件名或None, 内容)]"""
+    body = b''
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + content + b'\r\n'
+    return body + f'--{boundary}--\r\n'.encode()
+
+
+def read_form(body, read_size):
+    reader = MultipartReader(io.BytesIO(body), BOUNDARY, read_size=read_size)
+    return [(part.name, part.filename, b''.join(part.chunks())) for part in reader]
+
+
+class MultipartReaderTest(unittest.TestCase):
+
+    def test_boundary_split_across_reads(self):
+        # 内容中包含边界的前缀，每次读取的大小使边界落在两次读取之间
+        parts = [('title', None, b'hello'),
+                 ('file', 'a.png', b'\r\n--XyZ--bound' + bytes(range(256)) * 3 + b'\r\n--'),
+                 ('empty', 'b.txt', b'')]
+        body = encode_form(parts)
+        for read_size in (1, 2, 3, 7, 16, len(BOUNDARY) + 3, 64 * 1024):
+            with self.subTest(read_size=read_size):
+                self.assertEqual(read_form(body, read_size), parts)
+
+    def test_unread_part_is_skipped(self):
+        body = encode_form([('a', 'a.txt', b'x' * 1000), ('b', None, b'second')])
+        reader = MultipartReader(io.BytesIO(body), BOUNDARY, read_size=10)
+        names = []
+        for part in reader:
+            names.append(part.name)
+            if part.name == 'b':
+                self.assertEqual(b''.join(part.chunks()), b'second')
+        self.assertEqual(names, ['a', 'b'])
+
+    def test_truncated_body(self):
+        body = encode_form([('file', 'a.png', b'data')])
+        with self.assertRaises(MultipartError):
+            read_form(body[:-len(BOUNDARY) - 8], 8)
+
+    def test_filename_path_is_stripped(self):
+        body = encode_form([('file', 'C:\\\\Users\\\\me\\\\photo.png', b'data')])
+        self.assertEqual(read_form(body, 64)[0][1], 'photo.png')
+
+    def test_options_header(self):
+        self.assertEqual(parse_options_header('multipart/form-data; boundary="a;b"; charset=utf-8'),
+                         ('multipart/form-data', {'boundary': 'a;b', 'charset': 'utf-8'}))
+
+
+class UploadStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='timeline-test-')
+        self.addCleanup(self.workdir.cleanup)
+        self.store = UploadStore(self.workdir.name, '/static/uploads/', ['.png', '.jpg'], max_size=100)
+
+    def test_save_and_deduplicate(self):
+        first = self.store.save('a.PNG', [b'abc', b'def'])
+        second = self.store.save('other.png', [b'abcdef'])
+        self.assertEqual(first['url'], second['url'])
+        self.assertTrue(first['url'].endswith('.png'))
+        self.assertFalse(first['duplicate'])
+        self.assertTrue(second['duplicate'])
+        self.assertEqual(os.listdir(self.workdir.name), [first['name']])
+
+    def test_too_large_is_413(self):
+        with self.assertRaises(UploadRejected) as raised:
+            self.store.save('a.png', iter([b'x' * 60, b'x' * 60]))
+        self.assertEqual(raised.exception.status, 413)
+        # 已写入的部分被删除
+        self.assertEqual(os.listdir(self.workdir.name), [])
+
+    def test_unsupported_type_is_415(self):
+        with self.assertRaises(UploadRejected) as raised:
+            self.store.save('script.exe', [b'MZ'])
+        self.assertEqual(raised.exception.status, 415)
+
+    def test_empty_file_is_rejected(self):
+        with self.assertRaises(UploadRejected) as raised:
+            self.store.save('a.png', [])
+        self.assertEqual(raised.exception.status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+日期排序键与分页参数
+文件名: tests/test_paging.py
+"""
+
+import sqlite3
+import unittest
+
+from models.paging import (date_key, date_key_sql, date_range_keys, parse_date_bound,
+                           encode_cursor, decode_cursor, KEY_NEAR_YEARS)
+
+# 按时间顺序排列的日期 (年, 月, 日, 时, 分, 秒, 毫秒)
+CHRONOLOGICAL = [
+    (-13_800_000_000, 0, 0, 0, 0, 0, 0),
+    (-KEY_NEAR_YEARS - 1, 6, 0, 0, 0, 0, 0),
+    (-KEY_NEAR_YEARS, 0, 0, 0, 0, 0, 0),
+    (-KEY_NEAR_YEARS + 1, 0, 0, 0, 0, 0, 0),
+    (-500, 0, 0, 0, 0, 0, 0),
+    (-500, 12, 31, 23, 59, 59, 999),
+    (-499, 1, 1, 0, 0, 0, 0),
+    (-1, 12, 31, 0, 0, 0, 0),
+    (0, 1, 1, 0, 0, 0, 0),
+    (1, 0, 0, 0, 0, 0, 0),
+    (2020, 0, 0, 0, 0, 0, 0),
+    (2020, 2, 0, 0, 0, 0, 0),
+    (2020, 2, 29, 0, 0, 0, 0),
+    (2020, 2, 29, 0, 0, 0, 1),
+    (2020, 2, 29, 13, 0, 0, 0),
+    (2020, 12, 31, 23, 59, 59, 999),
+    (2021, 0, 0, 0, 0, 0, 0),
+    (KEY_NEAR_YEARS - 1, 12, 31, 23, 59, 59, 999),
+    (KEY_NEAR_YEARS, 0, 0, 0, 0, 0, 0),
+    (KEY_NEAR_YEARS, 12, 0, 0, 0, 0, 0),
+    (KEY_NEAR_YEARS + 1, 0, 0, 0, 0, 0, 0),
+    (4_500_000_000, 0, 0, 0, 0, 0, 0),
+]
+
+
+class DateKeyTest(unittest.TestCase):
+
+    def test_keys_follow_chronological_order(self):
+        keys = [date_key(*date) for date in CHRONOLOGICAL]
+        for earlier, later, date in zip(keys, keys[1:], CHRONOLOGICAL[1:]):
+            self.assertLess(earlier, later, date)
+
+    def test_keys_fit_in_sqlite_integers(self):
+        for date in CHRONOLOGICAL:
+            self.assertLess(abs(date_key(*date)), 2 ** 63)
+
+    def test_sql_expression_matches_python(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE t (start_year, start_month, start_day, start_hour, '
+                     'start_minute, start_second, start_millisecond)')
+        rows = [date if i % 2 else tuple(None if v == 0 and j else v for j, v in enumerate(date))
+                for i, date in enumerate(CHRONOLOGICAL)]
+        conn.executemany('INSERT INTO t VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        keys = [row[0] for row in conn.execute(f"SELECT {date_key_sql('start')} FROM t ORDER BY rowid")]
+        self.assertEqual(keys, [date_key(*date) for date in CHRONOLOGICAL])
+        self.assertIsNone(conn.execute(f"SELECT {date_key_sql('start')} FROM (SELECT NULL AS start_year, "
+                                       "NULL AS start_month, NULL AS start_day, NULL AS start_hour, "
+                                       "NULL AS start_minute, NULL AS start_second, "
+                                       "NULL AS start_millisecond)").fetchone()[0])
+
+    def test_range_includes_whole_days(self):
+        low, high = date_range_keys(parse_date_bound('1900'), parse_date_bound('1900', upper=True))
+        self.assertLessEqual(low, date_key(1900))
+        self.assertLessEqual(date_key(1900, 12, 31, 23, 59, 59, 999), high)
+        self.assertLess(high, date_key(1901))
+
+        low, high = date_range_keys(parse_date_bound('-44-03-15'), parse_date_bound('-44-03-15', upper=True))
+        self.assertLessEqual(low, date_key(-44, 3, 15, 12))
+        self.assertLessEqual(date_key(-44, 3, 15, 23, 59, 59, 999), high)
+        self.assertLess(high, date_key(-44, 3, 16))
+
+
+class ParseDateBoundTest(unittest.TestCase):
+
+    def test_valid_bounds(self):
+        self.assertEqual(parse_date_bound('2020'), (2020, 0, 0))
+        self.assertEqual(parse_date_bound('2020', upper=True), (2020, 99, 99))
+        self.assertEqual(parse_date_bound('2020-02', upper=True), (2020, 2, 99))
+        self.assertEqual(parse_date_bound('2020-02-29'), (2020, 2, 29))
+        self.assertEqual(parse_date_bound('-500-12-31'), (-500, 12, 31))
+
+    def test_invalid_bounds(self):
+        for text in ('', '-', 'abc', '2020-', '2020-1-2-3', '2020-13', '2020-00', '2020-12-32',
+                     '2020-13-45', '2020-02-00', '+2020', '2020-1a'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_date_bound(text)
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_roundtrip(self):
+        values = [date_key(-500, 1, 2), 3, 42]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_invalid_cursor(self):
+        for token in ('!!', encode_cursor(['a']), encode_cursor({'a': 1})):
+            with self.subTest(token=token):
+                with self.assertRaises(ValueError):
+                    decode_cursor(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
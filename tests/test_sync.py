@@ -0,0 +1,94 @@
+"""
+增量同步：删除标记、分页与从备份恢复后的版本
+文件名: tests/test_sync.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from models.backup import BackupManager
+from models.tl_story import TimelineDatabase, INTERNAL_COLUMNS
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='timeline-test-')
+        self.db = TimelineDatabase(os.path.join(self.workdir.name, 'timeline.db'))
+        self.addCleanup(self.workdir.cleanup)
+        self.addCleanup(self.db.close)
+
+    def add(self, headline, timeline_id=1):
+        return self.db.add_event({'headline': headline, 'start_year': 2000}, timeline_id=timeline_id)
+
+    def sync(self, since, limit=1000, timeline_id=1):
+        """读取since之后的全部变更，返回 ({id: 标题}, {id: 删除类型}, 新版本)"""
+        items, deleted = {}, {}
+        while True:
+            page, tombstones, version, has_more = self.db.get_changes('event', since, limit, timeline_id)
+            self.assertGreaterEqual(version, since)
+            items.update((item['id'], item['headline']) for item in page)
+            deleted.update((tombstone['id'], tombstone['deleted']) for tombstone in tombstones)
+            since = version
+            if not has_more:
+                return items, deleted, version
+
+    def test_soft_and_hard_tombstones(self):
+        kept, soft, hard = self.add('kept'), self.add('soft'), self.add('hard')
+        _, _, version = self.sync(0)
+
+        self.db.update_event(kept, {'headline': 'updated', 'start_year': 2000})
+        self.db.delete_event(soft)
+        self.db.delete_event(hard, soft_delete=False)
+
+        items, deleted, new_version = self.sync(version)
+        self.assertEqual(items, {kept: 'updated'})
+        self.assertEqual(deleted, {soft: 'soft', hard: 'hard'})
+        self.assertGreater(new_version, version)
+        self.assertEqual(self.sync(new_version), ({}, {}, new_version))
+
+    def test_items_have_no_internal_columns(self):
+        self.add('event')
+        items = self.db.get_changes('event', 0, 10)[0]
+        self.assertEqual(len(items), 1)
+        self.assertFalse(INTERNAL_COLUMNS & set(items[0]))
+
+    def test_paging_and_timeline_isolation(self):
+        other = self.db.create_timeline('other')
+        ids = [self.add(f'event {i}') for i in range(7)]
+        self.add('elsewhere', timeline_id=other)
+
+        page, _, version, has_more = self.db.get_changes('event', 0, 3)
+        self.assertEqual(([item['id'] for item in page], has_more), (ids[:3], True))
+
+        items, _, _ = self.sync(version, limit=3)
+        self.assertEqual(sorted(items), ids[3:])
+        self.assertEqual(list(self.sync(0, timeline_id=other)[0].values()), ['elsewhere'])
+
+    def test_since_after_restore(self):
+        backups = BackupManager(self.db, os.path.join(self.workdir.name, 'backups'), sleep=0)
+        first, second = self.add('first'), self.add('second')
+        backup = backups.create()
+
+        self.db.update_event(first, {'headline': 'changed', 'start_year': 2000})
+        self.db.delete_event(second, soft_delete=False)
+        third = self.add('third')
+        items, _, version = self.sync(0)
+        self.assertEqual(items, {first: 'changed', third: 'third'})
+
+        backups.restore(backups.resolve(backup['name']))
+
+        # 已同步到恢复前版本的客户端收到与备份一致的记录，以及备份中不存在的记录的删除标记
+        items, deleted, restored_version = self.sync(version)
+        self.assertEqual(items, {first: 'first', second: 'second'})
+        self.assertEqual(deleted, {third: 'hard'})
+        self.assertGreater(restored_version, version)
+
+        # 恢复后的新变更序号继续增长
+        fourth = self.add('fourth')
+        self.assertEqual(self.sync(restored_version)[0], {fourth: 'fourth'})
+
+
+if __name__ == '__main__':
+    unittest.main()